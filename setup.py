@@ -13,6 +13,10 @@ with open(os.path.join(here, 'README.rst')) as f:
 REQUIREMENTS = [
 ]
 
+SUBPROCESS32_REQUIREMENTS = [
+    'subprocess32>=3.2.7',
+]
+
 TEST_REQUIREMENTS = [
     'click==4.0',
     'pylama==6.3.1',
@@ -33,7 +37,7 @@ setup(
     license="MIT",
     install_requires=REQUIREMENTS,
     tests_require=TEST_REQUIREMENTS,
-    extras_require={'tests': TEST_REQUIREMENTS},
+    extras_require={'tests': TEST_REQUIREMENTS, 'subprocess32': SUBPROCESS32_REQUIREMENTS},
     keywords=['executor'],
     packages=find_packages(),
     classifiers=[
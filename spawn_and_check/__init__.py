@@ -1,2 +1,7 @@
 from spawn_and_check.executor import execute
-from spawn_and_check.checks import check_tcp, check_unix, check_http
+from spawn_and_check.checks import check_tcp, check_tcp_many, check_unix, check_http, check_output
+from spawn_and_check.checks import check_file, check_file_contains, check_socket_file
+from spawn_and_check.checks import check_tcp_listening, check_udp_bound, check_unix_listening
+from spawn_and_check.checks import check_sd_notify, check_notification_fd
+from spawn_and_check.stack import execute_many, Service
+from spawn_and_check.combinators import all_of, any_of, quorum
@@ -0,0 +1,85 @@
+"""
+Socket activation - the executor binds the listening sockets and passes them to the process.
+
+The process gets the sockets as descriptors 3, 4, ... and learns about them from the ``LISTEN_FDS``, ``LISTEN_PID``
+and ``LISTEN_FDNAMES`` environment variables, the way systemd passes them (``sd_listen_fds``). A port conflict fails
+right when binding, and clients can connect as soon as the sockets are bound - the kernel queues the connections
+until the process accepts them.
+"""
+import fcntl
+import socket
+
+from spawn_and_check.constants import LISTEN_BACKLOG
+
+
+SD_LISTEN_FDS_START = 3
+
+
+class ListenSockets(object):
+
+    """Listening sockets to bind and pass to the spawned process."""
+
+    def __init__(self, addresses, backlog=LISTEN_BACKLOG):
+        """
+        Store the addresses - nothing is bound until ``bind`` is called.
+
+        :param list addresses: TCP ports (bound on 127.0.0.1), (host, port) tuples or unix socket paths - in the order
+            of the descriptors. Port 0 binds a free port, see ``addresses`` after binding.
+        :param int backlog: max number of connections queued until the process accepts them
+        """
+        self.addresses = [('127.0.0.1', address) if isinstance(address, (int, long)) else address
+                          for address in addresses]
+        self.backlog = backlog
+        self.sockets = []
+
+    def bind(self):
+        """
+        Bind the sockets and start listening.
+
+        :raise socket.error: if any address cannot be bound (e.g. is in use) - no socket is left open then
+        """
+        try:
+            for index, address in enumerate(self.addresses):
+                unix = isinstance(address, basestring)
+                if unix:
+                    listening_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                else:
+                    family = socket.getaddrinfo(address[0], address[1], 0, socket.SOCK_STREAM)[0][0]
+                    listening_socket = socket.socket(family, socket.SOCK_STREAM)
+                    listening_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                self.sockets.append(listening_socket)
+
+                # Only the duplicates at 3, 4, ... should be inherited.
+                flags = fcntl.fcntl(listening_socket.fileno(), fcntl.F_GETFD)
+                fcntl.fcntl(listening_socket.fileno(), fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+
+                listening_socket.bind(address)
+                listening_socket.listen(self.backlog)
+                if not unix:
+                    self.addresses[index] = listening_socket.getsockname()[:2]  # The port, if 0 was passed.
+        except socket.error:
+            self.close()
+            raise
+
+    def prepare(self, options):
+        """
+        Pass the sockets to the process.
+
+        :param spawn_and_check.executor.SpawnOptions options: options of the spawn to add the sockets to
+        """
+        for index, listening_socket in enumerate(self.sockets):
+            options.fds[SD_LISTEN_FDS_START + index] = listening_socket.fileno()
+        options.env['LISTEN_FDS'] = str(len(self.sockets))
+        options.env['LISTEN_FDNAMES'] = ':'.join(
+            'unix' if listening_socket.family == socket.AF_UNIX else 'tcp' for listening_socket in self.sockets)
+        options.pid_env.append('LISTEN_PID')
+
+    def attach(self, process):
+        """Close the sockets in this process - the spawned process has them now."""
+        self.close()
+
+    def close(self):
+        """Close the sockets."""
+        for listening_socket in self.sockets:
+            listening_socket.close()
+        self.sockets = []
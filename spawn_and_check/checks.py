@@ -4,57 +4,242 @@ Functions returning service checks.
 Those functions are effectively partials but we do care about their representation (__name__, __doc__) so we cannot use
 ``functools.partial``.
 """
+import os
+import re
+import stat
+import errno
+import fcntl
+import select
 import socket
 from urlparse import urlsplit
-from httplib import HTTPConnection
+from httplib import HTTPConnection, HTTPException
 
-from spawn_and_check.constants import TCP_TIMEOUT
+from spawn_and_check.clock import monotonic
+from spawn_and_check.context import accepts_context
+from spawn_and_check.constants import TCP_TIMEOUT, MIN_CHECK_TIMEOUT, OUTPUT_MATCH_WINDOW
+from spawn_and_check.output import PatternMatcher, process_output
+from spawn_and_check.inotify import DirectoryWatch
+from spawn_and_check.proctree import ProcessTree
+from spawn_and_check.socket_tables import socket_tables, socket_inodes
+from spawn_and_check.resolver import resolver
+from spawn_and_check.notify import NotifySocket
+from spawn_and_check.exceptions import NotificationClosed
 
 
 def check_tcp(port, host='127.0.0.1', timeout=TCP_TIMEOUT):
     """
     Create a TCP check function.
 
+    The host is resolved through the shared cache of ``spawn_and_check.resolver`` and all its addresses (e.g. both
+    ::1 and 127.0.0.1 for 'localhost') are tried at once. The family of the address that accepted the connection is
+    stored in the ``family`` attribute of the check (None until the check passes).
+
     :param int port:
     :param str host: IPv4/IPv6 address or a resolvable hostname
-    :param float timeout: connection timeout
+    :param float timeout: connection timeout, shortened to the time left until the deadline of the polling
     """
-    def check_tcp():
+    address = host, port
+
+    @accepts_context
+    def check_tcp(context=None):
         """
         Try to establish a TCP connection.
 
         The connection will be immediately broken after it is established.
 
+        :param spawn_and_check.context.CheckContext context: deadline to clamp the connection timeout to
         :rtype: bool
         :return: True if can connect, else False
         """
-        try:
-            tcp_socket = socket.create_connection((host, port), timeout)
-            tcp_socket.close()
-            return True
-        except socket.error:
+        tcp_socket = connect_tcp([address], timeout if context is None else context.clamp(timeout))[address]
+        if tcp_socket is None:
             return False
 
+        check_tcp.family = tcp_socket.family
+        tcp_socket.close()
+        return True
+
+    check_tcp.family = None
     return check_tcp
 
 
+def connect_nonblocking(address_info):
+    """
+    Start connecting to the TCP address without waiting for the connection to be established.
+
+    :param tuple address_info: (family, socktype, proto, sockaddr) tuple, see ``spawn_and_check.resolver``
+    :rtype: tuple
+    :return: the socket and a boolean telling if the connection is already established, or (None, False) if the
+        connection failed right away
+    """
+    family, socktype, proto, sockaddr = address_info
+    try:
+        tcp_socket = socket.socket(family, socktype, proto)
+    except socket.error:
+        return None, False
+
+    tcp_socket.setblocking(False)
+    error = tcp_socket.connect_ex(sockaddr)
+    if error == 0:
+        return tcp_socket, True
+    if error in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+        return tcp_socket, False
+
+    tcp_socket.close()
+    return None, False
+
+
+def connect_tcp(addresses, timeout=TCP_TIMEOUT):
+    """
+    Establish TCP connections to all addresses at once.
+
+    Every address is resolved (see ``spawn_and_check.resolver``) and connections to all its resolved addresses are
+    started without blocking, happy eyeballs style - the first one established wins and the others are dropped. All
+    connections are then waited for with a single ``poll`` call per wake up, so connecting to many addresses takes as
+    long as connecting to the slowest one.
+
+    :param list addresses: list of (host, port) tuples
+    :param (float, NoneType) timeout: time limit for all connections, None - no limit
+    :rtype: dict
+    :return: established connection (a blocking socket) or None for each address
+    """
+    results = dict.fromkeys(addresses)
+    pending = {}  # File descriptor to (address, socket).
+    # No time left for a lookup, which cannot be given a timeout - use only the cached or numeric addresses.
+    numeric_only = timeout is not None and timeout <= MIN_CHECK_TIMEOUT
+    poller = select.poll()
+
+    def drop_pending(address):
+        """Close the connections still in progress to the address - another one won."""
+        for fd, (pending_address, tcp_socket) in list(pending.items()):
+            if pending_address == address:
+                del pending[fd]
+                poller.unregister(fd)
+                tcp_socket.close()
+
+    try:
+        for address in results:
+            try:
+                address_infos = resolver.resolve(*address, numeric_only=numeric_only)
+            except socket.error:
+                continue  # Cannot resolve (yet).
+
+            for address_info in address_infos:
+                tcp_socket, connected = connect_nonblocking(address_info)
+                if connected:
+                    results[address] = tcp_socket
+                    drop_pending(address)
+                    break
+                elif tcp_socket is not None:
+                    pending[tcp_socket.fileno()] = address, tcp_socket
+                    poller.register(tcp_socket, select.POLLOUT)
+
+        deadline = None if timeout is None else monotonic() + timeout
+        while pending:
+            remaining = None if deadline is None else deadline - monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+
+            try:
+                events = poller.poll(None if remaining is None else remaining * 1000)
+            except select.error as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            for fd, _ in events:
+                if fd not in pending:
+                    continue  # Dropped - another connection to the same address was established in this wake up.
+                address, tcp_socket = pending.pop(fd)
+                poller.unregister(fd)
+                if tcp_socket.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                    results[address] = tcp_socket
+                    drop_pending(address)
+                else:
+                    tcp_socket.close()
+    finally:
+        for _, tcp_socket in pending.values():
+            tcp_socket.close()
+
+    for tcp_socket in results.values():
+        if tcp_socket is not None:
+            tcp_socket.setblocking(True)
+    return results
+
+
+def probe_tcp(addresses, timeout=TCP_TIMEOUT):
+    """
+    Try to establish TCP connections to all addresses at once, see ``connect_tcp``.
+
+    Established connections are immediately broken.
+
+    :param list addresses: list of (host, port) tuples
+    :param float timeout: time limit for all connections
+    :rtype: dict
+    :return: family of the established connection (e.g. ``socket.AF_INET6``) or None for each address
+    """
+    families = {}
+    for address, tcp_socket in connect_tcp(addresses, timeout).items():
+        families[address] = None if tcp_socket is None else tcp_socket.family
+        if tcp_socket is not None:
+            tcp_socket.close()
+    return families
+
+
+def check_tcp_many(addresses, host='127.0.0.1', timeout=TCP_TIMEOUT):
+    """
+    Create a check function probing many TCP ports at once.
+
+    The family of the connection established to each address is stored in the ``families`` attribute of the check,
+    by address.
+
+    :param list addresses: ports to probe on ``host`` or (host, port) tuples
+    :param str host: IPv4/IPv6 address or a resolvable hostname for addresses given as bare ports
+    :param float timeout: time limit for all connections, shortened to the time left until the deadline of the polling
+    """
+    addresses = [address if isinstance(address, tuple) else (host, address) for address in addresses]
+
+    @accepts_context
+    def check_tcp_many(context=None):
+        """
+        Try to establish TCP connections to all addresses at once.
+
+        The connections will be immediately broken after they are established.
+
+        :param spawn_and_check.context.CheckContext context: deadline to clamp the time limit to
+        :rtype: bool
+        :return: True if can connect to all addresses, else False
+        """
+        families = probe_tcp(addresses, timeout if context is None else context.clamp(timeout))
+        check_tcp_many.families.update(
+            (address, family) for address, family in families.items() if family is not None)
+        return None not in families.values()
+
+    check_tcp_many.families = {}
+    return check_tcp_many
+
+
 def check_unix(path):
     """
     Create a unix socket check function.
 
     :param str path: path to the socket file
     """
-    def check_unix():
+    @accepts_context
+    def check_unix(context=None):
         """
         Try to establish a unix socket connection.
 
         The connection will be immediately broken after it is established.
 
+        :param spawn_and_check.context.CheckContext context: deadline to time the connection out at
         :rtype: bool
         :return: True if can connect, else False
         """
+        unix_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
         try:
-            unix_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            if context is not None:
+                unix_socket.settimeout(context.remaining())
             unix_socket.connect(path)
             return True
         except socket.error:
@@ -97,29 +282,470 @@ def is_response_ok(code):
     return 200 <= code < 300
 
 
-def check_http(url, HTTPConnection=HTTPConnection):
+class ResolvingHTTPConnection(HTTPConnection):
+
+    """
+    HTTP connection established with ``connect_tcp`` - to the first of all addresses of the host that accepts it.
+
+    The family of the connected address is stored in the ``family`` attribute.
+    """
+
+    family = None
+
+    def connect(self):
+        """
+        Connect to the host, resolved through the shared cache of ``spawn_and_check.resolver``.
+
+        :raise socket.error: if no address of the host accepted the connection in time
+        """
+        timeout = socket.getdefaulttimeout() if self.timeout is socket._GLOBAL_DEFAULT_TIMEOUT else self.timeout
+        address = self.host, self.port
+        self.sock = connect_tcp([address], timeout)[address]
+        if self.sock is None:
+            raise socket.error('Cannot connect to %s:%s.' % address)
+        self.sock.settimeout(timeout)
+        self.family = self.sock.family
+
+
+def check_http(url, method='HEAD', statuses=None, timeout=None, HTTPConnection=ResolvingHTTPConnection):
+    """
+    Create a HTTP check function.
+
+    The URL is parsed once. While failing, the check keeps one keep-alive connection, reads the responses fully so
+    that it can be reused and replaces it with a new one only when it breaks. The connection is closed once the check
+    passes, so that it's not left open to the service. The family of the address connected to is stored in the
+    ``family`` attribute of the check (None until the check passes).
+
+    :param str url: URL to send the request to
+    :param str method: HTTP method of the request
+    :param (set, NoneType) statuses: response statuses treated as OK; if None - any 2XX status
+    :param (float, NoneType) timeout: socket timeout for the connection and the request, the global default if None;
+        shortened to the time left until the deadline of the polling
+    :param type HTTPConnection: ``httplib.HTTPConnection`` or a compatible class, ``ResolvingHTTPConnection`` by default
+    """
+    host, port, path = http_urlsplit(url)
+    path = path or '/'
+    connection_kwargs = {} if timeout is None else {'timeout': timeout}
+    state = {'connection': None, 'timeout': None}
+
+    def request(context):
+        """
+        Send the request over the kept connection and read the response.
+
+        :param spawn_and_check.context.CheckContext context: deadline to clamp the socket timeout to, or None
+        :rtype: int
+        :return: response status
+        """
+        if state['connection'] is None:
+            state['connection'] = HTTPConnection(host, port, **connection_kwargs)
+            state['timeout'] = state['connection'].timeout  # ``timeout`` or the global default.
+
+        # Used when connecting and - for the kept connection - set on its socket. Without a context, the timeout
+        # clamped in a previous call is restored.
+        state['connection'].timeout = state['timeout'] if context is None else context.clamp(timeout)
+        if getattr(state['connection'], 'sock', None) is not None:
+            socket_timeout = state['connection'].timeout
+            if socket_timeout is socket._GLOBAL_DEFAULT_TIMEOUT:
+                socket_timeout = socket.getdefaulttimeout()
+            state['connection'].sock.settimeout(socket_timeout)
+
+        try:
+            state['connection'].request(method, path)
+            response = state['connection'].getresponse()
+            response.read()
+        except Exception:
+            state['connection'].close()
+            state['connection'] = None
+            raise
+
+        return response.status
+
+    @accepts_context
+    def check_http(context=None):
+        """
+        Try to send an HTTP request.
+
+        :param spawn_and_check.context.CheckContext context: deadline to clamp the socket timeout to
+        :rtype: bool
+        :return: True if the response status was OK (see ``statuses``), False otherwise
+        """
+        reused = state['connection'] is not None
+        try:
+            status = request(context)
+        except (socket.error, HTTPException):
+            if not reused:
+                return False
+            try:
+                # The kept connection might have been closed by the server in the meantime - try a fresh one.
+                status = request(context)
+            except (socket.error, HTTPException):
+                return False
+
+        ok = is_response_ok(status) if statuses is None else status in statuses
+        if ok:
+            check_http.family = getattr(state['connection'], 'family', None)
+            state['connection'].close()
+            state['connection'] = None
+        return ok
+
+    check_http.family = None
+    return check_http
+
+
+def check_output(pattern, window=OUTPUT_MATCH_WINDOW):
+    """
+    Create a check function searching the output of the spawned process for a regular expression.
+
+    The process should be spawned with its output piped, e.g. with
+    ``popen=functools.partial(subprocess.Popen, stdout=subprocess.PIPE, stderr=subprocess.PIPE)``. The executor
+    attaches the check to the process it spawns. The output is read incrementally without blocking, which also keeps
+    a chatty process from filling the pipe and blocking while it starts. Lines are searched once complete - or once
+    no more output arrives (see ``spawn_and_check.output.PatternMatcher``).
+
+    :param (str, re.RegexObject) pattern: regular expression to search stdout and stderr for
+    :param int window: max length of the match - matches split between chunks of output are found up to this length
+    """
+    pattern = re.compile(pattern)
+    state = {'reader': None, 'matcher': None}
+
+    def check_output():
+        """
+        Read the output available so far and search it for the pattern.
+
+        :rtype: bool
+        :return: True if the pattern has appeared in the output, False otherwise or if not attached to a process yet
+        """
+        if state['reader'] is None:
+            return False
+
+        state['reader'].read()
+        return state['matcher'].matched
+
+    def attach(process):
+        """Start watching the output of the process."""
+        state['reader'] = process_output(process)
+        state['matcher'] = PatternMatcher(pattern, window)
+        state['reader'].subscribe(state['matcher'].feed)
+
+    check_output.attach = attach
+    return check_output
+
+
+def check_file(path):
+    """
+    Create a check function testing if the file exists (e.g. a pidfile or a 'ready' file).
+
+    The polling loop is woken up as soon as a file is created in the directory (where inotify is available).
+
+    :param str path: path to the file
+    """
+    watch = DirectoryWatch(path)
+
+    def check_file():
+        """
+        Check if the file exists.
+
+        :rtype: bool
+        :return: True if the file exists, else False
+        """
+        watch.clear()
+        return os.path.exists(path)
+
+    check_file.fileno = watch.fileno
+    return check_file
+
+
+def check_socket_file(path):
     """
-    Create a HTTP HEAD check function.
+    Create a check function testing if the unix socket file was created.
+
+    Unlike ``check_unix``, the check does not connect to the socket - it's enough that the service has bound it.
+    The polling loop is woken up as soon as a file is created in the directory (where inotify is available).
 
-    :param str url: URL to sent HEAD to
+    :param str path: path to the socket file
     """
-    def check_http():
+    watch = DirectoryWatch(path)
+
+    def check_socket_file():
         """
-        Try to send an HTTP HEAD request.
+        Check if the socket file exists.
 
-        :param str url:
         :rtype: bool
-        :return: True if the response was OK (2XX), False otherwise
+        :return: True if the path exists and is a socket, else False
         """
-        host, port, path = http_urlsplit(url)
+        watch.clear()
+        try:
+            return stat.S_ISSOCK(os.stat(path).st_mode)
+        except OSError:
+            return False
 
-        connection = HTTPConnection(host, port)
+    check_socket_file.fileno = watch.fileno
+    return check_socket_file
+
+
+def check_file_contains(path, pattern, window=OUTPUT_MATCH_WINDOW):
+    """
+    Create a check function searching the file (e.g. a log file) for a regular expression.
+
+    Only the content appended since the previous call is read and searched (plus ``window`` bytes of the previous
+    content), once its lines are complete or nothing more is appended. If the file gets truncated or replaced, it's
+    read from the beginning. The polling loop is woken up as soon as the file is modified (where inotify is
+    available).
+
+    :param str path: path to the file
+    :param (str, re.RegexObject) pattern: regular expression to search the file for
+    :param int window: max length of the match
+    """
+    watch = DirectoryWatch(path)
+    pattern = re.compile(pattern)
+    state = {'inode': None, 'offset': 0, 'matcher': PatternMatcher(pattern, window)}
+
+    def check_file_contains():
+        """
+        Read the content of the file appended since the last call and search it for the pattern.
+
+        :rtype: bool
+        :return: True if the pattern has been found in the file, else False
+        """
+        watch.clear()
         try:
-            connection.request('HEAD', path)
-            response = connection.getresponse()
-        except socket.error:
+            with open(path, 'rb') as checked_file:
+                file_stat = os.fstat(checked_file.fileno())
+                if file_stat.st_ino != state['inode'] or file_stat.st_size < state['offset']:
+                    state.update(inode=file_stat.st_ino, offset=0, matcher=PatternMatcher(pattern, window))
+
+                checked_file.seek(state['offset'])
+                appended = checked_file.read()
+        except IOError:
             return False
 
-        return is_response_ok(response.status)
+        state['offset'] += len(appended)
+        state['matcher'].feed('file', appended)
+        return state['matcher'].matched
 
-    return check_http
+    check_file_contains.fileno = watch.fileno
+    return check_file_contains
+
+
+WILDCARD_ADDRESSES = ('0.0.0.0', '::')
+
+
+def check_socket_table(name, table_names, matches):
+    """
+    Create a check function looking for a listening socket in the socket tables of the kernel (Linux only).
+
+    The check does not connect to the service. Until attached to the spawned process (e.g. as a pre-check), it
+    passes if any process listens. Once attached, the socket has to be owned by the process or its descendants,
+    so a stale process listening on the address is not taken for the spawned one.
+
+    :param str name: name of the check function
+    :param list table_names: tables of ``spawn_and_check.socket_tables.SocketTables`` to search
+    :param function matches: function telling whether the address of a socket is the one looked for
+    """
+    state = {'tree': None}
+
+    def check_socket_table():
+        """
+        Look for a listening socket with the address.
+
+        :rtype: bool
+        :return: True if the socket is listening (and owned by the attached process tree), else False
+        """
+        inodes = set(entry.inode for table_name in table_names for entry in socket_tables.entries(table_name)
+                     if entry.listening and matches(entry.address))
+        if not inodes or state['tree'] is None:
+            return bool(inodes)
+
+        state['tree'].scan()
+        return bool(inodes & socket_inodes(state['tree'].alive()))
+
+    def attach(process):
+        """Accept only sockets owned by the process or its descendants."""
+        state['tree'] = ProcessTree(process.pid)
+
+    check_socket_table.__name__ = name
+    check_socket_table.attach = attach
+    return check_socket_table
+
+
+def inet_address_matcher(port, host):
+    """
+    Create a function telling whether a (host, port) address matches the port and the host.
+
+    :param int port:
+    :param (str, NoneType) host: IP address; sockets bound to all addresses match it too; None - any address matches
+    """
+    def matches(address):
+        return address[1] == port and (host is None or address[0] == host or address[0] in WILDCARD_ADDRESSES)
+    return matches
+
+
+def check_tcp_listening(port, host=None):
+    """
+    Create a check function testing if a TCP socket listens on the port, without connecting to it.
+
+    See ``check_socket_table``.
+
+    :param int port:
+    :param str host: IPv4/IPv6 address the socket should be bound to, any if None
+    """
+    return check_socket_table('check_tcp_listening', ['tcp', 'tcp6'], inet_address_matcher(port, host))
+
+
+def check_udp_bound(port, host=None):
+    """
+    Create a check function testing if a UDP socket is bound to the port.
+
+    See ``check_socket_table``.
+
+    :param int port:
+    :param str host: IPv4/IPv6 address the socket should be bound to, any if None
+    """
+    return check_socket_table('check_udp_bound', ['udp', 'udp6'], inet_address_matcher(port, host))
+
+
+def check_unix_listening(path):
+    """
+    Create a check function testing if a unix socket listens on the path, without connecting to it.
+
+    See ``check_socket_table``.
+
+    :param str path: path of the socket (relative paths are not resolved - the table holds them as bound)
+    """
+    return check_socket_table('check_unix_listening', ['unix'], lambda address: address == path)
+
+
+def check_sd_notify():
+    """
+    Create a check function passing when the spawned process reports it's ready with ``sd_notify`` ('READY=1').
+
+    The executor lets the check create a unix datagram socket before the process is spawned and passes its path to
+    the process in the ``NOTIFY_SOCKET`` environment variable. The polling loop is woken up as soon as a message
+    arrives. 'STATUS=' and 'ERRNO=' sent by the process are set on the executor exceptions as ``status`` and ``errno``.
+    The socket is closed once the check passes - or by the executor, if the execution fails.
+    """
+    state = {'socket': None}
+
+    def check_sd_notify():
+        """
+        Read the messages sent by the process so far.
+
+        :rtype: bool
+        :return: True if the process has sent 'READY=1', False otherwise or if not prepared for a process yet
+        """
+        notify_socket = state['socket']
+        if notify_socket is None or not notify_socket.ready:
+            return False
+
+        notify_socket.close()  # Not needed any more - and nobody would read further messages.
+        return True
+
+    def prepare(options):
+        """Create the socket and pass it to the process."""
+        state['socket'] = NotifySocket()
+        options.env['NOTIFY_SOCKET'] = state['socket'].path
+
+    def attach(process):
+        """Make the status sent by the process available to the executor."""
+        process.notify_socket = state['socket']
+
+    def fileno():
+        """Return the file descriptor of the socket, None if there's no socket."""
+        return state['socket'].fileno() if state['socket'] is not None else None
+
+    def close():
+        """Close the socket - the process won't be waited for any more."""
+        if state['socket'] is not None:
+            state['socket'].close()
+
+    check_sd_notify.prepare = prepare
+    check_sd_notify.attach = attach
+    check_sd_notify.fileno = fileno
+    check_sd_notify.close = close
+    return check_sd_notify
+
+
+def check_notification_fd(fd=None, env=None):
+    """
+    Create a check function passing when the spawned process writes anything to an inherited descriptor.
+
+    That's the s6 ``notification-fd`` readiness protocol: the executor lets the check create a pipe before the process
+    is spawned and passes its write end to the process. The polling loop is woken up as soon as data arrives. If the
+    process closes the descriptor (e.g. by exiting) without writing anything, ``NotificationClosed`` is raised right
+    away.
+
+    :param int fd: descriptor number the write end should have in the process, e.g. 3; if None, it keeps its own number
+        (remapping the descriptor runs a ``preexec_fn`` in the child, which rules out the fast spawn path)
+    :param str env: name of the environment variable to pass the descriptor number in, if any
+    """
+    state = {'read_fd': None, 'write_fd': None, 'ready': False, 'process': None}
+
+    def check_notification_fd():
+        """
+        Read what the process wrote to the descriptor so far.
+
+        :rtype: bool
+        :return: True if the process has written anything (and still runs), False otherwise or if not prepared for
+            a process yet
+        :raise NotificationClosed: if the process closed the descriptor without writing anything
+        """
+        if state['ready']:
+            # Checked again, e.g. as a pre-check of the next execution - the readiness was of that process only.
+            return state['process'] is None or state['process'].poll() is None
+        if state['read_fd'] is None:
+            return False
+
+        try:
+            written = os.read(state['read_fd'], 4096)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return False
+            raise
+
+        close()
+        if not written:
+            raise NotificationClosed('The process closed the notification descriptor without reporting readiness.')
+        state['ready'] = True
+        return True
+
+    def prepare(options):
+        """Create the pipe and pass its write end to the process - the check starts over for every process."""
+        if state['read_fd'] is not None:
+            close()
+        if state['write_fd'] is not None:
+            os.close(state['write_fd'])  # Prepared for a process that was never spawned.
+        state['ready'] = False
+        state['process'] = None
+        state['read_fd'], state['write_fd'] = os.pipe()
+        fcntl.fcntl(state['read_fd'], fcntl.F_SETFL, fcntl.fcntl(state['read_fd'], fcntl.F_GETFL) | os.O_NONBLOCK)
+        fcntl.fcntl(state['read_fd'], fcntl.F_SETFD, fcntl.fcntl(state['read_fd'], fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+
+        if fd is not None:
+            # Only the duplicate should be inherited, or closing it would not make EOF.
+            fcntl.fcntl(state['write_fd'], fcntl.F_SETFD,
+                        fcntl.fcntl(state['write_fd'], fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+
+        target = state['write_fd'] if fd is None else fd
+        options.fds[target] = state['write_fd']
+        if env is not None:
+            options.env[env] = str(target)
+
+    def attach(process):
+        """Close the write end in this process - only the spawned process should hold it, to make EOF possible."""
+        state['process'] = process
+        os.close(state['write_fd'])
+        state['write_fd'] = None
+
+    def close():
+        """Close the read end of the pipe."""
+        os.close(state['read_fd'])
+        state['read_fd'] = None
+
+    def fileno():
+        """Return the read end of the pipe, None if there's no pipe."""
+        return state['read_fd']
+
+    check_notification_fd.prepare = prepare
+    check_notification_fd.attach = attach
+    check_notification_fd.fileno = fileno
+    return check_notification_fd
@@ -0,0 +1,58 @@
+"""
+Monotonic clock.
+
+Timeouts measured with ``time.time`` stretch or shrink when the wall clock is stepped (e.g. by NTP). Python 2.7 has no
+``time.monotonic``, so ``clock_gettime(CLOCK_MONOTONIC)`` is called through libc where available.
+"""
+import sys
+import time
+import ctypes
+
+
+CLOCK_MONOTONIC = 1  # Linux value - other systems number their clocks differently and fall back to ``time.time``.
+
+
+class timespec(ctypes.Structure):
+
+    """``struct timespec`` from ``time.h``."""
+
+    _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+
+def libc_clock_gettime():
+    """
+    Return the libc ``clock_gettime`` function or None if not available or not working.
+
+    :rtype: (ctypes._CFuncPtr, NoneType)
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+
+    try:
+        clock_gettime = ctypes.CDLL(None, use_errno=True).clock_gettime
+    except (OSError, AttributeError):
+        return None
+
+    clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+    if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(timespec())) != 0:
+        return None
+    return clock_gettime
+
+
+_clock_gettime = libc_clock_gettime()
+
+
+def monotonic():
+    """
+    Return the value of a monotonic clock, in seconds.
+
+    Only differences between the values make sense. Falls back to ``time.time`` if there's no monotonic clock.
+
+    :rtype: float
+    """
+    if _clock_gettime is None:
+        return time.time()
+
+    now = timespec()
+    _clock_gettime(CLOCK_MONOTONIC, ctypes.byref(now))
+    return now.tv_sec + now.tv_nsec * 1e-9
@@ -0,0 +1,163 @@
+"""
+Checks combined from other checks.
+
+A combined check passes when enough of its sub-checks pass - all of them, any of them or a quorum. The sub-checks are
+called until the result is decided and the rest are skipped, so e.g. a quorum of a large pool of workers costs only
+as many probes as needed. The combined check forwards the deadline (see ``spawn_and_check.context``), the process
+(``attach``), the spawn options (``prepare``), the wake-up descriptors (``filenos``) and the release of resources
+(``close``) to its sub-checks.
+"""
+import threading
+from itertools import imap
+
+from spawn_and_check.polling import call_check, wakeup_fds
+
+
+class CombinedCheck(object):
+
+    """
+    Check passing when at least ``required`` of its sub-checks pass.
+
+    Sub-checks that failed in the most recent call are kept in ``failing`` and shown in the representation, so that
+    ``TimedOut`` tells which ones kept the combined check from passing.
+    """
+
+    def __init__(self, name, checks, required, imap_fn=imap):
+        """
+        Store the sub-checks.
+
+        :param str name: name of the combined check, for its representation
+        :param list checks: sub-checks
+        :param int required: number of sub-checks that have to pass
+        :param function imap_fn: function calling the sub-checks, with the signature of ``itertools.imap`` - the
+            sub-checks are called one after another, only until the result is decided. Pass
+            ``multiprocessing.pool.ThreadPool(size).imap_unordered`` (or ``gevent.pool.Pool(size).imap_unordered``)
+            to call them concurrently - those not started yet when the result is decided are skipped. Those still
+            running then are not waited for - they are skipped by the next calls (counted as failing) until they
+            return, so that no sub-check is ever called concurrently with itself.
+        """
+        if not 0 <= required <= len(checks):
+            raise ValueError('Cannot require %d of %d checks to pass.' % (required, len(checks)))
+        self.__name__ = name
+        self.checks = list(checks)
+        self.required = required
+        self.imap_fn = imap_fn
+        self.failing = None  # Not called yet.
+        self.running = set()  # IDs of the sub-checks being called, possibly by a previous call of this check.
+        self.lock = threading.Lock()
+        # Attributes rather than methods, so that ``negated`` (through ``functools.wraps``) copies them.
+        self.accepts_context = True
+        self.prepare = self.prepare_checks
+        self.attach = self.attach_checks
+        self.filenos = self.checks_filenos
+        self.close = self.close_checks
+
+    def __call__(self, context=None):
+        """
+        Call the sub-checks until enough of them pass, or so many fail that enough cannot pass any more.
+
+        :param spawn_and_check.context.CheckContext context: passed to the sub-checks that accept it
+        :rtype: bool
+        :return: True if at least ``required`` sub-checks passed
+        """
+        decided = []  # Non-empty once decided - read by the calls running concurrently.
+
+        def call(check):
+            with self.lock:
+                if decided or id(check) in self.running:
+                    return check, None
+                self.running.add(id(check))
+            try:
+                return check, call_check(check, context)
+            finally:
+                with self.lock:
+                    self.running.discard(id(check))
+
+        passed = 0
+        failing = []
+        not_called = len(self.checks)
+        for check, result in self.imap_fn(call, self.checks):
+            not_called -= 1
+            if result:
+                passed += 1
+            else:
+                failing.append(check)
+            if passed >= self.required or passed + not_called < self.required:
+                decided.append(True)
+                break
+
+        self.failing = failing
+        return passed >= self.required
+
+    def prepare_checks(self, options):
+        """Let the sub-checks set up the process before it's spawned."""
+        for check in self.checks:
+            prepare = getattr(check, 'prepare', None)
+            if prepare is not None:
+                prepare(options)
+
+    def attach_checks(self, process):
+        """Let the sub-checks know the spawned process."""
+        for check in self.checks:
+            attach = getattr(check, 'attach', None)
+            if attach is not None:
+                attach(process)
+
+    def close_checks(self):
+        """Let the sub-checks release their resources."""
+        for check in self.checks:
+            close = getattr(check, 'close', None)
+            if close is not None:
+                close()
+
+    def checks_filenos(self):
+        """
+        Return the descriptors the sub-checks want the polling loop woken up on.
+
+        :rtype: list
+        """
+        return wakeup_fds(self.checks)
+
+    def __repr__(self):
+        """Represent the check by its requirement and the sub-checks that failed in the most recent call."""
+        if self.failing is None:
+            return '<%s %d of %r, not called>' % (self.__name__, self.required, self.checks)
+        return '<%s %d of %d, failing: %r>' % (self.__name__, self.required, len(self.checks), self.failing)
+
+
+def all_of(checks, imap_fn=imap):
+    """
+    Combine the checks into one passing when all of them pass.
+
+    Sub-checks are called until the first failing one - see ``CombinedCheck`` for ``imap_fn``.
+
+    :param list checks: sub-checks
+    :rtype: CombinedCheck
+    """
+    return CombinedCheck('all_of', checks, len(checks), imap_fn)
+
+
+def any_of(checks, imap_fn=imap):
+    """
+    Combine the checks into one passing when any of them passes.
+
+    Sub-checks are called until the first passing one - see ``CombinedCheck`` for ``imap_fn``.
+
+    :param list checks: sub-checks
+    :rtype: CombinedCheck
+    """
+    return CombinedCheck('any_of', checks, 1, imap_fn)
+
+
+def quorum(checks, required, imap_fn=imap):
+    """
+    Combine the checks into one passing when at least ``required`` of them pass.
+
+    Sub-checks are called until ``required`` of them pass or so many fail that ``required`` cannot pass any more - see
+    ``CombinedCheck`` for ``imap_fn``.
+
+    :param list checks: sub-checks
+    :param int required: number of sub-checks that have to pass
+    :rtype: CombinedCheck
+    """
+    return CombinedCheck('quorum', checks, required, imap_fn)
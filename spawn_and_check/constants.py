@@ -7,3 +7,18 @@ DEFAULT_INTERVAL = 0.1
 DEFAULT_TIMEOUT = 5
 
 TCP_TIMEOUT = 1.0
+
+OUTPUT_TAIL_SIZE = 4096  # Bytes of the most recent output kept for error messages.
+OUTPUT_MATCH_WINDOW = 1024  # Max length of an output pattern match, in bytes.
+
+SOCKET_TABLE_TTL = 0.02  # Socket tables parsed once are shared by all checks of a polling round.
+
+LISTEN_BACKLOG = 128  # Connections queued on activated sockets until the process accepts them.
+
+MIN_CHECK_TIMEOUT = 0.01  # Probe timeout given to checks called at (or past) the deadline, so they can still pass.
+
+RESOLVE_TTL = 30  # Addresses resolved once are reused by all network checks for this long.
+
+HISTORY_SIZE = 10  # Startup times kept per command.
+HISTORY_MAX_AGE = 30 * 24 * 3600  # Startup times recorded longer ago than this are not trusted any more.
+HISTORY_MARGIN = 0.2  # Dense polling starts this fraction of the fastest recorded startup time before it.
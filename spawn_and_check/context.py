@@ -0,0 +1,69 @@
+"""
+Context passed to the checks by the polling loop.
+
+Checks marked with ``accepts_context`` are called with a ``CheckContext`` telling how much time is left until their
+deadline and which process is being checked, so they can clamp the timeouts of their probes and never make the polling
+overshoot its timeout. Unmarked checks are called with no arguments, as always.
+"""
+from spawn_and_check.clock import monotonic
+from spawn_and_check.constants import MIN_CHECK_TIMEOUT
+
+
+class CheckContext(object):
+
+    """The deadline of a check and the checked process."""
+
+    def __init__(self, deadline, process=None):
+        """
+        Store the deadline and the process.
+
+        :param float deadline: time (of ``spawn_and_check.clock.monotonic``) the check should pass by
+        :param subprocess.Popen process: the checked process, None for the pre-checks
+        """
+        self.deadline = deadline
+        self.process = process
+
+    def remaining(self):
+        """
+        Return the time left until the deadline.
+
+        It's at least ``MIN_CHECK_TIMEOUT`` - the last call should be able to pass too.
+
+        :rtype: float
+        """
+        return max(MIN_CHECK_TIMEOUT, self.deadline - monotonic())
+
+    def clamp(self, timeout):
+        """
+        Shorten the timeout of a probe to the time left.
+
+        :param (float, NoneType) timeout: timeout of the probe, None - no timeout
+        :rtype: float
+        """
+        return self.remaining() if timeout is None else min(timeout, self.remaining())
+
+    def __repr__(self):
+        """Represent the context by the time left and the process."""
+        return '<CheckContext %.3fs left, process %r>' % (self.deadline - monotonic(), self.process)
+
+
+def accepts_context(check):
+    """
+    Mark the check function as accepting a ``CheckContext`` as its only argument.
+
+    :param function check: check function
+    :rtype: function
+    :return: ``check``
+    """
+    check.accepts_context = True
+    return check
+
+
+def takes_context(check):
+    """
+    Tell if the check should be called with a ``CheckContext``.
+
+    :param function check: check function
+    :rtype: bool
+    """
+    return getattr(check, 'accepts_context', False) is True  # ``is True`` - mocks have all attributes.
@@ -4,7 +4,18 @@ from spawn_and_check.polling import TimedOut
 
 class ExecutorError(Exception):
 
-    """Raised when cannot execute a command."""
+    """
+    Raised when cannot execute a command.
+
+    If the output of the process was read (e.g. by an output check), its most recent part is available as ``output``.
+    If the process sent its status or errno with ``sd_notify``, they are available as ``status`` and ``errno``.
+    Once the process was spawned, its handle is available as ``process`` - e.g. to clean up after it.
+    """
+
+    output = None
+    status = None
+    errno = None
+    process = None
 
 
 class ChecksFailed(ExecutorError):
@@ -30,3 +41,8 @@ class CannotTerminate(ChecksFailed, TimedOut):
 class SubprocessExited(ExecutorError):
 
     """Raised if a process ended before all post-checks went OK."""
+
+
+class NotificationClosed(SubprocessExited):
+
+    """Raised if the process closed its readiness notification descriptor without reporting readiness."""
@@ -6,23 +6,42 @@ The point is to run the command and report the process is OK as fast as possible
 With one check the thing is simple - just check repeatedly. If the check is particulary I/O or CPU-intensive,
 add some sleep to leave more resources for the booting application.
 
-With multiple check functions, we call them sequentially.
+With multiple check functions, we call them sequentially, unless a concurrent ``map_fn`` (e.g. a thread pool's ``map``)
+is passed - then a polling round takes as long as the slowest check.
 """
 import os
+import sys
+import fcntl
 import time
 import shlex
-import subprocess
+import socket
+import inspect
 import logging
-from functools import wraps
+from functools import wraps, partial
 
-from spawn_and_check.exceptions import PreChecksFailed, PostChecksFailed, SubprocessExited
-from spawn_and_check.polling import TimedOut, wait_until
+try:
+    # Backport of the Python 3 ``subprocess`` - creates the new session in C, without running Python code in the child.
+    from subprocess32 import Popen, PIPE
+except ImportError:
+    from subprocess import Popen, PIPE
+
+from spawn_and_check.exceptions import ExecutorError, PreChecksFailed, PostChecksFailed, SubprocessExited
+from spawn_and_check.polling import TimedOut, polled, wait_until
 from spawn_and_check.killers import terminate_gracefully
+from spawn_and_check.exit_watch import exit_notification, wake_on_exit
+from spawn_and_check.output import STREAMS, OutputReader, process_output
+from spawn_and_check.notify import NotifySocket
+from spawn_and_check.proctree import proc_available, tree_tracker
+from spawn_and_check.instrumentation import phase
+from spawn_and_check.clock import monotonic
 from spawn_and_check.constants import DEFAULT_INTERVAL, DEFAULT_TIMEOUT
 
 
 log = logging.getLogger(__name__)
 
+HISTORY_ERRORS = (IOError, OSError, ValueError, TypeError, KeyError)
+"""Errors of reading or writing the startup history - they never fail the execution."""
+
 
 def negated(fn):
     """
@@ -68,11 +87,313 @@ def parse_command(command):
     return command
 
 
+def process_running_check(process):
+    """
+    Create a check function that raises ``SubprocessExited`` if the process has exited.
+
+    :param subprocess.Popen process: process handle
+    :rtype: function
+    """
+    def check_if_process_is_still_running():
+        """Check if the process exited - if it did, raise an exception to immediately terminate the polling loop."""
+        return_code = process.poll()  # Check if exited.
+        if return_code is not None:
+            raise SubprocessExited('The process exited with %s' % return_code, return_code)
+        return True
+
+    return check_if_process_is_still_running
+
+
+def run_pre_checks(popen_command, pre_checks, **polling):
+    """
+    Poll the pre-checks, translating the timeout to ``PreChecksFailed``.
+
+    :param list popen_command: parsed command, for the error message
+    :param list pre_checks: checks to poll
+    :param polling: keyword arguments for ``wait_until``
+    :raise PreChecksFailed: if pre-checks failed
+    """
+    try:
+        wait_until(pre_checks, **polling)
+    except TimedOut as e:
+        raise PreChecksFailed(
+            'Pre-checks failed. Check for remains of the previously executed similar process.',
+            popen_command, e)
+
+
+def bind_sockets(popen_command, sockets):
+    """
+    Bind the sockets to activate, translating a failure to ``PreChecksFailed``.
+
+    :param list popen_command: parsed command, for the error message
+    :param spawn_and_check.activation.ListenSockets sockets: sockets to bind
+    :raise PreChecksFailed: if the sockets could not be bound
+    """
+    try:
+        sockets.bind()
+    except socket.error as e:
+        raise PreChecksFailed('Cannot bind the sockets to pass. Check for remains of the previously executed similar '
+                              'process.', popen_command, e)
+
+
+def supports_argument(popen, argument):
+    """
+    Tell whether ``popen`` accepts the argument, e.g. ``start_new_session``.
+
+    :param type popen: ``subprocess.Popen`` or a compatible callable, possibly wrapped in ``functools.partial``
+    :param str argument: name of the argument
+    :rtype: bool
+    """
+    while isinstance(popen, partial):
+        popen = popen.func
+    if isinstance(popen, type):
+        popen = popen.__init__
+
+    try:
+        return argument in inspect.getargspec(popen).args
+    except TypeError:  # Not a Python function (e.g. a mock) - cannot tell.
+        return False
+
+
+class SpawnOptions(object):
+
+    """Changes to the environment and file descriptors of the spawned process, requested by the checks."""
+
+    def __init__(self):
+        """Start with no changes."""
+        self.env = {}
+        self.fds = {}  # Descriptor number in the process: descriptor in this process to pass there.
+        self.pid_env = []  # Environment variables to set to the PID of the process.
+
+
+def prepare_spawn(checks):
+    """
+    Let the checks that need to set up the process before it's spawned (e.g. ``check_sd_notify``) do it.
+
+    :param list checks: check functions - those with a ``prepare`` attribute get called with ``SpawnOptions``
+    :rtype: SpawnOptions
+    """
+    options = SpawnOptions()
+    for check in checks:
+        prepare = getattr(check, 'prepare', None)
+        if prepare is not None:
+            prepare(options)
+    return options
+
+
+def base_environment(popen):
+    """
+    Return the environment ``popen`` would pass to the process.
+
+    :param type popen: ``subprocess.Popen`` or a compatible callable, possibly wrapped in ``functools.partial``
+    :rtype: dict
+    :return: the ``env`` argument fed by a ``functools.partial`` or ``os.environ``
+    """
+    while isinstance(popen, partial):
+        env = (popen.keywords or {}).get('env')
+        if env is not None:
+            return env
+        popen = popen.func
+    return os.environ
+
+
+def fed_arguments(popen):
+    """
+    Return the names of the arguments fed to ``popen`` by ``functools.partial``.
+
+    :param type popen: ``subprocess.Popen`` or a compatible callable, possibly wrapped in ``functools.partial``
+    :rtype: set
+    """
+    fed = set()
+    while isinstance(popen, partial):
+        fed.update(popen.keywords or {})
+        popen = popen.func
+    return fed
+
+
+def with_piped_output(popen):
+    """
+    Pipe the standard streams that ``popen`` does not redirect itself.
+
+    :param type popen: ``subprocess.Popen`` or a compatible callable, possibly wrapped in ``functools.partial``
+    :rtype: function
+    :return: ``popen`` feeding ``stdout=PIPE`` and ``stderr=PIPE`` unless a ``functools.partial`` feeds them already
+    """
+    redirected = fed_arguments(popen)
+    pipes = dict((name, PIPE) for name in STREAMS if name not in redirected)
+    return partial(popen, **pipes) if pipes else popen
+
+
+def baseline_arguments(popen):
+    """
+    Return the arguments keeping the defaults of ``subprocess.Popen`` of Python 2.7 where ``popen`` has other ones.
+
+    ``subprocess32.Popen`` (like the one of Python 3) closes the inherited descriptors and restores the signals ignored
+    by Python (e.g. SIGPIPE) in the child by default. Arguments fed by a ``functools.partial`` are left alone.
+
+    :param type popen: ``subprocess.Popen`` or a compatible callable, possibly wrapped in ``functools.partial``
+    :rtype: dict
+    """
+    fed = fed_arguments(popen)
+    return dict((name, False) for name in ('close_fds', 'restore_signals')
+                if name not in fed and supports_argument(popen, name))
+
+
+def remap_fds(fds):
+    """
+    Duplicate the descriptors to the numbers they should have in the spawned process (called in the child).
+
+    :param dict fds: descriptor numbers in the process mapped to the descriptors to duplicate there (possibly the same
+        numbers - duplicating them clears their close-on-exec flags)
+    """
+    # Move the descriptors out of the way first - one may occupy the number another one should get.
+    lowest_free = max(fds) + 1
+    moved = dict((target, fcntl.fcntl(source, fcntl.F_DUPFD, lowest_free)) for target, source in fds.items())
+    for target, source in moved.items():
+        os.dup2(source, target)  # The duplicate is inherited by the command - no close-on-exec flag.
+        os.close(source)
+
+
+def new_session_with_fds(fds):
+    """
+    Create a function to start a new session and remap the descriptors in the child, before the command is run.
+
+    :param dict fds: descriptor numbers in the process mapped to the descriptors to duplicate there
+    :rtype: function
+    """
+    def preexec_fn():
+        os.setsid()
+        remap_fds(fds)
+    return preexec_fn
+
+
+def with_pid_env(popen_command, names):
+    """
+    Wrap the command in a shell exporting its PID in the environment variables, before it ``exec``-s the command.
+
+    The PID is not known before the process is spawned, and the shell keeps it for the command.
+
+    :param list popen_command: parsed command
+    :param list names: names of the environment variables
+    :rtype: list
+    """
+    exports = ''.join('%s=$$; export %s; ' % (name, name) for name in names)
+    return ['/bin/sh', '-c', exports + 'exec "$0" "$@"'] + popen_command
+
+
+def spawn(popen, popen_command, options=None):
+    """
+    Run the command in a new session (and so a new process group).
+
+    ``start_new_session`` is used where ``popen`` supports it (``subprocess32`` and Python 3): the session is created
+    without running Python code in the child, so the spawn does not slow down with the memory size of the parent and
+    is safe with threads. Otherwise, ``os.setsid`` is passed as the ``preexec_fn``.
+
+    Descriptors are passed at their own numbers with ``pass_fds`` where supported, which also clears their
+    close-on-exec flags in the child. Otherwise - or if any descriptor should get another number - all of them are
+    duplicated to their numbers (clearing the flags) by the ``preexec_fn``, with ``close_fds=False``. Variables that
+    should hold the PID of the process are set by a shell wrapper.
+
+    Other than that, the process inherits the descriptors and signal dispositions like with ``subprocess.Popen`` of
+    Python 2.7, whichever ``popen`` is used (see ``baseline_arguments``).
+
+    :param type popen: ``subprocess.Popen`` or a compatible callable
+    :param list popen_command: parsed command
+    :param SpawnOptions options: changes requested by the checks
+    :rtype: subprocess.Popen
+    """
+    options = options or SpawnOptions()
+    if options.pid_env:
+        popen_command = with_pid_env(popen_command, options.pid_env)
+
+    kwargs = baseline_arguments(popen)
+    if options.env:
+        kwargs['env'] = dict(base_environment(popen), **options.env)
+
+    fds = dict(options.fds)
+    if fds and all(target == source for target, source in fds.items()) and supports_argument(popen, 'pass_fds'):
+        kwargs['pass_fds'] = sorted(fds)
+        kwargs.pop('close_fds', None)  # Forced by ``pass_fds`` - only the passed descriptors are inherited.
+        fds = {}
+
+    if fds:
+        # A descriptor kept at its own number may have the close-on-exec flag (e.g. set on the originals of
+        # duplicated ones), and ``close_fds`` would close the remapped ones with ``pass_fds`` - duplicate all.
+        kwargs['close_fds'] = False
+        return popen(popen_command, preexec_fn=new_session_with_fds(fds), **kwargs)
+
+    if supports_argument(popen, 'start_new_session'):
+        return popen(popen_command, start_new_session=True, **kwargs)
+    return popen(popen_command, preexec_fn=os.setsid, **kwargs)
+
+
+def tracks_tree(kill_fn):
+    """
+    Tell if the killer uses the process tree tracked from the spawn on (e.g. ``terminate_tree``).
+
+    :param function kill_fn: killer, possibly wrapped in ``functools.partial``
+    :rtype: bool
+    """
+    while isinstance(kill_fn, partial):
+        kill_fn = kill_fn.func
+    return getattr(kill_fn, 'tracks_tree', False) is True
+
+
+def attach_checks(checks, process):
+    """
+    Let the checks that need to know the spawned process (e.g. ``check_output``) know it.
+
+    :param list checks: check functions - those with an ``attach`` attribute get called with the process
+    :param subprocess.Popen process: spawned process
+    """
+    for check in checks:
+        attach = getattr(check, 'attach', None)
+        if attach is not None:
+            attach(process)
+
+
+def close_checks(checks):
+    """
+    Let the checks that hold resources until they pass (e.g. the socket of ``check_sd_notify``) release them.
+
+    :param list checks: check functions - those with a ``close`` attribute get called
+    """
+    for check in checks:
+        close = getattr(check, 'close', None)
+        if close is not None:
+            close()
+
+
+def with_details(error, process):
+    """
+    Set what the process told about itself on the exception.
+
+    That is the process handle, the most recent output, if the output was read, and the status and errno, if sent
+    with ``sd_notify``.
+
+    :param ExecutorError error: exception to raise
+    :param subprocess.Popen process: spawned process
+    :rtype: ExecutorError
+    :return: ``error``
+    """
+    error.process = process
+    reader = getattr(process, 'output', None)
+    if isinstance(reader, OutputReader):
+        error.output = reader.tail()
+
+    notify_socket = getattr(process, 'notify_socket', None)
+    if isinstance(notify_socket, NotifySocket):
+        error.status = notify_socket.status
+        error.errno = notify_socket.errno
+    return error
+
+
 def execute(command,
             checks, pre_checks=None,
             kill_fn=terminate_gracefully,
             interval=DEFAULT_INTERVAL, timeout=DEFAULT_TIMEOUT,
-            sleep_fn=time.sleep, popen=subprocess.Popen):
+            sleep_fn=time.sleep, popen=Popen, map_fn=map, schedule=None, latch=False,
+            instrumentation=None, sockets=None, history=None, capture_output=None, track_tree=None):
     """
     Fire pre-checks, run the command and fire post-checks.
 
@@ -89,50 +410,142 @@ def execute(command,
 
     :param (str, list) command: shell command to pass to ``subprocess.Popen``. If it is a string,
         will be parsed into a list with ``shlex.split``.
-    :param list checks: list of check functions (signature: () -> bool)
+    :param list checks: list of check functions (signature: () -> bool, see ``spawn_and_check.context`` for checks
+        accepting the deadline)
     :param (list, NoneType) pre_checks: list of checks fire before the command. If None, negated
         ``checks`` functions will be used. They should return True if the command is clear to
         execute.
+    :param function kill_fn: function called with the process handle to kill the process if
+        post-checks fail. It is not given ``sleep_fn`` - when working in the gevent environment,
+        pass e.g. ``functools.partial(terminate_gracefully, sleep_fn=gevent.sleep)``.
     :param float interval: time to sleep between checks
     :param float timeout: time limit for pre-checks, post-checks and killers
     :param function sleep_fn: function to sleep, ``time.sleep`` by default. Pass ``gevent.sleep``
         when working in the gevent environment.
-    :param type popen: thingy to use in place of ``subprocess.Popen``. Feel free to pass
-        a ``functools.partial`` on ``subprocess.Popen`` that feeds some arguments.
-        ``popen`` will be called with the passed ``command`` and ``preexec_fn=os.setsid`` to set
-        a new group ID for the spawned process to make killing processes that spawn their children
-        easier. The latter also makes it crash under Windows.
+    :param type popen: thingy to use in place of ``subprocess.Popen`` (``subprocess32.Popen`` if
+        installed - see the ``subprocess32`` extra). Feel free to pass a ``functools.partial`` on
+        ``subprocess.Popen`` that feeds some arguments. ``popen`` will be called with the passed
+        ``command`` and ``start_new_session=True`` (if it accepts it) or ``preexec_fn=os.setsid`` to
+        set a new group ID for the spawned process to make killing processes that spawn their
+        children easier. The latter also makes it crash under Windows. ``close_fds=False`` and
+        ``restore_signals=False`` are passed where ``popen`` accepts them, unless fed by the
+        ``functools.partial`` - so that the process inherits the same descriptors and signal
+        dispositions whether ``subprocess32`` is installed or not.
+    :param function map_fn: function to call the checks of a polling round with, ``map`` by default. Pass
+        ``multiprocessing.pool.ThreadPool(size).map`` or ``gevent.pool.Pool(size).map`` to run the checks concurrently.
+    :param iterable schedule: intervals between polling rounds overriding ``interval``, e.g.
+        ``spawn_and_check.schedules.ExponentialBackoff()`` for services that boot slowly
+    :param bool latch: if True, checks that passed once are not called again while the others are
+        polled. The process exit is still checked every round. Checks may also have their own
+        intervals and timeouts - see ``spawn_and_check.polling.polled``.
+    :param spawn_and_check.instrumentation.Instrumentation instrumentation: collector of timings
+        of the phases: 'pre_checks', 'spawn', 'post_checks' and 'kill' (the latter only if
+        post-checks fail). Pass it to the killer too (e.g. with ``functools.partial``) to get
+        the details of killing.
+    :param spawn_and_check.activation.ListenSockets sockets: listening sockets to bind before
+        the pre-checks and pass to the process (socket activation). A port conflict fails the
+        execution right away, so pre-checks are skipped unless passed explicitly. Checks that
+        connect to the sockets pass as soon as they are bound - use the other checks.
+    :param spawn_and_check.history.StartupHistory history: startup times of commands. Unless a
+        ``schedule`` is passed, post-checks of a command with a known startup time are polled
+        a few times before it and every ``interval`` from shortly before it on. The startup
+        time of this execution is recorded. Failures to read or record the times are only
+        logged.
+    :param int capture_output: number of the most recent bytes of the output to keep. If passed,
+        stdout and stderr (unless ``popen`` redirects them) are piped and read by a background
+        thread for as long as the process runs, so that it never blocks on a full pipe. The tail
+        is available as ``process.output.tail()``.
+    :param bool track_tree: if True, the descendants of the process are tracked in ``/proc`` from the spawn on and
+        during the post-checks, so that daemons that double-fork are not lost when their parents exit. The tree is set
+        as ``process.tree`` (see ``spawn_and_check.killers.terminate_tree``), and ``kill_fn`` is called even if the
+        process exits during the post-checks - to terminate what it left behind. By default, it's tracked if
+        ``kill_fn`` uses it and ``/proc`` is available.
     :rtype: subprocess.Popen
     :return: process handle
-    :raise PreChecksFailed: if pre-checks failed
+    :raise PreChecksFailed: if pre-checks failed or the sockets could not be bound
     :raise PostChecksFailed: if post-checks kept failing until the polling timed out
     :raise SubprocessExited: if the process exited during the polling
+
+    The process handle is set as ``process`` on the exceptions raised once the process is spawned (including
+    ``CannotTerminate`` raised by ``kill_fn``). If the output of the process was read (see ``check_output`` and
+    ``capture_output``), the most recent part of it is set as ``output`` on them. So are ``status`` and ``errno`` sent
+    by the process with ``sd_notify`` (see ``check_sd_notify``).
     """
     popen_command = parse_command(command)
+    preparing = list(checks)
+
+    post_schedule = None
+    if history is not None and schedule is None:
+        try:
+            post_schedule = history.schedule(popen_command, interval)
+        except HISTORY_ERRORS as e:
+            log.warning('Cannot read the startup times from %s: %s', history.path, e)
+
+    if sockets is not None:
+        bind_sockets(popen_command, sockets)
+        preparing.append(sockets)
+        if pre_checks is None:
+            pre_checks = []
 
     if pre_checks is None:
         pre_checks = map(negated, checks)
 
+    if track_tree is None:
+        track_tree = tracks_tree(kill_fn) and proc_available()
+    if track_tree:
+        tracker = tree_tracker()
+        preparing.append(tracker)
+        checks = checks + [polled(tracker, latch=False)]
+
+    polling = dict(interval=interval, timeout=timeout, sleep_fn=sleep_fn, map_fn=map_fn, schedule=schedule, latch=latch)
+
     try:
-        wait_until(pre_checks, timeout=timeout, interval=interval, sleep_fn=sleep_fn)
-    except TimedOut as e:
-        raise PreChecksFailed(
-            'Pre-checks failed. Check for remains of the previously executed similar process.',
-            popen_command, e)
+        with phase(instrumentation, 'pre_checks') as stats:
+            run_pre_checks(popen_command, pre_checks, stats=stats, **polling)
 
-    process = popen(popen_command, preexec_fn=os.setsid)
+        with phase(instrumentation, 'spawn'):
+            if capture_output is not None:
+                popen = with_piped_output(popen)
+            process = spawn(popen, popen_command, prepare_spawn(preparing))
+            spawned_at = monotonic()
+            if capture_output is not None:
+                reader = process_output(process, capture_output)
+            attach_checks(preparing, process)
+            if capture_output is not None:
+                reader.drain()  # Once the output checks subscribed - they must not miss the first chunks.
+    finally:
+        if sockets is not None:
+            sockets.close()  # Either the process has them or it won't be spawned.
 
-    def check_if_process_is_still_running():
-        """Check if the process exited - if it did, raise an exception to immediately terminate the polling loop."""
-        return_code = process.poll()  # Check if exited.
-        if return_code is not None:
-            raise SubprocessExited('The process exited with %s' % return_code, return_code)
-        return True
+    if post_schedule is not None:
+        polling['schedule'] = post_schedule
 
     try:
-        wait_until(checks + [check_if_process_is_still_running], timeout=timeout, interval=interval, sleep_fn=sleep_fn)
-    except TimedOut as e:
-        kill_fn(process)
-        raise PostChecksFailed(popen_command, 'Post-checks failed.', e)
+        try:
+            with exit_notification(process) as notification, phase(instrumentation, 'post_checks') as stats:
+                guard = polled(wake_on_exit(process_running_check(process), notification), latch=False)
+                wait_until(checks + [guard], stats=stats, process=process, **polling)
+        except TimedOut as e:
+            with phase(instrumentation, 'kill'):
+                kill_fn(process)
+            raise PostChecksFailed(popen_command, 'Post-checks failed.', e)
+        except SubprocessExited:
+            exc_info = sys.exc_info()
+            if process.poll() is None or track_tree:
+                # The process gave up on starting (e.g. closed its readiness notification descriptor) but still runs,
+                # or it exited leaving its descendants (e.g. a daemon it forked) behind.
+                kill_fn(process)
+            raise exc_info[0], exc_info[1], exc_info[2]
+    except ExecutorError:
+        exc_info = sys.exc_info()
+        with_details(exc_info[1], process)
+        close_checks(checks)  # Once their details are read - the checks won't be called again.
+        raise exc_info[0], exc_info[1], exc_info[2]
+
+    if history is not None:
+        try:
+            history.record(popen_command, monotonic() - spawned_at)
+        except HISTORY_ERRORS as e:
+            log.warning('Cannot record the startup time in %s: %s', history.path, e)
 
     return process
@@ -0,0 +1,225 @@
+"""
+Notifications about processes exiting.
+
+Polling loops sleep for ``interval`` between checks, so a process exit is normally noticed up to ``interval`` seconds
+late. The notifications below provide a file descriptor that becomes readable when the process exits so that the
+polling loop can wake up immediately (see ``spawn_and_check.polling.wait_until``).
+
+On Linux >= 5.3 a pidfd is used. Elsewhere, a pipe written to from a SIGCHLD handler is used - but only in the main
+thread and only if nobody else handles SIGCHLD. Otherwise there is no notification and the polling loop just sleeps.
+"""
+import os
+import sys
+import errno
+import fcntl
+import ctypes
+import signal
+import threading
+from functools import wraps
+from contextlib import contextmanager
+
+
+SYS_PIDFD_OPEN = 434
+"""``pidfd_open`` syscall number - the same on all architectures since the syscall tables were unified."""
+
+
+def libc_syscall():
+    """
+    Return the libc ``syscall`` function or None if not available.
+
+    :rtype: (ctypes._CFuncPtr, NoneType)
+    """
+    try:
+        syscall = ctypes.CDLL(None, use_errno=True).syscall
+    except (OSError, AttributeError):
+        return None
+    syscall.restype = ctypes.c_long
+    return syscall
+
+
+def pidfd_open(pid):
+    """
+    Open a file descriptor referring to the process.
+
+    :param int pid: process ID
+    :rtype: (int, NoneType)
+    :return: pidfd or None if pidfds are not supported (non-Linux, old kernel, seccomp filters)
+    """
+    if not sys.platform.startswith('linux') or not isinstance(pid, (int, long)):
+        return None
+
+    syscall = libc_syscall()
+    if syscall is None:
+        return None
+
+    fd = syscall(ctypes.c_long(SYS_PIDFD_OPEN), ctypes.c_long(pid), ctypes.c_long(0))
+    if fd < 0:
+        return None
+
+    fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+    return fd
+
+
+class PidfdNotification(object):
+
+    """Exit notification backed by a pidfd - it becomes readable when the process exits."""
+
+    def __init__(self, pidfd):
+        """
+        Store the pidfd.
+
+        :param int pidfd: file descriptor returned by ``pidfd_open``
+        """
+        self.pidfd = pidfd
+
+    def fileno(self):
+        """Return the file descriptor to wait on."""
+        return self.pidfd
+
+    def clear(self):
+        """Nothing to clear - the pidfd stays readable after the exit and that is fine."""
+
+    def close(self):
+        """Close the pidfd."""
+        os.close(self.pidfd)
+
+
+class SigchldNotification(object):
+
+    """Exit notification backed by a pipe written to by a SIGCHLD handler."""
+
+    def __init__(self):
+        """Create the pipe and install the SIGCHLD handler, remembering the previous one."""
+        self.read_fd, self.write_fd = os.pipe()
+        for fd in self.read_fd, self.write_fd:
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+            fcntl.fcntl(fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) | fcntl.FD_CLOEXEC)
+
+        self.previous_handler = signal.signal(signal.SIGCHLD, self.notify)
+        # Restart system calls interrupted by the handler - only the sleep is supposed to be woken up.
+        signal.siginterrupt(signal.SIGCHLD, False)
+
+    def notify(self, signum, frame):
+        """Handle SIGCHLD by writing to the pipe (any child exiting wakes the polling loop up)."""
+        try:
+            os.write(self.write_fd, b'\0')
+        except OSError as e:
+            if e.errno != errno.EAGAIN:  # The pipe is full - the loop will wake up anyway.
+                raise
+
+    def fileno(self):
+        """Return the file descriptor to wait on."""
+        return self.read_fd
+
+    def clear(self):
+        """Read everything written to the pipe so that it does not wake the loop up any more."""
+        try:
+            while os.read(self.read_fd, 4096):
+                pass
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+
+    def close(self):
+        """Restore the previous SIGCHLD handler and close the pipe."""
+        signal.signal(signal.SIGCHLD, self.previous_handler)
+        os.close(self.read_fd)
+        os.close(self.write_fd)
+
+
+def can_handle_sigchld():
+    """
+    Tell if a SIGCHLD handler can be installed without interfering with anybody.
+
+    :rtype: bool
+    """
+    is_main_thread = isinstance(threading.current_thread(), threading._MainThread)
+    return is_main_thread and signal.getsignal(signal.SIGCHLD) == signal.SIG_DFL
+
+
+@contextmanager
+def exit_notification(process):
+    """
+    Create an exit notification for the process, if possible.
+
+    Enter the context before sending the process a signal, so that the exit is not missed.
+
+    :param subprocess.Popen process: process to watch
+    :return: context manager yielding an object with ``fileno`` and ``clear`` methods or None
+    """
+    if process.returncode is not None:
+        # Already reaped - the PID may belong to some other process now.
+        yield None
+        return
+
+    pidfd = pidfd_open(process.pid)
+    if pidfd is not None:
+        notification = PidfdNotification(pidfd)
+    elif can_handle_sigchld():
+        notification = SigchldNotification()
+    else:
+        yield None
+        return
+
+    try:
+        yield notification
+    finally:
+        notification.close()
+
+
+@contextmanager
+def exit_notifications(processes):
+    """
+    Create exit notifications for many processes at once, where possible.
+
+    Each process gets its own pidfd if supported. Otherwise, all processes share one SIGCHLD notification (any child
+    exiting wakes the polling loop up anyway).
+
+    :param list processes: processes to watch
+    :return: context manager yielding a list of notifications (or Nones), in the order of the processes
+    """
+    created = []
+
+    def notification_for(process):
+        if process.returncode is not None:
+            return None
+
+        pidfd = pidfd_open(process.pid)
+        if pidfd is not None:
+            created.append(PidfdNotification(pidfd))
+            return created[-1]
+
+        shared = [notification for notification in created if isinstance(notification, SigchldNotification)]
+        if shared:
+            return shared[0]
+        if can_handle_sigchld():
+            created.append(SigchldNotification())
+            return created[-1]
+        return None
+
+    try:
+        yield [notification_for(process) for process in processes]
+    finally:
+        for notification in created:
+            notification.close()
+
+
+def wake_on_exit(check, notification):
+    """
+    Make the polling loop wake up as soon as the process exits to call the check.
+
+    :param function check: check function that detects the process exit
+    :param notification: exit notification created by ``exit_notification`` or None
+    :rtype: function
+    :return: check function with a ``fileno`` method for ``wait_until``, or ``check`` if there's no notification
+    """
+    if notification is None:
+        return check
+
+    @wraps(check)
+    def check_woken_on_exit(*args, **kwargs):
+        notification.clear()
+        return check(*args, **kwargs)
+
+    check_woken_on_exit.fileno = notification.fileno
+    return check_woken_on_exit
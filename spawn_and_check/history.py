@@ -0,0 +1,146 @@
+"""
+Startup times of commands, persisted between executions.
+
+A service's startup time is usually stable. Knowing it, ``execute`` probes the service only a few times before it can
+be ready and densely from shortly before then on (see ``spawn_and_check.schedules.Predicted``), instead of every
+``interval`` from the start.
+
+Times are kept by the parsed command. Times recorded too long ago or for a different build of the executable (its
+modification time changed) are not trusted - the polling falls back to the normal schedule until new ones are recorded.
+"""
+import os
+import json
+import time
+import errno
+import tempfile
+from distutils.spawn import find_executable
+
+from spawn_and_check.schedules import Predicted
+from spawn_and_check.constants import HISTORY_SIZE, HISTORY_MAX_AGE, HISTORY_MARGIN
+
+
+def executable_mtime(command):
+    """
+    Return the modification time of the executable of the command.
+
+    :param list command: parsed command
+    :rtype: (float, NoneType)
+    :return: modification time or None if the executable cannot be found
+    """
+    path = command[0] if os.path.dirname(command[0]) else find_executable(command[0])
+    try:
+        return os.stat(path).st_mtime if path else None
+    except OSError:
+        return None
+
+
+def valid_entry(entry):
+    """
+    Tell if an entry read from the file has the expected fields (of the expected types).
+
+    :rtype: bool
+    """
+    number = (int, long, float)
+    return (isinstance(entry, dict) and
+            isinstance(entry.get('startup_times'), list) and
+            all(isinstance(startup_time, number) for startup_time in entry['startup_times']) and
+            isinstance(entry.get('recorded_at'), number) and
+            isinstance(entry.get('executable_mtime'), number + (type(None),)))
+
+
+class StartupHistory(object):
+
+    """Startup times of commands, stored in a JSON file."""
+
+    def __init__(self, path, size=HISTORY_SIZE, max_age=HISTORY_MAX_AGE, margin=HISTORY_MARGIN):
+        """
+        Store the parameters - the file is read and written on every use.
+
+        :param str path: path to the file, created when the first time is recorded
+        :param int size: number of most recent startup times kept per command
+        :param float max_age: time after which recorded startup times are not trusted any more
+        :param float margin: dense polling starts this fraction of the fastest recorded startup time before it
+        """
+        self.path = path
+        self.size = size
+        self.max_age = max_age
+        self.margin = margin
+
+    def load(self):
+        """
+        Read the file.
+
+        :rtype: dict
+        :return: entries by command, empty if there's no file or it's corrupt; corrupt entries are left out
+        """
+        try:
+            with open(self.path) as history_file:
+                entries = json.load(history_file)
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            return {}
+        except ValueError:
+            return {}  # Corrupt, e.g. written by something else - start over.
+        if not isinstance(entries, dict):
+            return {}
+        return dict((key, entry) for key, entry in entries.items() if valid_entry(entry))
+
+    def startup_times(self, command, entries=None):
+        """
+        Return the trusted startup times of the command.
+
+        :param list command: parsed command
+        :param dict entries: entries already loaded from the file, loaded anew if None
+        :rtype: list
+        :return: startup times, empty if none were recorded, they are stale or the executable changed
+        """
+        entry = (self.load() if entries is None else entries).get(json.dumps(command))
+        if entry is None or entry['executable_mtime'] != executable_mtime(command):
+            return []
+        if time.time() - entry['recorded_at'] > self.max_age:
+            return []
+        return entry['startup_times']
+
+    def schedule(self, command, interval):
+        """
+        Return the polling schedule for the command.
+
+        :param list command: parsed command
+        :param float interval: interval of the dense polling
+        :rtype: (spawn_and_check.schedules.Predicted, NoneType)
+        :return: schedule probing densely from shortly before the fastest recorded startup, or None if the startup
+            time is unknown
+        """
+        startup_times = self.startup_times(command)
+        if not startup_times:
+            return None
+        return Predicted(min(startup_times) * (1 - self.margin), interval)
+
+    def record(self, command, startup_time):
+        """
+        Record the startup time of the command.
+
+        The file is replaced atomically, so concurrent executions never read a partially written one (one of
+        concurrent updates may be lost, though).
+
+        :param list command: parsed command
+        :param float startup_time: time from spawning the process until its checks passed
+        """
+        entries = self.load()
+        startup_times = self.startup_times(command, entries)  # Dropping the untrusted ones.
+        entries[json.dumps(command)] = {
+            'startup_times': (startup_times + [startup_time])[-self.size:],
+            'executable_mtime': executable_mtime(command),
+            'recorded_at': time.time(),
+        }
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix='.startup_history')
+        try:
+            with os.fdopen(descriptor, 'w') as temporary_file:
+                json.dump(entries, temporary_file)
+            os.rename(temporary_path, self.path)
+        except Exception:
+            os.remove(temporary_path)
+            raise
@@ -0,0 +1,115 @@
+"""
+Directory watches for file checks.
+
+A check of a file that is about to appear or change can wake the polling loop up as soon as something happens in the
+directory of the file, instead of waiting for the next ``interval`` tick (see ``spawn_and_check.polling.wait_until``).
+
+The watches use Linux inotify through libc. Where inotify is not available (other systems, some network filesystems,
+exhausted watch limits), there's no file descriptor to wait on and the file is simply checked every ``interval``.
+"""
+import os
+import sys
+import errno
+import ctypes
+
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+WATCHED_EVENTS = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+
+def inotify_functions():
+    """
+    Return libc ``inotify_init1`` and ``inotify_add_watch`` functions or None if not available.
+
+    :rtype: (tuple, NoneType)
+    """
+    if not sys.platform.startswith('linux'):
+        return None
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        return libc.inotify_init1, libc.inotify_add_watch
+    except (OSError, AttributeError):
+        return None
+
+
+class DirectoryWatch(object):
+
+    """
+    Inotify watch on the directory of a file, created lazily.
+
+    The directory is watched (not the file) because the file may not exist yet.
+    """
+
+    def __init__(self, path):
+        """
+        Store the path - nothing is watched until the file descriptor is needed.
+
+        :param str path: path to a file whose directory will be watched
+        """
+        self.directory = os.path.dirname(os.path.abspath(path))
+        self.fd = None
+        self.unsupported = False
+
+    def fileno(self):
+        """
+        Return the inotify file descriptor, creating the watch on first use.
+
+        :rtype: (int, NoneType)
+        :return: file descriptor readable when something happened in the directory or None if cannot watch
+        """
+        if self.fd is None and not self.unsupported:
+            self.fd = self.create()
+            self.unsupported = self.fd is None
+        return self.fd
+
+    def create(self):
+        """
+        Create the inotify instance and watch the directory.
+
+        :rtype: (int, NoneType)
+        :return: file descriptor or None if inotify is not available for the directory
+        """
+        functions = inotify_functions()
+        if functions is None:
+            return None
+        inotify_init1, inotify_add_watch = functions
+
+        fd = inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            return None
+
+        if inotify_add_watch(fd, self.directory, WATCHED_EVENTS) < 0:
+            os.close(fd)
+            return None
+
+        return fd
+
+    def clear(self):
+        """Read all pending events - they only mean 'check again', so their content does not matter."""
+        if self.fd is None:
+            return
+
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+
+    def close(self):
+        """Stop watching the directory."""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def __del__(self):
+        """Close the file descriptor when the check is garbage collected."""
+        self.close()
@@ -0,0 +1,230 @@
+"""
+Timings of the executor and the polling loops.
+
+Pass an ``Instrumentation`` object to ``execute`` (or the killers) to find out where the startup time goes: pre-checks,
+spawning, post-checks or killing - and within the polling phases, how long each check takes, how many times it was
+called, when it passed first and how much time was spent sleeping versus probing.
+
+Without an ``Instrumentation`` object, nothing is measured beyond what the polling loop needs anyway.
+"""
+import threading
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from spawn_and_check.clock import monotonic
+from spawn_and_check.polling import call_check
+
+
+HISTOGRAM_BOUNDS = (0.0001, 0.0002, 0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10)
+"""Upper bounds of latency histogram buckets, in seconds. The last bucket is unbounded."""
+
+
+class Histogram(object):
+
+    """Latency histogram with fixed buckets."""
+
+    def __init__(self, bounds=HISTOGRAM_BOUNDS):
+        """
+        Create an empty histogram.
+
+        :param tuple bounds: sorted upper bounds of the buckets
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        """Count the value in its bucket."""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def report(self):
+        """
+        Return the histogram as a dict.
+
+        :rtype: dict
+        :return: min, max, total and counts of non-empty buckets by their upper bounds (None - unbounded)
+        """
+        upper_bounds = list(self.bounds) + [None]
+        return {
+            'min': self.min,
+            'max': self.max,
+            'total': self.total,
+            'buckets': [[bound, count] for bound, count in zip(upper_bounds, self.counts) if count],
+        }
+
+
+class CheckStats(object):
+
+    """Statistics of a single check in a polling phase."""
+
+    def __init__(self, check):
+        """
+        Start with no calls.
+
+        :param function check: the check
+        """
+        self.name = getattr(check, '__name__', repr(check))
+        self.calls = 0
+        self.passes = 0
+        self.time_to_first_pass = None
+        self.latency = Histogram()
+
+    def report(self):
+        """
+        Return the statistics as a dict.
+
+        :rtype: dict
+        """
+        return {
+            'check': self.name,
+            'calls': self.calls,
+            'passes': self.passes,
+            'time_to_first_pass': self.time_to_first_pass,
+            'latency': self.latency.report(),
+        }
+
+
+class PhaseStats(object):
+
+    """Statistics of a phase of the execution - a polling loop, spawning or killing."""
+
+    def __init__(self, name, callback=None):
+        """
+        Start the phase.
+
+        :param str name: name of the phase
+        :param function callback: function called with the event name, this phase and keyword details of the event
+        """
+        self.name = name
+        self.callback = callback
+        self.start = monotonic()
+        self.duration = None
+        self.rounds = 0
+        self.probing = 0.0
+        self.sleeping = 0.0
+        self.checks = OrderedDict()
+        self.lock = threading.Lock()  # Checks may be called concurrently.
+
+    def emit(self, event, **details):
+        """Call the callback, if any."""
+        if self.callback is not None:
+            self.callback(event, self, **details)
+
+    def call_check(self, check, context=None):
+        """
+        Call the check, measuring its latency.
+
+        :param function check: check function to call
+        :param spawn_and_check.context.CheckContext context: passed to the check if it accepts it
+        :rtype: bool
+        :return: check's return value
+        """
+        call_start = monotonic()
+        result = call_check(check, context)
+        call_end = monotonic()
+
+        with self.lock:
+            stats = self.checks.get(check)
+            if stats is None:
+                stats = self.checks[check] = CheckStats(check)
+            stats.calls += 1
+            stats.latency.add(call_end - call_start)
+            if result:
+                stats.passes += 1
+                if stats.time_to_first_pass is None:
+                    stats.time_to_first_pass = call_end - self.start
+
+        self.emit('check', check=check, duration=call_end - call_start, result=result)
+        return result
+
+    def record_round(self, duration):
+        """Count a polling round that took ``duration`` seconds."""
+        self.rounds += 1
+        self.probing += duration
+        self.emit('round', duration=duration)
+
+    def record_sleep(self, duration):
+        """Count the time slept between the polling rounds."""
+        self.sleeping += duration
+        self.emit('sleep', duration=duration)
+
+    def finish(self):
+        """End the phase."""
+        self.duration = monotonic() - self.start
+        self.emit('phase_end')
+
+    def report(self):
+        """
+        Return the statistics as a dict.
+
+        :rtype: dict
+        """
+        return {
+            'phase': self.name,
+            'duration': self.duration,
+            'rounds': self.rounds,
+            'probing': self.probing,
+            'sleeping': self.sleeping,
+            'checks': [stats.report() for stats in self.checks.values()],
+        }
+
+
+class Instrumentation(object):
+
+    """Collector of the statistics of all phases of an execution."""
+
+    def __init__(self, callback=None):
+        """
+        Start with no phases.
+
+        :param function callback: function called on every event with the event name ('phase_start', 'check',
+            'round', 'sleep' or 'phase_end'), the ``PhaseStats`` object and keyword details of the event
+        """
+        self.callback = callback
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Measure a phase of the execution.
+
+        :param str name: name of the phase
+        :return: context manager yielding ``PhaseStats``
+        """
+        stats = PhaseStats(name, self.callback)
+        self.phases.append(stats)
+        stats.emit('phase_start')
+        try:
+            yield stats
+        finally:
+            stats.finish()
+
+    def report(self):
+        """
+        Return the statistics of all phases, in order, in a form that can be dumped as JSON.
+
+        :rtype: list
+        """
+        return [stats.report() for stats in self.phases]
+
+
+@contextmanager
+def phase(instrumentation, name):
+    """
+    Measure a phase of the execution if there's an ``Instrumentation`` object.
+
+    :param (Instrumentation, NoneType) instrumentation:
+    :param str name: name of the phase
+    :return: context manager yielding ``PhaseStats`` or None
+    """
+    if instrumentation is None:
+        yield None
+    else:
+        with instrumentation.phase(name) as stats:
+            yield stats
@@ -10,9 +10,24 @@ import errno
 import time
 from signal import SIGKILL, SIGTERM
 from os import killpg
+from collections import OrderedDict, namedtuple
 from spawn_and_check.polling import TimedOut, wait_until
 from spawn_and_check.constants import DEFAULT_INTERVAL, DEFAULT_TIMEOUT
 from spawn_and_check.exceptions import CannotTerminate
+from spawn_and_check.exit_watch import exit_notification, exit_notifications, wake_on_exit
+from spawn_and_check.instrumentation import phase
+from spawn_and_check.clock import monotonic
+from spawn_and_check.proctree import ProcessTree, proc_available
+
+
+EXITED = 'exited'
+"""Outcome of ``terminate_many``: the process had exited before it was signalled."""
+TERMINATED = 'terminated'
+"""Outcome of ``terminate_many``: the process exited after the graceful signal."""
+KILLED = 'killed'
+"""Outcome of ``terminate_many``: the process exited after SIGKILL."""
+UNKILLABLE = 'unkillable'
+"""Outcome of ``terminate_many``: the process survived SIGKILL (e.g. stuck in uninterruptible sleep)."""
 
 
 def killpg_if_alive(group_id, signal):
@@ -34,22 +49,27 @@ def killpg_if_alive(group_id, signal):
 
 
 def killpg_and_check(process, signal, interval=DEFAULT_INTERVAL,
-                     timeout=DEFAULT_TIMEOUT, sleep_fn=time.sleep):
+                     timeout=DEFAULT_TIMEOUT, sleep_fn=time.sleep, instrumentation=None):
     """
     Send a signal to the process group and wait the parent process terminates.
 
-    The parent process exiting on its own at any moment is accepted.
+    The parent process exiting on its own at any moment is accepted. Where supported, the exit
+    is noticed as soon as it happens, not at the next ``interval`` tick.
 
     :param subprocess.Popen process: process to kill
     :param float interval: time to sleep between termination status checks
     :param float timeout: time limit to wait for graceful termination
     :param function sleep_fn: function to sleep
+    :param spawn_and_check.instrumentation.Instrumentation instrumentation: collector of timings,
+        the phase is named after the signal, e.g. 'signal 15'
     :raise CannotTerminate: if the process won't terminate
     """
-    killpg_if_alive(process.pid, signal)
     try:
-        wait_until(lambda: process.poll() is not None,
-                   timeout=timeout, interval=interval, sleep_fn=sleep_fn)
+        with exit_notification(process) as notification, \
+                phase(instrumentation, 'signal {}'.format(signal)) as stats:
+            killpg_if_alive(process.pid, signal)
+            wait_until(wake_on_exit(lambda: process.poll() is not None, notification),
+                       timeout=timeout, interval=interval, sleep_fn=sleep_fn, stats=stats)
     except TimedOut:
         raise CannotTerminate(
             'Process failed to shut down after sending signal {}.'.format(signal),
@@ -57,7 +77,7 @@ def killpg_and_check(process, signal, interval=DEFAULT_INTERVAL,
 
 
 def terminate_gracefully(process, signal=SIGTERM, interval=DEFAULT_INTERVAL,
-                         timeout=DEFAULT_TIMEOUT, sleep_fn=time.sleep):
+                         timeout=DEFAULT_TIMEOUT, sleep_fn=time.sleep, instrumentation=None):
     """
     Try to terminate the process gracefully, if the process won't terminate, send SIGKILL.
 
@@ -68,17 +88,18 @@ def terminate_gracefully(process, signal=SIGTERM, interval=DEFAULT_INTERVAL,
     :param float interval: time to sleep between termination status checks
     :param float timeout: time limit to wait for graceful termination
     :param function sleep_fn: function to sleep
+    :param spawn_and_check.instrumentation.Instrumentation instrumentation: collector of timings
     """
     try:
-        killpg_and_check(process, signal,
-                         timeout=timeout, interval=interval, sleep_fn=sleep_fn)
+        killpg_and_check(process, signal, timeout=timeout, interval=interval, sleep_fn=sleep_fn,
+                         instrumentation=instrumentation)
     except CannotTerminate:
-        killpg_and_check(process, SIGKILL,
-                         timeout=timeout, interval=interval, sleep_fn=sleep_fn)
+        killpg_and_check(process, SIGKILL, timeout=timeout, interval=interval, sleep_fn=sleep_fn,
+                         instrumentation=instrumentation)
 
 
 def kill_crudely(process, interval=DEFAULT_INTERVAL, timeout=DEFAULT_TIMEOUT,
-                 sleep_fn=time.sleep):
+                 sleep_fn=time.sleep, instrumentation=None):
     """
     Terminate the process group with SIGKILL and wait for parent process' termination.
 
@@ -88,6 +109,236 @@ def kill_crudely(process, interval=DEFAULT_INTERVAL, timeout=DEFAULT_TIMEOUT,
     :param float interval: time to sleep between termination status checks
     :param float timeout: time limit to wait for graceful termination
     :param function sleep_fn: function to sleep
+    :param spawn_and_check.instrumentation.Instrumentation instrumentation: collector of timings
+    """
+    killpg_and_check(process, SIGKILL, timeout=timeout, interval=interval, sleep_fn=sleep_fn,
+                     instrumentation=instrumentation)
+
+
+def signal_tree_and_check(process, tree, signal, interval=DEFAULT_INTERVAL,
+                          timeout=DEFAULT_TIMEOUT, sleep_fn=time.sleep, instrumentation=None):
     """
-    killpg_and_check(process, SIGKILL,
-                     timeout=timeout, interval=interval, sleep_fn=sleep_fn)
+    Send a signal to the process group and every member of the process tree and wait until all of them are gone.
+
+    Descendants appearing in the meantime get the signal too.
+
+    :param subprocess.Popen process: root process of the tree
+    :param spawn_and_check.proctree.ProcessTree tree: snapshot of the tree, taken before any signal was sent
+    :param int signal: signal to send
+    :param float interval: time to sleep between termination status checks
+    :param float timeout: time limit to wait for the termination of the whole tree
+    :param function sleep_fn: function to sleep
+    :param spawn_and_check.instrumentation.Instrumentation instrumentation: collector of timings
+    :raise CannotTerminate: if any process of the tree won't terminate
+    """
+    def whole_tree_gone():
+        tree.signal(signal, tree.scan())
+        return process.poll() is not None and not tree.alive()
+
+    try:
+        # No exit notification - it would keep waking the loop up after the root exits, while the descendants don't.
+        with phase(instrumentation, 'signal {} to tree'.format(signal)) as stats:
+            killpg_if_alive(process.pid, signal)
+            tree.signal(signal)
+            wait_until(whole_tree_gone, timeout=timeout, interval=interval, sleep_fn=sleep_fn, stats=stats)
+    except TimedOut:
+        raise CannotTerminate(
+            'Process tree failed to shut down after sending signal {}.'.format(signal),
+            process, tree.alive())
+
+
+def terminate_tree(process, signal=SIGTERM, interval=DEFAULT_INTERVAL,
+                   timeout=DEFAULT_TIMEOUT, sleep_fn=time.sleep, instrumentation=None):
+    """
+    Terminate the process and all its descendants gracefully, sending SIGKILL if they won't terminate.
+
+    Unlike ``terminate_gracefully``, it also reaches the descendants that left the process group, e.g. by calling
+    ``setsid``. The tree is read from ``/proc``. A process spawned by ``spawn_and_check.execute`` with this killer has
+    its tree tracked from the spawn on (``process.tree``), so it includes daemons that double-forked and is terminated
+    even if the process itself exited already. Other trees are snapshotted now - elsewhere, or if the process exited
+    already (its PID may belong to some other process now), only the process group is terminated.
+
+    :param subprocess.Popen process: process to kill
+    :param int signal: signal to terminate gracefully (default: ``signal.SIGTERM``)
+    :param float interval: time to sleep between termination status checks
+    :param float timeout: time limit to wait for graceful termination
+    :param function sleep_fn: function to sleep
+    :param spawn_and_check.instrumentation.Instrumentation instrumentation: collector of timings
+    """
+    tree = getattr(process, 'tree', None)
+    if not isinstance(tree, ProcessTree):
+        if process.poll() is not None or not proc_available():
+            terminate_gracefully(process, signal=signal, timeout=timeout, interval=interval, sleep_fn=sleep_fn,
+                                 instrumentation=instrumentation)
+            return
+        tree = ProcessTree(process.pid)
+
+    try:
+        signal_tree_and_check(process, tree, signal, timeout=timeout, interval=interval, sleep_fn=sleep_fn,
+                              instrumentation=instrumentation)
+    except CannotTerminate:
+        signal_tree_and_check(process, tree, SIGKILL, timeout=timeout, interval=interval, sleep_fn=sleep_fn,
+                              instrumentation=instrumentation)
+
+
+terminate_tree.tracks_tree = True  # Makes ``spawn_and_check.execute`` track the tree from the spawn on.
+
+
+class Stage(namedtuple('Stage', 'signal timeout interval')):
+
+    """A stage of a ``KillPolicy``: the signal to send and how long and how often to check if the process exited."""
+
+    def __new__(cls, signal, timeout=DEFAULT_TIMEOUT, interval=DEFAULT_INTERVAL):
+        """
+        Create the stage.
+
+        :param int signal: signal to send to the process group
+        :param float timeout: time limit to wait for the process to exit before going to the next stage
+        :param float interval: time to sleep between termination status checks
+        """
+        return super(Stage, cls).__new__(cls, signal, timeout, interval)
+
+
+KillRecord = namedtuple('KillRecord', 'pid stage elapsed stopped')
+"""
+Outcome of a ``KillPolicy`` call.
+
+``stage`` is the ``Stage`` that stopped the process (None if it had exited before any signal was sent) or the last stage
+if the process survived all of them (``stopped`` is False then), ``elapsed`` - seconds from the first signal.
+"""
+
+
+class KillPolicy(object):
+
+    """
+    Ladder of signals to terminate a process with, e.g. SIGINT, then SIGTERM, then SIGKILL.
+
+    Usable as the ``kill_fn`` of ``spawn_and_check.execute``. A process that exits early leaves the ladder right away.
+    Every call is recorded in ``history``, to tune the timeouts of the stages from data.
+    """
+
+    def __init__(self, stages, sleep_fn=time.sleep, instrumentation=None):
+        """
+        Store the stages.
+
+        :param iterable stages: ``Stage`` objects, in the order the signals are to be sent
+        :param function sleep_fn: function to sleep
+        :param spawn_and_check.instrumentation.Instrumentation instrumentation: collector of timings
+        """
+        self.stages = tuple(stages)
+        if not self.stages:
+            raise ValueError('A kill policy needs at least one stage.')
+        self.sleep_fn = sleep_fn
+        self.instrumentation = instrumentation
+        self.history = []
+
+    def __call__(self, process):
+        """
+        Send the signals of the stages to the process group until the parent process exits.
+
+        :param subprocess.Popen process: process to kill
+        :rtype: (Stage, NoneType)
+        :return: the stage that stopped the process or None if it had exited already
+        :raise CannotTerminate: if the process survived all stages
+        """
+        if process.poll() is not None:
+            self.history.append(KillRecord(process.pid, None, 0.0, True))
+            return None
+
+        start = monotonic()
+        for stage in self.stages:
+            try:
+                killpg_and_check(process, stage.signal, timeout=stage.timeout, interval=stage.interval,
+                                 sleep_fn=self.sleep_fn, instrumentation=self.instrumentation)
+            except CannotTerminate:
+                continue
+            self.history.append(KillRecord(process.pid, stage, monotonic() - start, True))
+            return stage
+
+        self.history.append(KillRecord(process.pid, self.stages[-1], monotonic() - start, False))
+        raise CannotTerminate(
+            'Process failed to shut down after sending signals {}.'.format(
+                ', '.join(str(stage.signal) for stage in self.stages)),
+            process)
+
+    def __repr__(self):
+        """Represent the policy by its stages."""
+        return '<KillPolicy %s>' % ', '.join('%s/%ss' % (stage.signal, stage.timeout) for stage in self.stages)
+
+
+def killpg_many_and_check(processes, signal, interval=DEFAULT_INTERVAL,
+                          timeout=DEFAULT_TIMEOUT, sleep_fn=time.sleep, instrumentation=None):
+    """
+    Send a signal to all the process groups at once and wait for the parent processes in one polling loop.
+
+    :param list processes: processes to kill
+    :param int signal: signal to send
+    :param float interval: time to sleep between termination status checks
+    :param float timeout: time limit to wait for the termination of all processes
+    :param function sleep_fn: function to sleep
+    :param spawn_and_check.instrumentation.Instrumentation instrumentation: collector of timings
+    :rtype: list
+    :return: processes that did not terminate, in the order they were passed
+    """
+    if not processes:
+        return []
+
+    with exit_notifications(processes) as notifications, \
+            phase(instrumentation, 'signal {}'.format(signal)) as stats:
+        for process in processes:
+            killpg_if_alive(process.pid, signal)
+
+        processes_by_check = OrderedDict(
+            (wake_on_exit(lambda process=process: process.poll() is not None, notification), process)
+            for process, notification in zip(processes, notifications))
+        try:
+            wait_until(list(processes_by_check), timeout=timeout, interval=interval, sleep_fn=sleep_fn,
+                       latch=True, stats=stats)
+        except TimedOut as e:
+            return [processes_by_check[check] for check in e.args[1]]
+
+    return []
+
+
+def terminate_many(processes, signal=SIGTERM, interval=DEFAULT_INTERVAL,
+                   timeout=DEFAULT_TIMEOUT, sleep_fn=time.sleep, instrumentation=None):
+    """
+    Terminate many processes gracefully at once, sending SIGKILL only to those that won't terminate.
+
+    All process groups get the graceful signal together and all parent processes are waited for in one polling
+    loop, so tearing down many processes takes about as long as tearing down the slowest one.
+
+    :param list processes: processes to kill
+    :param int signal: signal to terminate gracefully (default: ``signal.SIGTERM``)
+    :param float interval: time to sleep between termination status checks
+    :param float timeout: time limit to wait for graceful termination (and then for SIGKILL to work)
+    :param function sleep_fn: function to sleep
+    :param spawn_and_check.instrumentation.Instrumentation instrumentation: collector of timings
+    :rtype: list
+    :return: outcomes (``EXITED``, ``TERMINATED`` or ``KILLED``), in the order of the processes
+    :raise CannotTerminate: if any process survived SIGKILL - with the surviving processes and the outcomes of all
+        processes as the further arguments
+    """
+    alive = [process for process in processes if process.poll() is None]
+    stragglers = killpg_many_and_check(alive, signal, timeout=timeout, interval=interval, sleep_fn=sleep_fn,
+                                       instrumentation=instrumentation)
+    unkillable = killpg_many_and_check(stragglers, SIGKILL, timeout=timeout, interval=interval, sleep_fn=sleep_fn,
+                                       instrumentation=instrumentation)
+
+    outcomes = []
+    for process in processes:
+        if process in unkillable:
+            outcomes.append(UNKILLABLE)
+        elif process in stragglers:
+            outcomes.append(KILLED)
+        elif process in alive:
+            outcomes.append(TERMINATED)
+        else:
+            outcomes.append(EXITED)
+
+    if unkillable:
+        raise CannotTerminate(
+            '{} of {} processes failed to shut down after sending signal {}.'.format(
+                len(unkillable), len(processes), SIGKILL),
+            unkillable, outcomes)
+    return outcomes
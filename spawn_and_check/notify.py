@@ -0,0 +1,84 @@
+"""
+The ``sd_notify`` readiness protocol of systemd.
+
+A service that implements it sends 'READY=1' in a datagram to the unix socket named by the ``NOTIFY_SOCKET``
+environment variable once it's ready - no polling is needed to find that out. It may also send 'STATUS=...' (a human
+readable status) and 'ERRNO=...' (the reason of a failure).
+"""
+import os
+import errno
+import socket
+import shutil
+import tempfile
+
+
+class NotifySocket(object):
+
+    """Unix datagram socket receiving ``sd_notify`` messages."""
+
+    def __init__(self):
+        """Create and bind the socket in a new temporary directory."""
+        self.socket = None
+        self.directory = tempfile.mkdtemp(prefix='spawn_and_check')
+        self.path = os.path.join(self.directory, 'notify')
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.socket.bind(self.path)
+        self.socket.setblocking(False)
+        self.messages = {}
+
+    def fileno(self):
+        """Return the file descriptor - readable when a message arrives - or None if closed."""
+        return self.socket.fileno() if self.socket is not None else None
+
+    def read(self):
+        """
+        Receive the pending messages, keeping the most recent value of every variable.
+
+        :rtype: dict
+        :return: variables sent so far, e.g. {'READY': '1', 'STATUS': 'Accepting connections'}
+        """
+        if self.socket is None:
+            return self.messages
+
+        while True:
+            try:
+                datagram = self.socket.recv(4096)
+            except socket.error as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return self.messages
+                raise
+
+            for line in datagram.splitlines():
+                name, _, value = line.partition('=')
+                self.messages[name] = value
+
+    @property
+    def ready(self):
+        """Tell if the service has sent 'READY=1'."""
+        return self.read().get('READY') == '1'
+
+    @property
+    def status(self):
+        """Return the most recent 'STATUS' sent by the service or None."""
+        return self.read().get('STATUS')
+
+    @property
+    def errno(self):
+        """Return the 'ERRNO' sent by the service or None."""
+        value = self.read().get('ERRNO')
+        return int(value) if value and value.isdigit() else None
+
+    def close(self):
+        """
+        Close the socket and remove it.
+
+        Messages sent afterwards are rejected by the kernel, which ``sd_notify`` implementations ignore.
+        """
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def __del__(self):
+        """Close the socket when garbage collected."""
+        self.close()
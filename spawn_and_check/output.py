@@ -0,0 +1,256 @@
+"""
+Reading the output of spawned processes.
+
+The output is read from the pipes without blocking, as it comes. Only a bounded tail of it is kept, for error messages.
+Readers of the output (e.g. the output check) subscribe to it and get every chunk exactly once.
+
+The output is read when someone asks for it - or all the time, by a background thread, if it's drained. A process
+whose pipe fills up (64KB on Linux) blocks on writing until it's read, so a chatty process that nobody reads from
+looks just like a hung one.
+"""
+import os
+import errno
+import fcntl
+import select
+import logging
+import threading
+
+from spawn_and_check.constants import OUTPUT_TAIL_SIZE
+
+
+STREAMS = ('stdout', 'stderr')
+
+log = logging.getLogger(__name__)
+
+
+class RingBuffer(object):
+
+    """Bytes buffer keeping only the last ``size`` bytes written."""
+
+    def __init__(self, size):
+        """
+        Create an empty buffer.
+
+        :param int size: max number of bytes to keep
+        """
+        self.size = size
+        self.buffer = bytearray()
+
+    def write(self, data):
+        """Append the data, dropping the oldest bytes if needed."""
+        self.buffer.extend(data)
+        overflow = len(self.buffer) - self.size
+        if overflow > 0:
+            del self.buffer[:overflow]
+
+    def getvalue(self):
+        """Return the bytes kept."""
+        return bytes(self.buffer)
+
+
+def set_nonblocking(fd):
+    """Set the O_NONBLOCK flag on the file descriptor."""
+    fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+
+
+class OutputReader(object):
+
+    """Non-blocking reader of the piped standard streams of a process."""
+
+    def __init__(self, process, tail_size=OUTPUT_TAIL_SIZE):
+        """
+        Prepare the pipes for non-blocking reads.
+
+        :param subprocess.Popen process: process with ``stdout`` and/or ``stderr`` set to pipes
+        :param int tail_size: number of the most recent bytes of the output to keep
+        """
+        self.fds = {}  # Stream name to file descriptor, for streams that are still open.
+        self.streams = []  # Streams to close once all of them are read to the end.
+        for name in STREAMS:
+            stream = getattr(process, name)
+            if stream is not None:
+                self.fds[name] = stream.fileno()
+                self.streams.append(stream)
+                set_nonblocking(self.fds[name])
+
+        self.tail_buffer = RingBuffer(tail_size)
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.drain_thread = None
+
+    def subscribe(self, listener):
+        """
+        Call the listener with every chunk of the output read since now.
+
+        :param function listener: function called with the stream name and the chunk of data read - or an empty
+            chunk if a read found no more output (for now or at the end of the stream)
+        """
+        self.listeners.append(listener)
+
+    def read(self):
+        """
+        Read all output available right now and pass it to the tail buffer and the listeners.
+
+        Once all streams are read to the end, they are closed - by the drain thread if the output is drained.
+        """
+        with self.lock:
+            for name, fd in list(self.fds.items()):
+                read_any = False
+                while True:
+                    try:
+                        data = os.read(fd, 65536)
+                    except OSError as e:
+                        if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                            if not read_any:
+                                self.notify(name, b'')
+                            break
+                        if e.errno not in (errno.EBADF, errno.EIO):
+                            raise
+                        data = b''  # Closed by its owner (or the other end of a terminal) - nothing more to read.
+
+                    if not data:  # EOF.
+                        del self.fds[name]
+                        self.notify(name, b'')
+                        break
+
+                    read_any = True
+                    self.tail_buffer.write(data)
+                    self.notify(name, data)
+
+            if not self.fds and self.drain_thread is None:
+                self.close()
+
+    def notify(self, name, data):
+        """Pass the chunk read from the stream to the listeners."""
+        for listener in self.listeners:
+            listener(name, data)
+
+    def close(self):
+        """Close the streams of the process (all of them read to the end)."""
+        for stream in self.streams:
+            try:
+                stream.close()
+            except (IOError, OSError):
+                pass  # Its descriptor was closed by the owner.
+        self.streams = []
+
+    def drain(self):
+        """
+        Keep reading the output in a background thread, until all streams are closed.
+
+        The thread reads the output as it comes, so the process never blocks on writing it, and keeps only its tail.
+        Don't read the streams of the process (e.g. with ``communicate``) in the meantime.
+        """
+        if self.drain_thread is None:
+            self.drain_thread = threading.Thread(target=self.read_until_closed, name='spawn_and_check output drain')
+            self.drain_thread.daemon = True  # Processes outliving the interpreter must not keep it alive.
+            self.drain_thread.start()
+
+    def read_until_closed(self):
+        """
+        Read the output whenever any stream becomes readable, until all are closed (or closed by someone else).
+
+        ``poll`` is used rather than ``select``, which cannot wait for descriptors above ``FD_SETSIZE`` (1024).
+        Errors of the listeners are logged rather than ending the thread - the process would block on a full pipe then.
+        """
+        poller = select.poll()
+        registered = set()
+        while True:
+            with self.lock:
+                fds = set(self.fds.values())
+            if not fds:
+                self.close()
+                return
+
+            for fd in registered - fds:
+                poller.unregister(fd)
+            for fd in fds - registered:
+                poller.register(fd, select.POLLIN)
+            registered = fds
+
+            try:
+                poller.poll()
+            except select.error as e:
+                if e.args[0] != errno.EINTR:
+                    raise
+                continue
+
+            try:
+                self.read()
+            except Exception:
+                log.exception('Error processing the output of the process.')
+
+    def tail(self):
+        """
+        Read what is available and return the most recent output.
+
+        :rtype: bytes
+        """
+        self.read()
+        return self.tail_buffer.getvalue()
+
+
+def process_output(process, tail_size=OUTPUT_TAIL_SIZE):
+    """
+    Return the output reader of the process, creating it on first use.
+
+    The reader is stored as ``process.output`` so that all users of the output share it.
+
+    :param subprocess.Popen process: process with piped standard streams
+    :param int tail_size: number of the most recent bytes of the output to keep, if the reader is created
+    :rtype: OutputReader
+    """
+    reader = getattr(process, 'output', None)
+    if not isinstance(reader, OutputReader):
+        reader = process.output = OutputReader(process, tail_size)
+    return reader
+
+
+class PatternMatcher(object):
+
+    """
+    Matcher of a regular expression against the output, chunk by chunk.
+
+    Every chunk is searched together with the last ``window`` bytes of the previous chunks of the same stream, so
+    a match spanning up to ``window`` bytes is found even if it's split between chunks - and nothing is searched twice
+    beyond that window.
+
+    Only complete lines are searched - the end of a line still being written is kept for the next chunk, so that
+    ``$`` or ``\b`` don't match where a read happened to end. It's searched once a read finds no more output (an
+    empty chunk is fed) - e.g. a readiness message printed without a newline. A line longer than the window is
+    searched as it comes, to keep the memory bounded. The byte before the window is kept too, so that ``^``, ``\b``
+    and lookbehinds don't match where the window was cut.
+    """
+
+    def __init__(self, pattern, window):
+        """
+        Store the pattern, nothing has matched yet.
+
+        :param pattern: compiled regular expression
+        :param int window: max length of a match, in bytes
+        """
+        self.pattern = pattern
+        self.window = window
+        self.carry = {}  # Stream name to (the end of its previous chunks, position to search it from).
+        self.matched = False
+
+    def feed(self, stream, data):
+        """
+        Search the output chunk read from the stream (any name identifying the source of the data).
+
+        An empty chunk tells that no more output was found - the line still being written is searched then.
+        """
+        if self.matched:
+            return
+
+        carry, pos = self.carry.get(stream, (b'', 0))
+        text = carry + data
+        searched = text.rfind(b'\n') + 1
+        if not data or len(text) - searched > self.window:
+            searched = len(text)
+
+        if searched > pos and self.pattern.search(text, pos, searched):
+            self.matched = True
+
+        start = max(0, searched - self.window - 1)
+        self.carry[stream] = text[start:], 1 if start else 0
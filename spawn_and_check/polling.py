@@ -1,7 +1,12 @@
 """An utility to run checks repeatedly."""
-from time import sleep, time
+import errno
+from time import sleep
+from select import select, error as select_error
 from collections import Callable
 
+from spawn_and_check.clock import monotonic
+from spawn_and_check.schedules import Fixed
+from spawn_and_check.context import CheckContext, takes_context
 from spawn_and_check.constants import DEFAULT_INTERVAL, DEFAULT_TIMEOUT
 
 
@@ -10,18 +15,133 @@ class TimedOut(Exception):
     """Raised when polling times out."""
 
 
-def execute_checks(checks):
+def call_check(check, context=None):
+    """
+    Call the check function, with the context if it accepts one (see ``spawn_and_check.context``).
+
+    :param function check: check function to call
+    :param spawn_and_check.context.CheckContext context: deadline of the check and the checked process
+    :rtype: bool
+    :return: check's return value
+    """
+    if context is not None and takes_context(check):
+        return check(context)
+    return check()
+
+
+def execute_checks(checks, map_fn=map, call=call_check):
     """
     Execute all provided checks and return failing ones.
 
     :param list checks: list of check functions
+    :param function map_fn: function mapping the checks to their results, with the signature of the builtin ``map``.
+        Pass ``multiprocessing.pool.ThreadPool(size).map`` (or ``gevent.pool.Pool(size).map``) to run the checks
+        concurrently.
+    :param function call: function calling a check and returning its result
+    :rtype: list
+    :return: list of failing check functions, in the order they were passed
+    """
+    results = map_fn(call, checks)
+    return [check for check, result in zip(checks, results) if not result]
+
+
+def wakeup_fds(checks):
+    """
+    Return the file descriptors the checks want the polling loop woken up on.
+
+    A check tells it with a ``fileno`` method returning a descriptor or None or, if it has many (like the combinators
+    of ``spawn_and_check.combinators``), with a ``filenos`` method returning a list of them.
+
+    :param list checks: check functions
     :rtype: list
-    :return: list of failing check functions
     """
-    return [check for check in checks if not check()]
+    fds = []
+    for check in checks:
+        filenos = check.filenos() if hasattr(check, 'filenos') else None
+        if isinstance(filenos, list):
+            fds.extend(filenos)
+        elif hasattr(check, 'fileno'):
+            fds.append(check.fileno())
+    return [fd for fd in fds if fd is not None]  # None - the check cannot wake the loop up.
+
+
+def wait_readable(fds, duration):
+    """
+    Sleep for ``duration`` seconds or until any of the file descriptors becomes readable.
+
+    :param list fds: file descriptors (or objects with a ``fileno`` method)
+    :param float duration: max time to sleep
+    """
+    try:
+        select(fds, [], [], duration)
+    except select_error as e:
+        if e.args[0] != errno.EINTR:  # A signal may wake us up early - that's OK.
+            raise
+
+
+class PolledCheck(object):
+
+    """Check function with its own polling options, overriding those of ``wait_until``."""
+
+    def __init__(self, check, interval=None, timeout=None, latch=None):
+        """
+        Wrap the check, keeping its attributes (``fileno``, ``attach``, etc.).
+
+        :param function check: check function
+        :param float interval: min time between calls of the check; if None, it's called every polling round
+        :param float timeout: time limit for the check to pass, counted from the start of the polling
+        :param bool latch: if True, the check is not called any more after it passes; if False, it is called every
+            time even if ``wait_until`` latches other checks; if None, ``wait_until`` decides
+        """
+        self.__dict__.update(getattr(check, '__dict__', {}))
+        self.__name__ = getattr(check, '__name__', repr(check))
+        self.__doc__ = getattr(check, '__doc__', None)
+        self.check = check
+        self.interval = interval
+        self.timeout = timeout
+        self.latch = latch
+
+    def __call__(self, *args, **kwargs):
+        """Call the check."""
+        return self.check(*args, **kwargs)
+
+    def __getattr__(self, name):
+        """Look up the attributes missing from the wrapper - e.g. methods of checks that are objects - on the check."""
+        if name == 'check':
+            raise AttributeError(name)  # Not set yet.
+        return getattr(self.check, name)
+
+    def __repr__(self):
+        """Represent as the wrapped check."""
+        return repr(self.check)
+
+
+def polled(check, interval=None, timeout=None, latch=None):
+    """
+    Set polling options of a single check, overriding those of ``wait_until``.
+
+    See ``PolledCheck`` for the options.
+
+    :rtype: PolledCheck
+    """
+    return PolledCheck(check, interval, timeout, latch)
+
+
+def endless(schedule, interval):
+    """
+    Yield the intervals of the schedule and then - if it ends - its last interval forever.
+
+    :param iterable schedule: intervals between the starts of polling rounds
+    :param float interval: interval to repeat if the schedule is empty
+    """
+    for interval in schedule:
+        yield interval
+    while True:
+        yield interval
 
 
-def wait_until(check_functions, interval=DEFAULT_INTERVAL, timeout=DEFAULT_TIMEOUT, sleep_fn=sleep):
+def wait_until(check_functions, interval=DEFAULT_INTERVAL, timeout=DEFAULT_TIMEOUT, sleep_fn=sleep, map_fn=map,
+               schedule=None, latch=False, stats=None, process=None):
     """
     Poll ``check_functions`` until it returns True.
 
@@ -29,30 +149,100 @@ def wait_until(check_functions, interval=DEFAULT_INTERVAL, timeout=DEFAULT_TIMEO
     repeatedly, every ``interval`` seconds, until all return True or the overall polling duration exceeds ``timeout``.
 
     All check functions will be called at least once, even if the ``timeout`` is lower than the time all checks execute
-    in.
+    in. The last sleep is shortened so that the last round starts right at the ``timeout`` - the polling never
+    overshoots the ``timeout`` by more than the duration of one round. Time is measured with a monotonic clock.
+
+    Check functions may have a ``fileno`` method returning a file descriptor that becomes readable when the check
+    should be called again (e.g. when the watched process exits), or None. Unless a custom ``sleep_fn`` is passed,
+    the sleep between polling rounds is interrupted as soon as any of those descriptors becomes readable - except for
+    the descriptors of latched checks.
+
+    Checks wrapped with ``polled`` may have their own interval and timeout and decide about latching themselves.
+
+    Checks accepting a context (see ``spawn_and_check.context``) are told their deadline, so that they can clamp the
+    timeouts of their probes - the polling then does not overshoot the ``timeout`` by their full timeouts.
 
     :param (list, function) check_functions: check functions to poll, should return True if check's condition has been
         met. All checks should not take more time than the ``interval`` to execute. For convenience, if a function is
         provided instead of a list, it is treated as a check functions list with a single check.
     :param float interval: max sleep interval between the checks
     :param float timeout: polling time limit
-    :param function sleep: function to use to sleep for a period
-    :raise TimedOut: in case of a timeout
+    :param function sleep_fn: function to use to sleep for a period
+    :param function map_fn: function used to call all checks in a polling round, ``map`` by default - checks are
+        called one after another. Pass the ``map`` method of a bounded thread pool (or a gevent pool) to call the checks
+        concurrently so that a round takes as long as the slowest check instead of all checks added together.
+        Exceptions raised by the checks are propagated either way.
+    :param iterable schedule: intervals between the starts of consecutive polling rounds, overrides ``interval``.
+        See ``spawn_and_check.schedules``. A finite schedule (e.g. a list) is followed by its last interval.
+    :param bool latch: if True, checks that passed once are not called again (checks ``polled`` with ``latch=False``,
+        like the executor's guard of the process being alive, are called every round anyway)
+    :param spawn_and_check.instrumentation.PhaseStats stats: statistics to record the calls, rounds and sleeps in
+    :param subprocess.Popen process: the checked process, passed to the checks in their context
+    :raise TimedOut: in case of a timeout (overall or of a single check)
     """
     if isinstance(check_functions, Callable):
         # Single check was provided instead of a list.
         check_functions = [check_functions]
 
-    start = time()
+    intervals = endless(schedule, interval) if schedule is not None else iter(Fixed(interval))
+
+    start = monotonic()
+    deadline = start + timeout
+    options = [check if isinstance(check, PolledCheck) else PolledCheck(check) for check in check_functions]
+    check_deadlines = [start + option.timeout if option.timeout is not None else deadline for option in options]
+    check_intervals = [option.interval for option in options]
+    latching = [latch if option.latch is None else option.latch for option in options]
+    next_calls = [start] * len(check_functions)
+    passing = [False] * len(check_functions)
+    latched = set()
+    contexts = dict((check, CheckContext(check_deadline, process))
+                    for check, check_deadline in zip(check_functions, check_deadlines))
+    call_with_context = call_check if stats is None else stats.call_check
+
+    def call(check):
+        return call_with_context(check, contexts[check])
+
     while True:
-        time_before_check = time()
-        failing_checks = execute_checks(check_functions)
-        if not failing_checks:
+        time_before_check = monotonic()
+        due = [index for index, next_call in enumerate(next_calls)
+               if index not in latched and next_call <= time_before_check]
+        failing_checks = execute_checks([check_functions[index] for index in due], map_fn, call)
+
+        for index in due:
+            passing[index] = check_functions[index] not in failing_checks
+            if check_intervals[index] is not None:
+                next_calls[index] = time_before_check + check_intervals[index]
+            if passing[index] and latching[index]:
+                latched.add(index)
+
+        time_after_check = monotonic()
+        if stats is not None:
+            stats.record_round(time_after_check - time_before_check)
+
+        if all(passing):
             return
 
-        if time() > start + timeout:
-            raise TimedOut('Timed out polling the checks.', failing_checks)
+        failing = [index for index, passed in enumerate(passing) if not passed]
+        if time_after_check >= min(check_deadlines[index] for index in failing):
+            raise TimedOut('Timed out polling the checks.', [check_functions[index] for index in failing])
 
-        time_after_check = time()
         check_duration = time_after_check - time_before_check
-        sleep_fn(max(0, interval - check_duration))
+        round_interval = next(intervals)
+        wake_ups = [next_calls[index] for index in range(len(check_functions))
+                    if index not in latched and check_intervals[index] is not None]
+        if len(wake_ups) < len(check_functions) - len(latched):
+            # Some checks are called every round.
+            wake_ups.append(time_before_check + max(check_duration, round_interval))
+        wake_ups.extend(check_deadlines[index] for index in failing)
+
+        sleep_duration = max(0, min(wake_ups) - time_after_check)
+        # Asked every round - a check may stop being able to wake the loop up (e.g. close its socket). Latched checks
+        # are never called again to consume what woke the loop up - it would keep waking it up right away.
+        fds = wakeup_fds([check for index, check in enumerate(check_functions) if index not in latched])
+        if fds and sleep_fn is sleep:
+            wait_readable(fds, sleep_duration)
+        else:
+            sleep_fn(sleep_duration)
+
+        if stats is not None:
+            stats.record_sleep(monotonic() - time_after_check)
@@ -0,0 +1,225 @@
+"""
+Process trees read from ``/proc``.
+
+Killing the process group does not reach descendants that called ``setsid`` (or ``setpgid``) - e.g. workers of some
+daemons. They stay alive, keep ports bound and make the pre-checks of the next execution fail. A ``ProcessTree``
+follows parent PIDs instead, so it finds descendants regardless of their session and process group.
+
+Processes are identified by their PID and start time, so that a PID reused by an unrelated process is never taken
+for a member of the tree.
+
+A daemon that double-forks is reparented to init as soon as its intermediate parent exits - following parent PIDs
+cannot find it then. A tree created with a marker (an environment variable set for the root process, see
+``tree_marker``) also takes in any new process that inherited the marker, wherever it was reparented to.
+"""
+import os
+import errno
+import uuid
+from collections import defaultdict
+
+
+PROC = '/proc'
+
+TREE_MARKER_VARIABLE = 'SPAWN_AND_CHECK_TREE'
+
+
+def proc_available(proc=PROC):
+    """
+    Tell if the process information pseudo-filesystem is available (Linux).
+
+    :rtype: bool
+    """
+    return os.path.exists(os.path.join(proc, 'self', 'stat'))
+
+
+def read_stat(pid, proc=PROC):
+    """
+    Read the parent PID, start time and state of the process.
+
+    :param int pid: process ID
+    :param str proc: mount point of procfs
+    :rtype: (tuple, NoneType)
+    :return: (ppid, starttime, state) or None if there's no such process
+    """
+    try:
+        with open(os.path.join(proc, str(pid), 'stat')) as f:
+            stat = f.read()
+    except (IOError, OSError) as e:
+        if e.errno in (errno.ENOENT, errno.ESRCH):
+            return None
+        raise
+
+    # The command name is in parentheses and may contain spaces and parentheses itself.
+    fields = stat[stat.rindex(')') + 2:].split()
+    # Fields after the command name: state, ppid, ..., starttime (the 22nd field of the whole line).
+    return int(fields[1]), int(fields[19]), fields[0]
+
+
+def read_environ(pid, proc=PROC):
+    """
+    Read the environment the process was started with.
+
+    :param int pid: process ID
+    :param str proc: mount point of procfs
+    :rtype: list
+    :return: 'NAME=value' strings, empty if there's no such process or it's not ours
+    """
+    try:
+        with open(os.path.join(proc, str(pid), 'environ')) as f:
+            return f.read().split('\0')
+    except (IOError, OSError) as e:
+        if e.errno in (errno.ENOENT, errno.ESRCH, errno.EACCES, errno.EPERM):
+            return []
+        raise
+
+
+def tree_marker():
+    """
+    Create a unique marker for the descendants of a process to be spawned.
+
+    :rtype: tuple
+    :return: name and value of the environment variable to set for the process
+    """
+    return TREE_MARKER_VARIABLE, uuid.uuid4().hex
+
+
+def list_pids(proc=PROC):
+    """
+    List the PIDs of all processes.
+
+    :rtype: set
+    """
+    return set(int(name) for name in os.listdir(proc) if name.isdigit())
+
+
+class ProcessTree(object):
+
+    """
+    A process and its descendants, found by following parent PIDs in ``/proc``.
+
+    The first scan reads the stat of every process (but those listed as ``known_pids``). Subsequent scans read only the
+    stats of PIDs that appeared since the previous scan, so they stay cheap even with thousands of processes.
+    Descendants that get orphaned (reparented to init) stay members of the tree once found.
+    """
+
+    def __init__(self, root_pid, proc=PROC, marker=None, known_pids=()):
+        """
+        Snapshot the tree.
+
+        :param int root_pid: PID of the root process
+        :param str proc: mount point of procfs
+        :param tuple marker: name and value of the environment variable the root process was spawned with (see
+            ``tree_marker``) - new processes that have it are members, even if not found through their parents
+        :param iterable known_pids: PIDs of processes that existed before the root was spawned - not members for sure
+        """
+        self.root_pid = root_pid
+        self.proc = proc
+        self.marker = None if marker is None else '%s=%s' % marker
+        self.members = {}  # PID: start time.
+        self.seen_pids = set(known_pids)
+        self.scanned = False
+        self.scan()
+
+    def scan(self):
+        """
+        Find the descendants created since the previous scan.
+
+        :rtype: list
+        :return: PIDs of the new members of the tree
+        """
+        pids = list_pids(self.proc)
+        new_pids = pids - self.seen_pids
+        self.seen_pids = pids
+
+        children = defaultdict(list)
+        start_times = {}
+        for pid in new_pids:
+            stat = read_stat(pid, self.proc)
+            if stat is not None:
+                ppid, start_times[pid], state = stat
+                children[ppid].append(pid)
+
+        added = []
+        if not self.scanned:
+            self.scanned = True
+            if self.root_pid in start_times:  # Else the root is gone already.
+                self.members[self.root_pid] = start_times[self.root_pid]
+                added.append(self.root_pid)
+
+        if self.marker is not None:
+            for pid in sorted(start_times):
+                if pid not in self.members and self.marker in read_environ(pid, self.proc):
+                    self.members[pid] = start_times[pid]
+                    added.append(pid)
+
+        parents = list(self.members)
+        while parents:
+            parent = parents.pop()
+            for child in children[parent]:
+                if child not in self.members:
+                    self.members[child] = start_times[child]
+                    added.append(child)
+                    parents.append(child)
+
+        return added
+
+    def alive(self):
+        """
+        Return the members that are still running, forgetting the others.
+
+        Zombies count as gone - they only wait to be reaped by their parent.
+
+        :rtype: list
+        """
+        for pid, start_time in list(self.members.items()):
+            stat = read_stat(pid, self.proc)
+            if stat is None or stat[1] != start_time or stat[2] == 'Z':
+                del self.members[pid]
+        return list(self.members)
+
+    def signal(self, signal, pids=None):
+        """
+        Send the signal to the members of the tree.
+
+        :param int signal: signal to send
+        :param list pids: members to signal, all running members by default
+        """
+        for pid in self.alive() if pids is None else pids:
+            try:
+                os.kill(pid, signal)
+            except OSError as e:
+                if e.errno != errno.ESRCH:  # Might have exited in the meantime.
+                    raise
+
+
+def tree_tracker(proc=PROC):
+    """
+    Create a check that tracks the tree of the spawned process from the spawn on (see ``spawn_and_check.execute``).
+
+    Before the spawn, it sets the marker in the environment of the process and notes the PIDs already running. Once
+    the process is spawned, it sets its ``ProcessTree`` as ``process.tree`` (used by
+    ``spawn_and_check.killers.terminate_tree``). Every call scans for new members, so that the descendants are known
+    even after their parents exit, and passes.
+
+    :param str proc: mount point of procfs
+    :rtype: function
+    """
+    state = {'marker': None, 'known_pids': (), 'tree': None}
+
+    def check():
+        if state['tree'] is not None:
+            state['tree'].scan()
+        return True
+
+    def prepare(options):
+        state['marker'] = tree_marker()
+        name, value = state['marker']
+        options.env[name] = value
+        state['known_pids'] = list_pids(proc)
+
+    def attach(process):
+        state['tree'] = process.tree = ProcessTree(process.pid, proc, state['marker'], state['known_pids'])
+
+    check.prepare = prepare
+    check.attach = attach
+    return check
@@ -0,0 +1,67 @@
+"""
+Address resolution shared by the network checks.
+
+Resolving the host on every call of a check goes through ``getaddrinfo`` - and the whole nsswitch chain, with a slow
+resolver possibly - every polling round. Resolved addresses are cached for ``RESOLVE_TTL`` seconds instead, so a host
+is resolved once per polling for all checks connecting to it.
+
+``getaddrinfo`` cannot be given a timeout - a slow DNS server may hold a check past the deadline of the polling by as
+much as the timeout of the resolver (5 seconds per attempt with the glibc defaults). Checks called with no time left
+resolve only numeric addresses (see ``Resolver.resolve``).
+"""
+import socket
+import threading
+
+from spawn_and_check.clock import monotonic
+from spawn_and_check.constants import RESOLVE_TTL
+
+
+class Resolver(object):
+
+    """Cache of resolved TCP addresses, each valid for ``ttl`` seconds."""
+
+    def __init__(self, ttl=RESOLVE_TTL, getaddrinfo=socket.getaddrinfo):
+        """
+        Start with nothing resolved.
+
+        :param float ttl: time the resolved addresses are valid for
+        :param function getaddrinfo: ``socket.getaddrinfo`` or a compatible function
+        """
+        self.ttl = ttl
+        self.getaddrinfo = getaddrinfo
+        self.cache = {}  # (host, port): (time resolved, addresses).
+        self.lock = threading.Lock()  # Checks may be called concurrently.
+
+    def resolve(self, host, port, numeric_only=False):
+        """
+        Return the addresses to connect to, in the order of preference of ``getaddrinfo``.
+
+        Failures are not cached - the name may become resolvable while the service starts. So a name that does not
+        resolve is looked up every polling round.
+
+        :param str host: IPv4/IPv6 address or a resolvable hostname
+        :param (int, str) port:
+        :param bool numeric_only: if True, a hostname not cached fails instead of being looked up - nothing blocks
+        :rtype: list
+        :return: (family, socktype, proto, sockaddr) tuples - all addresses of all families
+        :raise socket.error: if the host cannot be resolved
+        """
+        key = host, str(port)  # Ports may be given as strings too.
+        with self.lock:
+            resolved_at, addresses = self.cache.get(key, (None, None))
+            if resolved_at is not None and monotonic() - resolved_at < self.ttl:
+                return addresses
+
+        flags = socket.AI_NUMERICHOST if numeric_only else 0
+        addresses = []
+        for family, socktype, proto, _, sockaddr in self.getaddrinfo(host, port, 0, socket.SOCK_STREAM, 0, flags):
+            if (family, socktype, proto, sockaddr) not in addresses:
+                addresses.append((family, socktype, proto, sockaddr))
+
+        with self.lock:
+            self.cache[key] = monotonic(), addresses
+        return addresses
+
+
+resolver = Resolver()
+"""Cache shared by all checks."""
@@ -0,0 +1,114 @@
+"""
+Polling schedules - the intervals to sleep between polling rounds.
+
+A schedule is an iterable of intervals. ``wait_until`` iterates it anew on every call, so a schedule object can be
+passed to ``execute`` and used for both pre-checks and post-checks.
+"""
+import random
+from itertools import repeat
+
+from spawn_and_check.constants import DEFAULT_INTERVAL
+
+
+class Fixed(object):
+
+    """The same interval over and over - the default behaviour of ``wait_until``."""
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        """
+        Store the interval.
+
+        :param float interval: time between the starts of polling rounds
+        """
+        self.interval = interval
+
+    def __iter__(self):
+        """Yield the interval forever."""
+        return repeat(self.interval)
+
+
+class ExponentialBackoff(object):
+
+    """
+    Intervals growing exponentially up to a limit, with random jitter.
+
+    Quick services are detected fast and slow ones are not hammered with probes.
+    """
+
+    def __init__(self, initial=0.01, factor=2.0, maximum=1.0, jitter=0.1):
+        """
+        Store the parameters.
+
+        :param float initial: first interval
+        :param float factor: ratio of consecutive intervals
+        :param float maximum: max interval
+        :param float jitter: max random deviation, as a fraction of the interval (0.1 - up to 10% longer or shorter)
+        """
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self.jitter = jitter
+
+    def __iter__(self):
+        """Yield the growing intervals forever."""
+        interval = self.initial
+        while True:
+            yield interval * (1 + random.uniform(-self.jitter, self.jitter))
+            interval = min(interval * self.factor, self.maximum)
+
+
+class FastThenSlow(object):
+
+    """Short intervals for the first ``fast_for`` seconds, long intervals afterwards."""
+
+    def __init__(self, fast=0.01, slow=0.5, fast_for=1.0):
+        """
+        Store the parameters.
+
+        :param float fast: interval in the fast phase
+        :param float slow: interval in the slow phase
+        :param float fast_for: duration of the fast phase (sum of fast intervals)
+        """
+        self.fast = fast
+        self.slow = slow
+        self.fast_for = fast_for
+
+    def __iter__(self):
+        """Yield fast intervals, then slow ones forever."""
+        elapsed = 0
+        while elapsed < self.fast_for:
+            yield self.fast
+            elapsed += self.fast
+        while True:
+            yield self.slow
+
+
+class Predicted(object):
+
+    """
+    A few long intervals until ``dense_from`` seconds, short intervals afterwards.
+
+    Made for services whose startup time is known in advance (see ``spawn_and_check.history``) - they are not probed
+    dozens of times before they can possibly be ready, and are detected quickly once they are.
+    """
+
+    def __init__(self, dense_from, interval=DEFAULT_INTERVAL, sparse_probes=3):
+        """
+        Store the parameters.
+
+        :param float dense_from: time the short intervals start at
+        :param float interval: short interval
+        :param int sparse_probes: number of polling rounds before ``dense_from``, after the first one
+        """
+        self.dense_from = dense_from
+        self.interval = interval
+        self.sparse_probes = sparse_probes
+
+    def __iter__(self):
+        """Yield the long intervals reaching ``dense_from``, then short ones forever."""
+        sparse = float(self.dense_from) / (self.sparse_probes + 1)
+        if sparse > self.interval:
+            for _ in range(self.sparse_probes + 1):
+                yield sparse
+        while True:
+            yield self.interval
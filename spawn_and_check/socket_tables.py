@@ -0,0 +1,161 @@
+"""
+Socket tables of the kernel, read from ``/proc/net``.
+
+Checks that connect to the service fill its accept queue and show up in its connection metrics. Reading the socket
+tables tells whether a socket is listening without touching the service, and the inodes of the sockets tell which
+process owns them.
+
+The tables are cached for ``SOCKET_TABLE_TTL`` seconds, so many checks called in one polling round cost one parse.
+"""
+import os
+import errno
+import socket
+import struct
+import threading
+from collections import namedtuple
+
+from spawn_and_check.clock import monotonic
+from spawn_and_check.constants import SOCKET_TABLE_TTL
+from spawn_and_check.proctree import PROC
+
+
+TCP_LISTEN = '0A'
+UDP_UNCONNECTED = '07'  # TCP_CLOSE - bound, not connected.
+SO_ACCEPTCON = 0x10000
+UNIX_SOCK_DGRAM = 2
+
+SocketEntry = namedtuple('SocketEntry', 'address listening inode')
+"""
+A socket from a table: ``address`` is a (host, port) tuple or a unix socket path (abstract ones start with '@'),
+``listening`` - whether it accepts connections (or datagrams).
+"""
+
+
+def decode_inet_address(encoded):
+    """
+    Decode an address from ``/proc/net/tcp`` and similar tables.
+
+    :param str encoded: hex address in the host byte order (in 32-bit words) and hex port, e.g. '0100007F:1F90'
+    :rtype: tuple
+    :return: (host, port) tuple, e.g. ('127.0.0.1', 8080)
+    """
+    host, port = encoded.split(':')
+    words = [struct.pack('=I', int(host[index:index + 8], 16)) for index in range(0, len(host), 8)]
+    family = socket.AF_INET if len(words) == 1 else socket.AF_INET6
+    return socket.inet_ntop(family, b''.join(words)), int(port, 16)
+
+
+def parse_inet_table(lines, listening_state):
+    """
+    Parse an IPv4 or IPv6 table of TCP or UDP sockets.
+
+    :param list lines: lines of the table, without the header
+    :param str listening_state: hex state of listening sockets
+    :rtype: list
+    :return: ``SocketEntry`` objects
+    """
+    entries = []
+    for line in lines:
+        fields = line.split()
+        entries.append(SocketEntry(decode_inet_address(fields[1]), fields[3] == listening_state, int(fields[9])))
+    return entries
+
+
+def parse_unix_table(lines):
+    """
+    Parse the table of unix sockets.
+
+    :param list lines: lines of the table, without the header
+    :rtype: list
+    :return: ``SocketEntry`` objects - only those bound to a path
+    """
+    entries = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 8:
+            continue  # Not bound.
+        listening = int(fields[3], 16) & SO_ACCEPTCON or int(fields[4], 16) == UNIX_SOCK_DGRAM
+        entries.append(SocketEntry(fields[7], bool(listening), int(fields[6])))
+    return entries
+
+
+TABLE_PARSERS = {
+    'tcp': lambda lines: parse_inet_table(lines, TCP_LISTEN),
+    'tcp6': lambda lines: parse_inet_table(lines, TCP_LISTEN),
+    'udp': lambda lines: parse_inet_table(lines, UDP_UNCONNECTED),
+    'udp6': lambda lines: parse_inet_table(lines, UDP_UNCONNECTED),
+    'unix': parse_unix_table,
+}
+
+
+class SocketTables(object):
+
+    """Socket tables from ``/proc/net``, each cached for ``ttl`` seconds."""
+
+    def __init__(self, ttl=SOCKET_TABLE_TTL, proc=PROC):
+        """
+        Start with nothing read.
+
+        :param float ttl: time the parsed tables are valid for
+        :param str proc: mount point of procfs
+        """
+        self.ttl = ttl
+        self.proc = proc
+        self.cache = {}  # Table name: (time read, entries).
+        self.lock = threading.Lock()  # Checks may be called concurrently.
+
+    def entries(self, name):
+        """
+        Return the sockets of the table.
+
+        :param str name: 'tcp', 'tcp6', 'udp', 'udp6' or 'unix'
+        :rtype: list
+        :return: ``SocketEntry`` objects, an empty list if there's no such table (e.g. IPv6 is disabled)
+        """
+        with self.lock:
+            read_at, entries = self.cache.get(name, (None, None))
+            if read_at is not None and monotonic() - read_at < self.ttl:
+                return entries
+
+            try:
+                with open(os.path.join(self.proc, 'net', name)) as table:
+                    entries = TABLE_PARSERS[name](table.readlines()[1:])
+            except IOError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+                entries = []
+
+            self.cache[name] = monotonic(), entries
+            return entries
+
+
+socket_tables = SocketTables()
+"""Tables shared by all checks."""
+
+
+def socket_inodes(pids, proc=PROC):
+    """
+    Return the inodes of the sockets the processes have open.
+
+    :param list pids: process IDs
+    :param str proc: mount point of procfs
+    :rtype: set
+    """
+    inodes = set()
+    for pid in pids:
+        fd_directory = os.path.join(proc, str(pid), 'fd')
+        try:
+            fds = os.listdir(fd_directory)
+        except OSError as e:
+            if e.errno in (errno.ENOENT, errno.ESRCH, errno.EACCES):  # Exited or not ours.
+                continue
+            raise
+
+        for fd in fds:
+            try:
+                target = os.readlink(os.path.join(fd_directory, fd))
+            except OSError:
+                continue  # Closed in the meantime.
+            if target.startswith('socket:['):
+                inodes.add(int(target[len('socket:['):-1]))
+    return inodes
@@ -0,0 +1,185 @@
+"""
+Stack executor - spawn a whole set of interdependent services.
+
+Every service is started as soon as all services it depends on are ready, and the checks of all services that are
+starting are polled in one shared loop, so the startup takes as long as the critical path of the dependency graph
+instead of the sum of all startup times.
+
+If anything goes wrong, all started services are torn down in the reverse order.
+"""
+import sys
+import time
+from collections import OrderedDict
+
+from spawn_and_check.executor import (
+    Popen, attach_checks, close_checks, negated, parse_command, prepare_spawn, process_running_check, run_pre_checks,
+    spawn)
+from spawn_and_check.exceptions import PostChecksFailed
+from spawn_and_check.polling import TimedOut, call_check, execute_checks
+from spawn_and_check.context import CheckContext
+from spawn_and_check.killers import terminate_gracefully
+from spawn_and_check.clock import monotonic
+from spawn_and_check.constants import DEFAULT_INTERVAL, DEFAULT_TIMEOUT
+
+
+class Service(object):
+
+    """A service of a stack: the command to run, its checks and the names of the services it depends on."""
+
+    def __init__(self, name, command, checks, pre_checks=None, depends_on=()):
+        """
+        Store the service definition.
+
+        :param str name: unique name of the service in the stack
+        :param (str, list) command: shell command, see ``spawn_and_check.execute``
+        :param list checks: list of check functions (signature: () -> bool, see ``spawn_and_check.context`` for checks
+            accepting the deadline)
+        :param (list, NoneType) pre_checks: list of pre-checks, negated ``checks`` if None
+        :param iterable depends_on: names of services that have to be ready before this one is started
+        """
+        self.name = name
+        self.command = parse_command(command)
+        self.checks = checks
+        self.pre_checks = map(negated, checks) if pre_checks is None else pre_checks
+        self.depends_on = tuple(depends_on)
+
+    def __repr__(self):
+        """Represent the service by its name and command."""
+        return '<Service %s: %r>' % (self.name, self.command)
+
+
+def startup_order(services):
+    """
+    Sort the services topologically, keeping the passed order where dependencies allow.
+
+    :param list services: list of ``Service`` objects
+    :rtype: list
+    :return: services, each one after all its dependencies
+    :raise ValueError: if service names repeat, a dependency is unknown or the dependencies form a cycle
+    """
+    by_name = OrderedDict()
+    for service in services:
+        if service.name in by_name:
+            raise ValueError('Duplicate service name: %s.' % service.name)
+        by_name[service.name] = service
+
+    for service in services:
+        unknown = [name for name in service.depends_on if name not in by_name]
+        if unknown:
+            raise ValueError('Service %s depends on unknown services: %s.' % (service.name, ', '.join(unknown)))
+
+    ordered = []
+    placed = set()
+    while len(ordered) < len(services):
+        placeable = [service for service in by_name.values()
+                     if service.name not in placed and placed.issuperset(service.depends_on)]
+        if not placeable:
+            cyclic = [name for name in by_name if name not in placed]
+            raise ValueError('Dependency cycle between services: %s.' % ', '.join(cyclic))
+        ordered.extend(placeable)
+        placed.update(service.name for service in placeable)
+
+    return ordered
+
+
+def tear_down(processes, kill_fn):
+    """
+    Kill the processes in the reverse order, trying to kill all of them even if some won't terminate.
+
+    :param list processes: processes in the order they were started
+    :param function kill_fn: killer to call with each process
+    """
+    for process in reversed(processes):
+        try:
+            kill_fn(process)
+        except Exception:
+            # The exception that caused the tear down is more interesting - it will be re-raised by the caller.
+            pass
+
+
+def execute_many(services,
+                 kill_fn=terminate_gracefully,
+                 interval=DEFAULT_INTERVAL, timeout=DEFAULT_TIMEOUT,
+                 sleep_fn=time.sleep, popen=Popen, map_fn=map):
+    """
+    Spawn the services respecting their dependencies and wait until all of them are ready.
+
+    The pre-checks of all services are run first, before anything is started - a service that is running already is
+    found before its dependencies are started, and the pre-checks don't stall the startup of the other services. Then
+    a service is spawned as soon as all services it depends on passed their checks. The checks of all starting
+    services are polled together, every ``interval`` seconds. Services that are already up are guarded against
+    exiting until the whole stack is ready.
+
+    :param list services: list of ``Service`` objects
+    :param function kill_fn: function to kill the started processes with if anything fails
+    :param float interval: time to sleep between polling rounds
+    :param float timeout: time limit for pre-checks of each service and for its post-checks, counted from the moment
+        the service is spawned
+    :param function sleep_fn: function to sleep
+    :param type popen: thingy to use in place of ``subprocess.Popen``, see ``spawn_and_check.execute``
+    :param function map_fn: function to call the checks of a polling round with, see ``spawn_and_check.execute``
+    :rtype: collections.OrderedDict
+    :return: process handles by service names, in the startup order
+    :raise ValueError: if the dependencies are invalid (nothing is started then)
+    :raise PreChecksFailed: if pre-checks of any service failed
+    :raise PostChecksFailed: if post-checks of any service kept failing until its timeout
+    :raise SubprocessExited: if any process exited before the whole stack was ready
+    """
+    waiting = startup_order(services)
+    for service in waiting:
+        run_pre_checks(service.command, service.pre_checks,
+                       interval=interval, timeout=timeout, sleep_fn=sleep_fn, map_fn=map_fn)
+
+    started = OrderedDict()  # Service name to process, in the startup order.
+    starting = OrderedDict()  # Service to (process, start time) of services whose checks are still polled.
+    ready = set()  # Names of the services that passed their checks.
+    # (service, index of the check) to its context - the deadline of the service and the process. Not keyed by the
+    # checks themselves - services may share a check object.
+    contexts = {}
+
+    def call(key):
+        service, index = key
+        return call_check(service.checks[index], contexts[key])
+
+    try:
+        while waiting or starting:
+            for service in [service for service in waiting if ready.issuperset(service.depends_on)]:
+                waiting.remove(service)
+                process = spawn(popen, service.command, prepare_spawn(service.checks))
+                attach_checks(service.checks, process)
+                started[service.name] = process
+                starting[service] = process, monotonic()
+                contexts.update(((service, index), CheckContext(starting[service][1] + timeout, process))
+                                for index in range(len(service.checks)))
+
+            time_before_check = monotonic()
+
+            # Check the processes one by one to know which one exited.
+            for process in started.values():
+                process_running_check(process)()
+
+            failing_keys = set(execute_checks(
+                [(service, index) for service in starting for index in range(len(service.checks))], map_fn, call))
+
+            became_ready = False
+            for service, (process, start) in starting.items():
+                failing = [check for index, check in enumerate(service.checks) if (service, index) in failing_keys]
+                if not failing:
+                    del starting[service]
+                    ready.add(service.name)
+                    became_ready = True
+                elif monotonic() > start + timeout:
+                    raise PostChecksFailed(service.command, 'Post-checks failed.',
+                                           TimedOut('Timed out polling the checks.', failing))
+
+            if not became_ready:
+                check_duration = monotonic() - time_before_check
+                sleep_fn(max(0, interval - check_duration))
+    except Exception:
+        exc_info = sys.exc_info()
+        tear_down(list(started.values()), kill_fn)
+        for service in services:
+            close_checks(service.checks)
+        raise exc_info[0], exc_info[1], exc_info[2]
+
+    return started
@@ -0,0 +1 @@
+"""Benchmarks of readiness detection and termination, run by hand - not collected by py.test."""
@@ -0,0 +1,193 @@
+"""
+Benchmark how fast the executor notices that a service is ready and the killer notices that it exited.
+
+Run from the root of the repository, e.g.::
+
+    python -m test.benchmarks.readiness --runs 20 --delay 0 --delay 0.5 --output before.json
+
+and compare the JSON output of two revisions. For every scenario (a fake service and the check detecting it) and
+delay, the benchmark records:
+
+- readiness lag: from the moment the fake service became ready (it writes the time to a file) to ``execute`` returning,
+- termination: from ``terminate_gracefully`` sending SIGTERM to it returning (the service exits right away),
+- poller CPU: user + system time of this process during ``execute`` - the cost of polling,
+- check calls: how many times the checks were called before they all passed.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import resource
+import tempfile
+from functools import partial
+from subprocess import Popen, PIPE
+
+import click
+import port_for
+
+from spawn_and_check import execute, check_tcp, check_unix, check_http, check_output, check_sd_notify
+from spawn_and_check.killers import terminate_gracefully
+from spawn_and_check.instrumentation import Instrumentation
+from spawn_and_check.constants import DEFAULT_INTERVAL
+
+
+SERVICE = './test/fake_service/service.py'
+DEVNULL = open(os.devnull, 'w')
+quiet_popen = partial(Popen, stdout=DEVNULL, stderr=DEVNULL)  # Keeps the chatter of the services out of the JSON.
+
+
+def tcp_scenario(directory):
+    """Return the fake service arguments, checks and popen for a TCP service."""
+    port = port_for.select_random()
+    return ['tcp', '--port', str(port)], [check_tcp(port)], quiet_popen
+
+
+def unix_scenario(directory):
+    """Return the fake service arguments, checks and popen for a unix socket service."""
+    socket_file = os.path.join(directory, 'service.sock')
+    return ['unix', '--socket-file', socket_file], [check_unix(socket_file)], quiet_popen
+
+
+def http_scenario(directory):
+    """Return the fake service arguments, checks and popen for an HTTP service."""
+    port = port_for.select_random()
+    return ['http', '--port', str(port)], [check_http('http://127.0.0.1:%s/' % port)], quiet_popen
+
+
+def output_scenario(directory):
+    """Return the fake service arguments, checks and popen for a service reporting readiness on stdout."""
+    return ['output', '--idle'], [check_output('Fake app is running')], partial(Popen, stdout=PIPE, stderr=DEVNULL)
+
+
+def notify_scenario(directory):
+    """Return the fake service arguments, checks and popen for a service reporting readiness with sd_notify."""
+    return ['notify'], [check_sd_notify()], quiet_popen
+
+
+SCENARIOS = {
+    'tcp': tcp_scenario,
+    'unix': unix_scenario,
+    'http': http_scenario,
+    'output': output_scenario,
+    'notify': notify_scenario,
+}
+
+
+def cpu_time():
+    """
+    Return user + system CPU time of this process (not of the children), in seconds.
+
+    :rtype: float
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_once(scenario, delay, interval, directory):
+    """
+    Start the fake service of the scenario, wait until it's ready and terminate it.
+
+    :param function scenario: one of ``SCENARIOS``
+    :param float delay: seconds the fake service sleeps before it starts
+    :param float interval: polling interval
+    :param str directory: temporary directory for the files of the run
+    :rtype: dict
+    :return: measurements of the run
+    """
+    ready_file = os.path.join(directory, 'ready')
+    arguments, checks, popen = scenario(directory)
+    command = [SERVICE, '--delay', str(delay), '--ready-file', ready_file, '--exit-delay', '0'] + arguments
+    instrumentation = Instrumentation()
+
+    cpu_before = cpu_time()
+    process = execute(command, checks, interval=interval, timeout=delay + 10, popen=popen,
+                      instrumentation=instrumentation)
+    returned = time.time()
+    cpu_after = cpu_time()
+
+    try:
+        with open(ready_file) as f:
+            ready = float(f.read())
+    finally:
+        terminating = time.time()
+        terminate_gracefully(process, interval=interval)
+        terminated = time.time()
+
+    post_checks = [phase for phase in instrumentation.report() if phase['phase'] == 'post_checks'][0]
+    return {
+        'readiness_lag': returned - ready,
+        'termination': terminated - terminating,
+        'poller_cpu': cpu_after - cpu_before,
+        'check_calls': sum(check['calls'] for check in post_checks['checks']),
+    }
+
+
+def summary(values):
+    """
+    Summarise the samples.
+
+    :param list values: numbers
+    :rtype: dict
+    """
+    values = sorted(values)
+    return {
+        'min': values[0],
+        'median': values[len(values) // 2],
+        'p90': values[int(len(values) * 0.9)],
+        'max': values[-1],
+        'mean': sum(values) / float(len(values)),
+    }
+
+
+def run_benchmark(scenario_names, delays, runs, interval):
+    """
+    Run every scenario with every delay ``runs`` times.
+
+    :rtype: list
+    :return: summaries of the measurements, per scenario and delay
+    """
+    results = []
+    for name in scenario_names:
+        for delay in delays:
+            samples = []
+            for _ in range(runs):
+                directory = tempfile.mkdtemp(prefix='spawn_and_check_benchmark')
+                try:
+                    samples.append(run_once(SCENARIOS[name], delay, interval, directory))
+                finally:
+                    shutil.rmtree(directory)
+
+            result = {'scenario': name, 'delay': delay, 'runs': runs}
+            for measurement in sorted(samples[0]):
+                result[measurement] = summary([sample[measurement] for sample in samples])
+            results.append(result)
+            click.echo('%s, delay %s: median readiness lag %.4fs' % (name, delay, result['readiness_lag']['median']),
+                       err=True)
+    return results
+
+
+@click.command()
+@click.option('--scenario', 'scenario_names', type=click.Choice(sorted(SCENARIOS)), multiple=True,
+              help='Scenario to run, may be repeated (all by default)')
+@click.option('--delay', 'delays', type=float, multiple=True,
+              help='Seconds the service waits before starting, may be repeated (0 by default)')
+@click.option('--runs', type=int, default=10, help='Number of runs of each scenario and delay')
+@click.option('--interval', type=float, default=DEFAULT_INTERVAL, help='Polling interval')
+@click.option('--output', type=click.File(mode='w'), default='-', help='File to write the JSON results to')
+def benchmark(scenario_names, delays, runs, interval, output):
+    """Benchmark readiness detection and termination, writing the results as JSON."""
+    report = {
+        'python': sys.version,
+        'platform': platform.platform(),
+        'time': time.time(),
+        'interval': interval,
+        'results': run_benchmark(scenario_names or sorted(SCENARIOS), delays or [0.0], runs, interval),
+    }
+    json.dump(report, output, indent=2, sort_keys=True)
+    output.write('\n')
+
+
+if __name__ == '__main__':
+    benchmark()
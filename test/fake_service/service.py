@@ -13,7 +13,8 @@ import os
 import socket
 import signal
 import errno
-from time import sleep
+from time import sleep, time
+from select import select, error as select_error
 from threading import Timer
 from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
 
@@ -23,32 +24,70 @@ HOST = '127.0.0.1'
 BUFFER_SIZE = 1024
 
 
+EXIT_DELAY = 2  # Seconds between SIGTERM and the exit.
+
+
+class Readiness(object):
+
+    """Records the moment the service becomes ready, for benchmarks."""
+
+    def __init__(self, ready_file):
+        """
+        Store the file to write the time to.
+
+        :param file ready_file: file or None
+        """
+        self.ready_file = ready_file
+
+    def mark(self):
+        """Write the current time (``time.time()``, comparable between processes) to the file, if any."""
+        if self.ready_file is not None:
+            self.ready_file.write(repr(time()))
+            self.ready_file.close()
+
+
 @click.group()
 @click.option('--delay', type=float, default=0.0, help='Number of seconds to sleep before the service is started')
-def fake_service(delay):
+@click.option('--ready-file', type=click.File(mode='w'), default=None,
+              help='File to write the time the service became ready to')
+@click.option('--exit-delay', type=float, default=EXIT_DELAY, help='Number of seconds to exit after SIGTERM')
+@click.pass_context
+def fake_service(context, delay, ready_file, exit_delay):
     """Run a service that performs an action detected by a tested checker or executor."""
+    global EXIT_DELAY
+    EXIT_DELAY = exit_delay
+    context.obj = Readiness(ready_file)
     sleep(delay)
 
 
 @fake_service.command()
 @click.option('--log-file', type=click.File(mode='w'), default='-', help='File to log messages to')
 @click.option('--message', type=unicode, default='Fake app is running.', help='Message to log when running')
-def output(log_file, message):
+@click.option('--idle/--exit', default=False, help='Whether to keep running after writing the message')
+@click.pass_obj
+def output(readiness, log_file, message, idle):
     """Simply write to a file."""
     log_file.write(message)
+    log_file.flush()
+    readiness.mark()
+
+    while idle:
+        sleep(60)
 
 
-def listen_stream(protocol_family, address_to_bind):
+def listen_stream(protocol_family, address_to_bind, readiness):
     """
     Listen indefinitely on a socket of SOCK_STREAM type and print received bytes.
 
     :param int protocol_family: one of SOCK_* constants in ``socket`` library
     :param address_to_bind: argument to pass to the bind method of the socket object,
         depending on the socket type (most probably a host and port tuple or a file path)
+    :param Readiness readiness: marked once listening
     """
     stream_socket = socket.socket(protocol_family, socket.SOCK_STREAM)
     stream_socket.bind(address_to_bind)
     stream_socket.listen(0)  # No backlog.
+    readiness.mark()
 
     while True:
         try:
@@ -67,25 +106,29 @@ def listen_stream(protocol_family, address_to_bind):
 
 @fake_service.command()
 @click.option('--port', type=int, help='TCP port to bind and listen on')
-def tcp(port):
+@click.pass_obj
+def tcp(readiness, port):
     """Listen on a TCP socket."""
-    listen_stream(socket.AF_INET, (HOST, port))
+    listen_stream(socket.AF_INET, (HOST, port), readiness)
 
 
 @fake_service.command()
 @click.option('--socket-file', type=str,
               help='Unix socket to bind and listen on. The file will be created automatically.')
-def unix(socket_file):
+@click.pass_obj
+def unix(readiness, socket_file):
     """Listen on a unix socket."""
-    listen_stream(socket.AF_UNIX, socket_file)
+    listen_stream(socket.AF_UNIX, socket_file, readiness)
 
 
 @fake_service.command()
 @click.option('--port', type=int, help='UDP port to bind and listen on')
-def udp(port):
+@click.pass_obj
+def udp(readiness, port):
     """Listen indefinitely on a UDP socket."""
     udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     udp_socket.bind(('0.0.0.0', port))
+    readiness.mark()
 
     while True:
         try:
@@ -126,15 +169,61 @@ class FakeHTTPRequestHandler(BaseHTTPRequestHandler):
 @fake_service.command()
 @click.option('--port', type=int, help='The port to bind and run test HTTP server on')
 @click.option('--path', type=str, default='/', help='URL path to respond with OK for (should begin with a slash)')
-def http(port, path):
+@click.pass_obj
+def http(readiness, port, path):
     """Run a test HTTP server."""
     httpd = FakeHTTPServer((HOST, port), FakeHTTPRequestHandler, accepted_path=path)
+    readiness.mark()
     httpd.serve_forever()
 
 
+@fake_service.command()
+@click.option('--status', type=str, default='Fake app is running.', help='Status to report')
+@click.option('--errno', 'error_number', type=int, default=None,
+              help='Report a failure with this errno and exit instead of reporting readiness')
+@click.pass_obj
+def notify(readiness, status, error_number):
+    """Report readiness (or a failure) with sd_notify."""
+    notify_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    if error_number is not None:
+        notify_socket.sendto('STATUS=%s\nERRNO=%d\n' % (status, error_number), os.environ['NOTIFY_SOCKET'])
+        raise SystemExit(1)
+
+    readiness.mark()
+    notify_socket.sendto('STATUS=%s\nREADY=1\n' % status, os.environ['NOTIFY_SOCKET'])
+    while True:
+        sleep(60)
+
+
+@fake_service.command()
+@click.pass_obj
+def activated(readiness):
+    """Accept connections on the sockets passed with LISTEN_FDS and greet the clients with the PID."""
+    if int(os.environ['LISTEN_PID']) != os.getpid():
+        raise SystemExit('LISTEN_PID is not my PID.')
+
+    listening_sockets = [
+        socket.fromfd(3 + index, socket.AF_UNIX if name == 'unix' else socket.AF_INET, socket.SOCK_STREAM)
+        for index, name in enumerate(os.environ['LISTEN_FDNAMES'].split(':'))]
+    readiness.mark()
+
+    while True:
+        try:
+            readable, _, _ = select(listening_sockets, [], [])
+        except select_error as e:
+            if e.args[0] != errno.EINTR:
+                raise
+            continue
+
+        for listening_socket in readable:
+            connection, _ = listening_socket.accept()
+            connection.sendall('Hello from %d\n' % os.getpid())
+            connection.close()
+
+
 def terminate_sloppily(signum, frame):
     """
-    Terminate the process but... uhm... give me 2 seconds.
+    Terminate the process but... uhm... give me 2 seconds (or ``--exit-delay``).
 
     This is needed for testing the case when the same service is executed just after its
     termination.
@@ -145,7 +234,7 @@ def terminate_sloppily(signum, frame):
         print "OK, I'm exiting."
         os._exit(1)  # Make the whole process exit, not just current thread.
 
-    exit_after_20_sec = Timer(2, do_exit)
+    exit_after_20_sec = Timer(EXIT_DELAY, do_exit)
     exit_after_20_sec.start()
 
 
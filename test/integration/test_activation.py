@@ -0,0 +1,80 @@
+"""Socket activation tests."""
+import sys
+import time
+import socket
+import subprocess
+
+import pytest
+
+from spawn_and_check import execute
+from spawn_and_check.activation import ListenSockets
+from spawn_and_check.exceptions import PreChecksFailed
+
+
+SERVICE = './test/fake_service/service.py'
+
+
+def greeting(address):
+    """Connect to the address and return what the fake service says."""
+    client = socket.socket(socket.AF_UNIX if isinstance(address, str) else socket.AF_INET)
+    client.settimeout(5)
+    client.connect(address)
+    try:
+        return client.makefile().readline()
+    finally:
+        client.close()
+
+
+def test_execute_activated_sockets(tmpdir):
+    """Check if the sockets are passed to the process with the right PID."""
+    socket_file = str(tmpdir / 'activated.sock')
+    sockets = ListenSockets([0, socket_file])
+
+    process = execute([SERVICE, '--delay', '0.5', 'activated'], [], sockets=sockets)
+
+    assert sockets.sockets == [], 'The sockets should not be held by the executor.'
+    for address in sockets.addresses:
+        # Clients can connect before the process accepts - the kernel queues the connections.
+        assert greeting(address) == 'Hello from %d\n' % process.pid
+
+    process.kill()
+
+
+LEAN_EXECUTE = """
+import os
+from spawn_and_check import execute
+from spawn_and_check.activation import ListenSockets
+from test.integration.test_activation import SERVICE, greeting
+
+try:
+    os.fstat(3)
+    raise SystemExit('Descriptor 3 should be free, for the socket to be bound there.')
+except OSError:
+    pass
+
+sockets = ListenSockets([0])
+process = execute([SERVICE, 'activated'], [], sockets=sockets)
+try:
+    assert greeting(sockets.addresses[0]) == 'Hello from %d\\n' % process.pid
+finally:
+    process.kill()
+"""
+
+
+def test_execute_activated_socket_own_number():
+    """Check if a socket bound at descriptor 3 (the first free one of a lean process) is passed, too."""
+    subprocess.check_call([sys.executable, '-c', LEAN_EXECUTE], close_fds=True)
+
+
+def test_execute_activated_socket_in_use():
+    """Check if a port conflict fails the execution right away."""
+    occupant = socket.socket()
+    occupant.bind(('127.0.0.1', 0))
+    occupant.listen(1)
+
+    start = time.time()
+    with pytest.raises(PreChecksFailed):
+        execute([SERVICE, 'activated'], [], sockets=ListenSockets([occupant.getsockname()[1]]), timeout=10)
+    assert time.time() - start < 1
+
+    occupant.close()
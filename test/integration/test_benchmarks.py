@@ -0,0 +1,14 @@
+"""Smoke tests of the readiness benchmark - every scenario should keep passing."""
+import pytest
+
+from test.benchmarks.readiness import SCENARIOS, run_once
+
+
+@pytest.mark.parametrize('name', sorted(SCENARIOS))
+def test_readiness_scenario(name, tmpdir):
+    """Run the scenario once and check if all measurements are taken."""
+    measurements = run_once(SCENARIOS[name], delay=0, interval=0.1, directory=str(tmpdir))
+
+    assert sorted(measurements) == ['check_calls', 'poller_cpu', 'readiness_lag', 'termination']
+    assert measurements['check_calls'] >= 1
+    assert 0 <= measurements['readiness_lag'] < 5
@@ -0,0 +1,69 @@
+"""Process exit notifications tests."""
+import os
+import time
+import subprocess
+
+import pytest
+
+from spawn_and_check import exit_watch
+from spawn_and_check.exit_watch import exit_notification, exit_notifications, wake_on_exit
+from spawn_and_check.killers import terminate_gracefully, terminate_many
+from spawn_and_check.polling import wait_until
+
+
+@pytest.fixture(params=['pidfd', 'sigchld'])
+def notification_backend(request, monkeypatch):
+    """Run the test with each of the notification backends."""
+    if request.param == 'pidfd':
+        process = subprocess.Popen(['true'])
+        if exit_watch.pidfd_open(process.pid) is None:
+            pytest.skip('pidfd_open is not supported here.')
+        process.wait()
+    else:
+        monkeypatch.setattr(exit_watch, 'pidfd_open', lambda pid: None)
+    return request.param
+
+
+def test_wait_until_wakes_up_on_exit(notification_backend):
+    """Check if the polling loop notices the exit long before the next interval tick."""
+    process = subprocess.Popen(['sleep', '0.2'])
+
+    start = time.time()
+    with exit_notification(process) as notification:
+        assert notification is not None
+        wait_until(wake_on_exit(lambda: process.poll() is not None, notification), interval=5, timeout=10)
+
+    assert time.time() - start < 1
+
+
+def test_terminate_gracefully_returns_right_after_exit(notification_backend):
+    """Check if ``terminate_gracefully`` does not sleep the whole interval after the process exits."""
+    process = subprocess.Popen(['sleep', 'infinity'], preexec_fn=os.setsid)
+
+    start = time.time()
+    terminate_gracefully(process, interval=5, timeout=10)
+
+    assert time.time() - start < 1
+    assert process.returncode is not None
+
+
+def test_terminate_many_returns_right_after_exit(notification_backend):
+    """Check if ``terminate_many`` wakes up as each of the processes exits."""
+    processes = [subprocess.Popen(['sleep', 'infinity'], preexec_fn=os.setsid) for _ in range(3)]
+
+    with exit_notifications(processes) as notifications:
+        assert None not in notifications
+
+    start = time.time()
+    terminate_many(processes, interval=5, timeout=10)
+
+    assert time.time() - start < 1
+    assert all(process.returncode is not None for process in processes)
+
+
+def test_no_notification_for_reaped_process():
+    """Check if there's no notification for an already reaped process - its PID may be reused."""
+    process = subprocess.Popen(['true'])
+    process.wait()
+    with exit_notification(process) as notification:
+        assert notification is None
@@ -0,0 +1,70 @@
+"""File checks tests."""
+import time
+from threading import Timer
+
+import pytest
+
+from spawn_and_check import execute, check_file, check_file_contains, check_socket_file, inotify
+from spawn_and_check.polling import wait_until
+
+
+SERVICE = './test/fake_service/service.py'
+
+
+@pytest.fixture(params=['inotify', 'stat'])
+def watch_backend(request, monkeypatch):
+    """Run the test with inotify and with the polling fallback."""
+    if request.param == 'stat':
+        monkeypatch.setattr(inotify, 'inotify_functions', lambda: None)
+    return request.param
+
+
+def test_check_file_wakes_up(tmpdir, watch_backend):
+    """Check if the file check notices the file appearing without waiting for the next interval tick."""
+    path = tmpdir / 'ready'
+    check = check_file(str(path))
+    assert check() is False
+
+    Timer(0.2, path.write, ['']).start()
+    start = time.time()
+    wait_until(check, interval=2 if watch_backend == 'inotify' else 0.1, timeout=5)
+
+    assert time.time() - start < 1
+
+
+def test_check_file_contains(tmpdir):
+    """Check if the content is searched incrementally and truncating the file starts over."""
+    path = tmpdir / 'service.log'
+    check = check_file_contains(str(path), r'listening on 8080$')
+    assert check() is False
+
+    path.write('starting\nlisten')
+    assert check() is False
+
+    path.write('ing on 8', mode='a')
+    assert check() is False
+    path.write('080\n', mode='a')
+    assert check() is True
+
+    another_check = check_file_contains(str(path), 'ready')
+    assert another_check() is False
+    path.write('ready\n')  # Truncated - the offset of the previous read is past the end now.
+    assert another_check() is True
+
+    path.write('listening', mode='a')
+    last_line_check = check_file_contains(str(path), 'listening$')
+    assert last_line_check() is False, 'The last line may still be being written.'
+    assert last_line_check() is True, 'Nothing was appended since - the last line should be searched.'
+
+
+def test_execute_check_socket_file(tmpdir, watch_backend):
+    """Check the executor with the socket file check."""
+    socket_file = str(tmpdir / 'temp_unix_socket')
+
+    process = execute(
+        [SERVICE, '--delay', '0.3', 'unix', '--socket-file', socket_file],
+        [check_socket_file(socket_file)],
+        interval=3 if watch_backend == 'inotify' else 0.1, timeout=10)
+
+    assert check_socket_file(socket_file)() is True
+    process.kill()
@@ -1,14 +1,20 @@
 """Killing functions tests."""
 import os
+import time
 import signal
 from select import select
 import subprocess
 import pytest
+from mock import Mock
 
 
 from spawn_and_check.killers import (
-    killpg_if_alive, killpg_and_check, terminate_gracefully, kill_crudely)
+    killpg_if_alive, killpg_and_check, terminate_gracefully, terminate_many, kill_crudely, KillPolicy, Stage,
+    EXITED, TERMINATED, KILLED, UNKILLABLE)
+from spawn_and_check import execute
+from spawn_and_check.exceptions import PostChecksFailed
 from spawn_and_check.exceptions import CannotTerminate
+from spawn_and_check.instrumentation import Instrumentation
 
 
 @pytest.fixture
@@ -31,8 +37,7 @@ def running_process():
     return subprocess.Popen(['sleep', 'infinity'], preexec_fn=os.setsid)
 
 
-@pytest.fixture
-def process_ignoring_signals():
+def spawn_process_ignoring_signals():
     """Return a subprocess running forever and ignoring SIGTERM and SIGABRT."""
     process = subprocess.Popen(['./test/fake_service/ignore_signals_and_idle.py'],
                                stdout=subprocess.PIPE, preexec_fn=os.setsid)
@@ -46,6 +51,12 @@ def process_ignoring_signals():
             return process
 
 
+@pytest.fixture
+def process_ignoring_signals():
+    """Return a subprocess running forever and ignoring SIGTERM and SIGABRT."""
+    return spawn_process_ignoring_signals()
+
+
 @pytest.mark.parametrize('signal_to_send', [signal.SIGTERM, signal.SIGINT, signal.SIGKILL])
 def test_killpg_if_alive(invalid_pid, running_process, signal_to_send):
     """Ensure ``killpg_if_alive`` accepts invalid PIDs and kills passed processes."""
@@ -85,3 +96,74 @@ def test_kill_crudely(running_process):
     """Ensure that ``kill_crudely`` just sends SIGKILL, no matter what."""
     kill_crudely(running_process)
     assert running_process.returncode == -signal.SIGKILL
+
+
+def test_terminate_many(running_process):
+    """Ensure ``terminate_many`` escalates only the stragglers to SIGKILL and waits for all processes at once."""
+    exited_process = subprocess.Popen(['true'])
+    exited_process.wait()
+    stubborn_processes = [spawn_process_ignoring_signals() for _ in range(2)]
+
+    instrumentation = Instrumentation()
+    start = time.time()
+    outcomes = terminate_many([exited_process, running_process] + stubborn_processes, timeout=1,
+                              instrumentation=instrumentation)
+    assert time.time() - start < 1.8, 'The stragglers should be waited for together.'
+    # The exit notification of the terminated process stays readable - it must not wake the loop up every round.
+    assert [(phase['phase'], phase['rounds'] <= 20) for phase in instrumentation.report()] == [
+        ('signal 15', True), ('signal 9', True)]
+
+    assert outcomes == [EXITED, TERMINATED, KILLED, KILLED]
+    assert running_process.returncode == -signal.SIGTERM
+    assert [process.returncode for process in stubborn_processes] == [-signal.SIGKILL] * 2
+
+
+def test_terminate_many_unkillable(invalid_pid, running_process):
+    """Ensure ``terminate_many`` reports processes that won't terminate in one exception."""
+    unkillable_process = Mock(pid=invalid_pid)  # Signals go nowhere.
+    unkillable_process.poll.return_value = None
+
+    with pytest.raises(CannotTerminate) as cannot_terminate:
+        terminate_many([unkillable_process, running_process], timeout=0.2)
+
+    message, unkillable, outcomes = cannot_terminate.value.args
+    assert unkillable == [unkillable_process]
+    assert outcomes == [UNKILLABLE, TERMINATED]
+
+
+def test_kill_policy(running_process, process_ignoring_signals):
+    """Ensure the ladder of signals stops at the stage that stopped the process."""
+    policy = KillPolicy([Stage(signal.SIGTERM, timeout=0.3), Stage(signal.SIGABRT, timeout=0.3), Stage(signal.SIGKILL)])
+
+    assert policy(running_process) == policy.stages[0]
+    assert policy(process_ignoring_signals) == policy.stages[2]
+    assert process_ignoring_signals.returncode == -signal.SIGKILL
+    assert policy(running_process) is None, 'Processes that exited already should not be signalled.'
+
+    assert [(record.pid, record.stage, record.stopped) for record in policy.history] == [
+        (running_process.pid, policy.stages[0], True),
+        (process_ignoring_signals.pid, policy.stages[2], True),
+        (running_process.pid, None, True),
+    ]
+    assert 0.6 <= policy.history[1].elapsed < 1.5
+
+
+def test_kill_policy_fails(process_ignoring_signals):
+    """Ensure ``CannotTerminate`` is raised if the process survives all stages."""
+    policy = KillPolicy([Stage(signal.SIGTERM, timeout=0.2, interval=0.05)])
+
+    with pytest.raises(CannotTerminate):
+        policy(process_ignoring_signals)
+    assert policy.history[0].stopped is False
+
+    kill_crudely(process_ignoring_signals)
+
+
+def test_kill_policy_as_kill_fn():
+    """Ensure the policy can be used by the executor to kill a process that failed to start."""
+    policy = KillPolicy([Stage(signal.SIGINT, timeout=1), Stage(signal.SIGKILL)])
+
+    with pytest.raises(PostChecksFailed):
+        execute('sleep 10', [lambda: False], kill_fn=policy, timeout=0.2)
+
+    assert policy.history[0].stage == policy.stages[0]
@@ -0,0 +1,70 @@
+"""Multiplexed probes tests - against listeners opened by the test itself."""
+import socket
+
+import pytest
+import port_for
+
+from spawn_and_check import check_tcp, check_tcp_many, any_of, quorum
+from spawn_and_check.checks import connect_tcp, probe_tcp
+
+
+@pytest.fixture
+def listening_ports(request):
+    """Ports of 3 listening TCP sockets."""
+    ports = []
+    for _ in range(3):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(5)
+        request.addfinalizer(listener.close)
+        ports.append(listener.getsockname()[1])
+    return ports
+
+
+def test_probe_tcp(listening_ports):
+    """Check if ``probe_tcp`` reports the family connected over for each address in one pass."""
+    closed_port = port_for.select_random()
+    addresses = [('127.0.0.1', port) for port in listening_ports + [closed_port]]
+
+    results = probe_tcp(addresses)
+
+    assert results == dict((address, socket.AF_INET if address[1] != closed_port else None) for address in addresses)
+
+
+def test_check_tcp_many(listening_ports):
+    """Check if ``check_tcp_many`` passes only if all ports accept connections."""
+    assert check_tcp_many(listening_ports)() is True
+    assert check_tcp_many([('127.0.0.1', port) for port in listening_ports])() is True
+    assert check_tcp_many(listening_ports + [port_for.select_random()])() is False
+
+
+def test_check_tcp_dual_stack(listening_ports):
+    """
+    Check if all addresses of a dual-stack name are tried at once.
+
+    The listener is bound to IPv4 only - 'localhost' may resolve to ::1 first, which refuses the connection.
+    """
+    check = check_tcp(listening_ports[0], host='localhost')
+    assert check.family is None
+
+    assert check() is True
+    assert check.family == socket.AF_INET
+
+    many = check_tcp_many(listening_ports, host='localhost')
+    assert many() is True
+    assert set(many.families.values()) == {socket.AF_INET}
+
+
+def test_connect_tcp_unresolvable(listening_ports):
+    """Check if an address that cannot be resolved just fails to connect."""
+    address = 'no-such-host.invalid', listening_ports[0]
+    assert connect_tcp([address], timeout=0.5) == {address: None}
+
+
+def test_combined_tcp_checks(listening_ports):
+    """Check if combined TCP checks pass once enough ports accept connections."""
+    closed_ports = [port_for.select_random() for _ in range(2)]
+
+    assert any_of([check_tcp(port) for port in closed_ports + listening_ports[:1]])() is True
+    assert quorum([check_tcp(port) for port in listening_ports + closed_ports], 3)() is True
+    assert quorum([check_tcp(port) for port in listening_ports[:2] + closed_ports], 3)() is False
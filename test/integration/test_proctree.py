@@ -0,0 +1,93 @@
+"""Process tree killer tests."""
+import os
+import signal
+import subprocess
+
+import pytest
+
+from spawn_and_check.exceptions import SubprocessExited
+from spawn_and_check.executor import execute
+from spawn_and_check.killers import terminate_tree
+from spawn_and_check.polling import wait_until
+from spawn_and_check.proctree import ProcessTree, proc_available, read_stat
+
+
+pytestmark = pytest.mark.skipif(not proc_available(), reason='Needs /proc.')
+
+
+@pytest.fixture
+def process_with_escaped_worker(request):
+    """Spawn a shell with a worker that left the process group and a regular child, wait until they run."""
+    process = subprocess.Popen(['sh', '-c', 'setsid sleep 1001 & sleep 1002 & wait'], preexec_fn=os.setsid)
+    tree = ProcessTree(process.pid)
+    # The worker is seen before ``setsid`` moves it to a new session - wait for that too.
+    wait_until(lambda: tree.scan() is not None and len(tree.alive()) == 3 and
+               len(set(os.getsid(pid) for pid in tree.alive())) == 2)
+
+    request.addfinalizer(lambda: tree.signal(signal.SIGKILL))
+    return process, tree
+
+
+def test_process_tree_finds_escaped_worker(process_with_escaped_worker):
+    """Check if the tree includes the descendant in another session."""
+    process, tree = process_with_escaped_worker
+    sessions = set(os.getsid(pid) for pid in tree.alive())
+    assert len(sessions) == 2
+
+
+def test_terminate_tree(process_with_escaped_worker):
+    """Check if the whole tree is gone after ``terminate_tree`` returns."""
+    process, tree = process_with_escaped_worker
+    start_times = dict(tree.members)
+
+    terminate_tree(process, timeout=2)
+
+    assert process.returncode is not None
+    for pid, start_time in start_times.items():
+        stat = read_stat(pid)
+        assert stat is None or stat[2] == 'Z' or stat[1] != start_time
+
+
+def find_pids(argument):
+    """Find the PIDs of the processes with the argument in their command line."""
+    pids = []
+    for pid in os.listdir('/proc'):
+        try:
+            with open(os.path.join('/proc', pid, 'cmdline')) as f:
+                if argument in f.read().split('\0'):
+                    pids.append(int(pid))
+        except (IOError, OSError):
+            pass  # Not a process or gone.
+    return pids
+
+
+def test_terminate_tree_double_forked_daemon():
+    """Check if a daemon that double-forked is terminated after the process that launched it exited."""
+    process = execute(['sh', '-c', 'setsid sh -c "sleep 1003 & exit"; sleep 0.5'], [lambda: True],
+                      pre_checks=[], kill_fn=terminate_tree)
+    process.wait()
+    daemons = find_pids('1003')
+    try:
+        assert len(daemons) == 1
+        assert read_stat(daemons[0])[0] != process.pid, 'The daemon should be reparented.'
+        process.tree.scan()
+        assert daemons[0] in process.tree.alive()
+
+        terminate_tree(process, timeout=2)
+        wait_until(lambda: find_pids('1003') == [], timeout=2)
+    finally:
+        for pid in find_pids('1003'):
+            os.kill(pid, signal.SIGKILL)
+
+
+def test_execute_terminates_tree_of_exited_process():
+    """Check if the descendants of a process that exited during the post-checks are terminated."""
+    with pytest.raises(SubprocessExited) as exited:
+        execute(['sh', '-c', 'setsid sleep 1004 & sleep 0.3; exit 1'], [lambda: False], pre_checks=[],
+                kill_fn=terminate_tree)
+    try:
+        assert exited.value.process.returncode == 1
+        wait_until(lambda: find_pids('1004') == [], timeout=2)
+    finally:
+        for pid in find_pids('1004'):
+            os.kill(pid, signal.SIGKILL)
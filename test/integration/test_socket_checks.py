@@ -0,0 +1,51 @@
+"""Tests of the checks reading the socket tables of the kernel."""
+import socket
+from functools import partial
+from subprocess import Popen
+
+import pytest
+import port_for
+
+from spawn_and_check import execute, check_tcp_listening, check_udp_bound, check_unix_listening
+from spawn_and_check.exceptions import PostChecksFailed
+from spawn_and_check.proctree import proc_available
+
+
+pytestmark = pytest.mark.skipif(not proc_available(), reason='Needs /proc.')
+
+SERVICE = './test/fake_service/service.py'
+
+
+@pytest.mark.parametrize('protocol', ['tcp', 'udp', 'unix'])
+def test_execute_socket_table_checks(tmpdir, protocol):
+    """Check the executor with the socket table checks."""
+    port = port_for.select_random()
+    socket_file = str(tmpdir / 'service.sock')
+    arguments, check = {
+        'tcp': (['tcp', '--port', str(port)], check_tcp_listening(port, '127.0.0.1')),
+        'udp': (['udp', '--port', str(port)], check_udp_bound(port)),
+        'unix': (['unix', '--socket-file', socket_file], check_unix_listening(socket_file)),
+    }[protocol]
+
+    assert check() is False
+    process = execute([SERVICE, '--delay', '0.3'] + arguments, [check], timeout=3)
+    assert check() is True
+    process.kill()
+    process.wait()
+
+
+def test_socket_owned_by_other_process():
+    """Check if a socket of some other process does not count once the check is attached."""
+    port = port_for.select_random()
+    stale_listener = socket.socket()
+    stale_listener.bind(('127.0.0.1', port))
+    stale_listener.listen(1)
+
+    check = check_tcp_listening(port)
+    assert check() is True, 'Not attached - any process may own the socket.'
+
+    with pytest.raises(PostChecksFailed):
+        # Without ``close_fds``, the process would inherit the socket and own it too.
+        execute('sleep 10', [check], pre_checks=[], timeout=0.3, popen=partial(Popen, close_fds=True))
+
+    stale_listener.close()
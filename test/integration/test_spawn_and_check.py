@@ -5,12 +5,21 @@ It is impossible to test the checks with unit tests because of the race conditio
 know when e.g. the background TCP listener really started listening. It is also impractical to test them in a unit
 way because that would require way too much patching and mocking compared to what the checks do.
 """
+import os
+import sys
+import time
+import socket
+from functools import partial
+from subprocess import Popen, PIPE, STDOUT
+
 import pytest
 import port_for
 
-from spawn_and_check import execute, check_tcp, check_http, check_unix
-from spawn_and_check.exceptions import PreChecksFailed, PostChecksFailed
+from spawn_and_check import execute, check_tcp, check_http, check_unix, check_output, check_sd_notify
+from spawn_and_check import check_notification_fd, check_file
+from spawn_and_check.exceptions import PreChecksFailed, PostChecksFailed, SubprocessExited, NotificationClosed
 from spawn_and_check.polling import wait_until
+from spawn_and_check.history import StartupHistory
 
 
 SERVICE = './test/fake_service/service.py'
@@ -87,6 +96,7 @@ def test_execute_check_http(delay):
         [check],
         timeout=1 + delay)
     assert check() is True
+    assert check.family == socket.AF_INET
     assert check_bad_path() is False
 
     assert process.poll() is None
@@ -132,3 +142,150 @@ def test_execute_same_service_sequentially():
     another_process = execute(command, [check_tcp(port)], timeout=5)
 
     another_process.kill()
+
+
+def test_execute_process_exit_noticed_immediately():
+    """Check if the process exit is noticed right away, not at the next interval tick."""
+    def never_ready():
+        return False
+
+    start = time.time()
+    with pytest.raises(SubprocessExited):
+        execute('sleep 0.2', [never_ready], interval=5, timeout=10)
+    assert time.time() - start < 1
+
+
+def test_execute_check_output():
+    """Check the executor with the output check, matching a message printed in parts."""
+    command = ['sh', '-c', 'sleep 0.2; printf "Service is "; sleep 0.2; echo "ready"; exec sleep 10']
+    process = execute(command, [check_output(r'is ready$')], popen=partial(Popen, stdout=PIPE), timeout=2)
+
+    assert process.poll() is None
+    process.kill()
+
+
+def test_execute_output_attached_to_exceptions():
+    """Check if the most recent output of the process is available on the exceptions."""
+    piped = partial(Popen, stdout=PIPE, stderr=STDOUT)
+
+    with pytest.raises(SubprocessExited) as exited:
+        execute(['sh', '-c', 'echo "Cannot bind"; exit 3'], [check_output('ready')], popen=piped)
+    assert exited.value.output == 'Cannot bind\n'
+
+    with pytest.raises(PostChecksFailed) as checks_failed:
+        execute(['sh', '-c', 'echo "Still booting"; exec sleep 10'], [check_output('ready')], popen=piped, timeout=1)
+    assert checks_failed.value.output == 'Still booting\n'
+
+
+@pytest.mark.parametrize('delay', [0, 0.5])
+def test_execute_check_sd_notify(delay):
+    """Check the executor with the sd_notify check - readiness should be noticed before the next interval tick."""
+    start = time.time()
+    process = execute([SERVICE, '--delay', str(delay), 'notify'], [check_sd_notify()], interval=5, timeout=10)
+    assert time.time() - start < delay + 1
+
+    assert process.poll() is None
+    process.kill()
+
+
+def test_execute_sd_notify_status_attached_to_exceptions():
+    """Check if the status and errno sent with sd_notify are available on the exceptions."""
+    with pytest.raises(SubprocessExited) as exited:
+        execute([SERVICE, 'notify', '--status', 'Cannot bind', '--errno', '98'], [check_sd_notify()])
+
+    assert exited.value.status == 'Cannot bind'
+    assert exited.value.errno == 98
+    notify_socket = exited.value.process.notify_socket
+    assert notify_socket.socket is None, 'The socket should be closed once the details are read.'
+    assert not os.path.exists(notify_socket.directory)
+
+
+def test_execute_check_notification_fd():
+    """Check the executor with the notification descriptor check, both at a fixed number and in a variable."""
+    start = time.time()
+    process = execute(['sh', '-c', 'sleep 0.2; echo >&3; exec sleep 10'], [check_notification_fd(3)],
+                      interval=5, timeout=10)
+    assert time.time() - start < 1
+    process.kill()
+
+    script = 'import os, time; os.write(int(os.environ["READY_FD"]), "\\n"); time.sleep(10)'
+    check = check_notification_fd(env='READY_FD')
+    for _ in range(2):  # The same check, for one process after another.
+        process = execute([sys.executable, '-c', script], [check], timeout=5)
+        assert check() is True
+        process.kill()
+        process.wait()
+        assert check() is False
+
+
+def test_execute_notification_fd_own_number():
+    """Check if the write end is inherited when it happens to have the requested number already."""
+    read_fd, write_fd = os.pipe()
+    os.close(read_fd)
+    os.close(write_fd)  # The next pipe gets the same numbers.
+
+    script = 'import os, sys, time; os.write(int(sys.argv[1]), "\\n"); time.sleep(10)'
+    process = execute([sys.executable, '-c', script, str(write_fd)], [check_notification_fd(write_fd)], timeout=5)
+    process.kill()
+
+
+def test_execute_notification_fd_closed():
+    """Check if closing the descriptor without reporting readiness fails the execution right away."""
+    start = time.time()
+    with pytest.raises(NotificationClosed):
+        execute(['sh', '-c', 'exec 3>&-; exec sleep 10'], [check_notification_fd(3)], interval=5, timeout=10)
+    assert time.time() - start < 1
+
+
+def test_execute_with_history(tmpdir):
+    """Check if a command with a recorded startup time is probed only a few times before it."""
+    history = StartupHistory(str(tmpdir / 'history.json'))
+    ready_file = tmpdir / 'ready'
+    command = ['sh', '-c', 'sleep 1; touch %s; exec sleep 10' % ready_file]
+    calls = []
+
+    def check():
+        calls.append(time.time())
+        return ready_file.check()
+
+    for _ in range(2):
+        if ready_file.check():
+            ready_file.remove()
+        del calls[:]
+        process = execute(command, [check], pre_checks=[], interval=0.02, timeout=5, history=history)
+        process.kill()
+
+    assert 0.9 < history.startup_times(command)[0] < 2
+    assert len(calls) < 20, 'Only the rounds shortly before the expected startup time should be dense.'
+
+
+def test_execute_capture_output(tmpdir):
+    """Check if a process printing more than a pipe holds is not blocked and the tail of its output is kept."""
+    script = ('import sys, time; sys.stdout.write("x" * 1000000 + "done\\n"); sys.stdout.flush(); '
+              'open(sys.argv[1], "w"); time.sleep(10)')
+    ready_file = str(tmpdir / 'ready')
+
+    process = execute([sys.executable, '-c', script, ready_file], [check_file(ready_file)], timeout=5,
+                      capture_output=1024)
+    tail = process.output.tail()
+    assert tail.endswith(b'done\n') and len(tail) == 1024
+    process.kill()
+
+    with pytest.raises(PostChecksFailed) as failed:
+        execute([sys.executable, '-c', script, str(tmpdir / 'other')], [lambda: False], timeout=1,
+                capture_output=1024)
+    assert failed.value.output.endswith(b'done\n')
+
+
+def test_execute_capture_output_attaches_checks_first():
+    """Check if the output checks subscribe before the output is drained, so that no chunk escapes them."""
+    def check():
+        return True
+
+    check.attach = lambda process: drain_threads.append(process.output.drain_thread)
+    drain_threads = []
+
+    process = execute(['sh', '-c', 'echo ready; exec sleep 5'], [check_output('ready'), check], pre_checks=[],
+                      capture_output=1024)
+    process.kill()
+    assert drain_threads == [None]
@@ -1,6 +1,12 @@
 """Tests for checks' helpers."""
+import socket
+
 import pytest
-from spawn_and_check.checks import is_response_ok, http_urlsplit
+from mock import Mock, patch
+
+from spawn_and_check.checks import is_response_ok, http_urlsplit, check_http, check_tcp
+from spawn_and_check.clock import monotonic
+from spawn_and_check.context import CheckContext
 
 
 @pytest.mark.parametrize('url, expected_split', [
@@ -30,3 +36,104 @@ def test_is_response_ok():
     assert is_response_ok(250) is True
     assert is_response_ok(299) is True
     assert is_response_ok(300) is False
+
+
+class FakeHTTPConnection(object):
+
+    """Stand-in for ``httplib.HTTPConnection`` recording the connections and requests."""
+
+    instances = []
+
+    def __init__(self, host, port, timeout=None):
+        """Record the connection and set it up to respond with the class-level ``statuses``."""
+        self.address = host, port
+        self.timeout = timeout
+        self.requests = []
+        self.responses = []
+        self.closed = False
+        self.instances.append(self)
+
+    def request(self, method, path):
+        """Record the request or fail like a connection closed by the server."""
+        if self.fail:
+            raise socket.error('Connection reset by peer.')
+        self.requests.append((method, path))
+
+    def getresponse(self):
+        """Return a response with the next status."""
+        self.responses.append(Mock(status=self.statuses.pop(0)))
+        return self.responses[-1]
+
+    def close(self):
+        """Mark as closed."""
+        self.closed = True
+
+
+@pytest.fixture
+def fake_http_connection():
+    """Fresh ``FakeHTTPConnection`` class."""
+    class Connection(FakeHTTPConnection):
+        instances = []
+        statuses = []
+        fail = False
+
+    return Connection
+
+
+def test_check_http_keeps_connection(fake_http_connection):
+    """Check if the connection is reused until the check passes, responses are read and statuses are configurable."""
+    fake_http_connection.statuses = [503, 204, 200]
+    check = check_http('http://example.com:8080', method='GET', statuses={200}, timeout=0.5,
+                       HTTPConnection=fake_http_connection)
+
+    assert [check(), check(), check()] == [False, False, True]
+
+    connection, = fake_http_connection.instances
+    assert connection.address == ('example.com', '8080')
+    assert connection.timeout == 0.5
+    assert connection.requests == [('GET', '/')] * 3
+    assert all(response.read.call_count == 1 for response in connection.responses), 'Bodies should be drained.'
+    assert connection.closed, 'The connection should not be left open once the service is ready.'
+
+
+def test_check_http_reconnects(fake_http_connection):
+    """Check if a broken connection is replaced with a new one right away and a failing new one fails the check."""
+    fake_http_connection.statuses = [503, 200]
+    check = check_http('http://example.com/health', HTTPConnection=fake_http_connection)
+    assert check() is False
+
+    fake_http_connection.fail = True
+    assert check() is False
+    assert len(fake_http_connection.instances) == 2, 'A fresh connection should be tried once.'
+    assert all(connection.closed for connection in fake_http_connection.instances)
+
+    fake_http_connection.fail = False
+    assert check() is True
+    assert fake_http_connection.instances[-1].requests == [('HEAD', '/health')]
+
+
+def test_check_http_clamps_timeout(fake_http_connection):
+    """Check if the socket timeout is shortened to the time left until the deadline."""
+    fake_http_connection.statuses = [503, 200]
+    check = check_http('http://example.com', timeout=5, HTTPConnection=fake_http_connection)
+
+    assert check(CheckContext(monotonic() + 0.2)) is False
+    connection, = fake_http_connection.instances
+    assert 0 < connection.timeout <= 0.2
+
+    assert check() is True, 'Checks accepting a context should still work without one.'
+    assert connection.timeout == 5, 'The timeout of the kept connection should be restored without a context.'
+
+
+def test_check_tcp_clamps_timeout():
+    """Check if the connection timeout is shortened to the time left until the deadline."""
+    check = check_tcp(80, host='example.com', timeout=5)
+
+    with patch('spawn_and_check.checks.connect_tcp', return_value={('example.com', 80): None}) as connect_tcp:
+        assert check(CheckContext(monotonic() + 0.2)) is False
+        assert check() is False
+
+    (addresses, timeout), _ = connect_tcp.call_args_list[0]
+    assert addresses == [('example.com', 80)]
+    assert 0 < timeout <= 0.2
+    assert connect_tcp.call_args_list[1][0][1] == 5
@@ -0,0 +1,154 @@
+"""Combined checks unit tests."""
+import time
+import threading
+from multiprocessing.pool import ThreadPool
+
+import pytest
+from mock import Mock
+
+from spawn_and_check.combinators import all_of, any_of, quorum
+from spawn_and_check.context import CheckContext, accepts_context
+from spawn_and_check.executor import negated
+from spawn_and_check.polling import TimedOut, polled, wait_until, wakeup_fds
+
+
+def plain_check(result):
+    """Create a check function returning ``result`` (mocks have every attribute, e.g. ``filenos``)."""
+    def check():
+        check.calls += 1
+        return result
+
+    check.calls = 0
+    return check
+
+
+def test_short_circuit():
+    """Check if the sub-checks are called only until the result is decided."""
+    passing, failing, other = plain_check(True), plain_check(False), plain_check(True)
+
+    assert all_of([passing, failing, other])() is False
+    assert other.calls == 0
+
+    assert any_of([failing, passing, other])() is True
+    assert other.calls == 0
+
+    workers = [plain_check(True) for _ in range(6)]
+    assert quorum(workers, 4)() is True
+    assert [worker.calls for worker in workers] == [1, 1, 1, 1, 0, 0]
+
+    workers = [plain_check(False)] * 3 + [plain_check(True) for _ in range(3)]
+    assert quorum(workers, 4)() is False
+    assert workers[-1].calls == 0, 'Quorum cannot be reached after 3 of 6 failed.'
+
+
+def test_invalid_quorum():
+    """Check if a quorum that cannot be reached is rejected."""
+    with pytest.raises(ValueError):
+        quorum([plain_check(True)], 2)
+    with pytest.raises(ValueError):
+        any_of([])
+
+
+def test_concurrent():
+    """Check if the sub-checks may be called concurrently and the result is returned as soon as it's decided."""
+    def slow_check(result, duration):
+        def check():
+            time.sleep(duration)
+            return result
+        return check
+
+    pool = ThreadPool(3)
+    try:
+        check = any_of([slow_check(True, 0.05), slow_check(False, 0.5), slow_check(False, 0.5)], pool.imap_unordered)
+        start = time.time()
+        assert check() is True
+        assert time.time() - start < 0.4
+    finally:
+        pool.terminate()
+
+
+def test_timed_out_reports_failing_sub_checks():
+    """Check if ``TimedOut`` tells which sub-checks failed."""
+    failing = plain_check(False)
+    check = quorum([plain_check(True), failing, plain_check(True)], 3)
+    assert 'not called' in repr(check)
+
+    with pytest.raises(TimedOut) as timed_out:
+        wait_until(check, timeout=0, sleep_fn=Mock())
+
+    assert timed_out.value.args[1] == [check]
+    assert check.failing == [failing]
+    assert repr(failing) in repr(check)
+
+
+def test_forwards_protocol():
+    """Check if the context, process, spawn options and wake-up descriptors reach the sub-checks."""
+    contexts = []
+
+    @accepts_context
+    def deadline_aware(context):
+        contexts.append(context)
+        return True
+
+    deadline_aware.attach = Mock()
+    deadline_aware.prepare = Mock()
+    deadline_aware.fileno = lambda: 7
+    deadline_aware.close = Mock()
+    check = all_of([deadline_aware, plain_check(True)])
+
+    context = CheckContext(0)
+    assert check(context) is True
+    assert contexts == [context]
+
+    process, options = Mock(), Mock()
+    check.prepare(options)
+    check.attach(process)
+    deadline_aware.prepare.assert_called_once_with(options)
+    deadline_aware.attach.assert_called_once_with(process)
+
+    assert wakeup_fds([check]) == [7]
+    assert wakeup_fds([polled(check)]) == [7], 'Wrappers should keep the methods of the check.'
+    assert negated(check)(context) is False
+    assert contexts == [context, context]
+
+    negated(check).prepare(options)
+    negated(check).attach(process)
+    assert deadline_aware.prepare.call_count == deadline_aware.attach.call_count == 2
+    assert wakeup_fds([negated(check)]) == [7], 'Negated checks should keep the methods of the check.'
+
+    check.close()
+    deadline_aware.close.assert_called_once_with()
+
+
+def test_concurrent_no_overlapping_calls():
+    """Check if a sub-check still running after the result was decided is skipped rather than called again."""
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_check():
+        calls.append(True)
+        started.set()
+        release.wait(5)
+        return True
+
+    def fast_check():
+        started.wait(5)
+        return True
+
+    pool = ThreadPool(2)
+    try:
+        check = any_of([fast_check, slow_check], pool.imap_unordered)
+        assert check() is True, 'Decided by the fast check while the slow one still runs.'
+
+        check.checks[0] = plain_check(False)
+        assert check() is False, 'The slow check is still running - it should not be called again.'
+        assert len(calls) == 1
+        assert slow_check in check.failing
+
+        release.set()
+        wait_until(lambda: not check.running, timeout=5)
+        assert check() is True
+        assert len(calls) == 2
+    finally:
+        release.set()
+        pool.terminate()
@@ -6,12 +6,16 @@ Thanks to the heavy use of dependency injection, it's possible to test it
 without patching. Stubbing, however, is extensive. So for tests that actually
 test something, see the integration suite.
 """
+import os
 from itertools import chain, cycle
+from functools import partial
 
 import pytest
 from mock import Mock, MagicMock
 
 from spawn_and_check import execute
+from spawn_and_check.executor import PIPE, SpawnOptions, spawn, with_piped_output
+from spawn_and_check.history import StartupHistory
 from spawn_and_check.exceptions import PreChecksFailed, PostChecksFailed, SubprocessExited
 
 
@@ -111,6 +115,92 @@ def test_execute_popen_called(popen_mock):
     assert process.poll() is None
 
 
+def test_execute_history_errors(popen_mock, tmpdir):
+    """Check if a history that cannot be read or written does not fail the execution."""
+    history = StartupHistory(str(tmpdir))  # A directory - both reading and writing fail.
+    process = execute(FAKE_COMMAND, [lambda: True], pre_checks=[lambda: True], popen=popen_mock, history=history)
+    assert process.poll() is None
+
+
+def test_spawn_new_session(process_mock):
+    """Check if the new session is created by ``popen`` if it can, with ``os.setsid`` as the fallback."""
+    calls = []
+
+    def popen_with_sessions(args, start_new_session=False, preexec_fn=None, stdout=None):
+        calls.append(dict(start_new_session=start_new_session, preexec_fn=preexec_fn))
+        return process_mock
+
+    for popen in [popen_with_sessions, partial(popen_with_sessions, stdout=1)]:
+        del calls[:]
+        execute(FAKE_COMMAND, [lambda: True], pre_checks=[lambda: True], popen=popen)
+        assert calls == [dict(start_new_session=True, preexec_fn=None)]
+
+    legacy_popen = Mock(return_value=process_mock)
+    execute(FAKE_COMMAND, [lambda: True], pre_checks=[lambda: True], popen=legacy_popen)
+    assert legacy_popen.call_args[1] == dict(preexec_fn=os.setsid)
+
+
+def test_spawn_fds(process_mock):
+    """Check if descriptors at their own numbers are passed, and remapping any of them needs the ``preexec_fn``."""
+    calls = []
+
+    def popen_with_fds(args, start_new_session=False, preexec_fn=None, pass_fds=(), close_fds=True, env=None):
+        calls.append(dict(start_new_session=start_new_session, pass_fds=pass_fds, close_fds=close_fds,
+                          remapping=preexec_fn is not None, env=env))
+        return process_mock
+
+    options = SpawnOptions()
+    options.fds[7] = 7
+    options.env['READY_FD'] = '7'
+    spawn(popen_with_fds, ['command'], options)
+    assert calls[-1]['start_new_session'] and calls[-1]['pass_fds'] == [7]
+    assert calls[-1]['env']['READY_FD'] == '7'
+
+    options.fds[3] = 8
+    spawn(popen_with_fds, ['command'], options)
+    assert calls[-1]['remapping'] and calls[-1]['close_fds'] is False
+    assert calls[-1]['pass_fds'] == (), '``close_fds`` forced by ``pass_fds`` would close the remapped descriptors.'
+    assert not calls[-1]['start_new_session'], 'The preexec_fn starts the new session.'
+
+    del options.fds[3]
+    legacy_popen = Mock(return_value=process_mock)
+    spawn(legacy_popen, ['command'], options)
+    assert legacy_popen.call_args[1]['preexec_fn'] is not None, 'Without ``pass_fds`` the descriptors are duplicated.'
+
+
+def test_spawn_baseline_arguments(process_mock):
+    """Check if a ``subprocess32``-like ``popen`` keeps the descriptors and signals of Python 2.7 unless told not to."""
+    calls = []
+
+    def popen32(args, start_new_session=False, close_fds=True, restore_signals=True, pass_fds=()):
+        calls.append(dict(close_fds=close_fds, restore_signals=restore_signals, pass_fds=pass_fds))
+        return process_mock
+
+    spawn(popen32, ['command'])
+    assert calls[-1] == dict(close_fds=False, restore_signals=False, pass_fds=())
+
+    spawn(partial(popen32, close_fds=True), ['command'])
+    assert calls[-1] == dict(close_fds=True, restore_signals=False, pass_fds=()), 'Fed arguments should be kept.'
+
+    options = SpawnOptions()
+    options.fds[7] = 7
+    spawn(popen32, ['command'], options)
+    assert calls[-1] == dict(close_fds=True, restore_signals=False, pass_fds=[7]), 'Forced by ``pass_fds``.'
+
+
+def test_with_piped_output():
+    """Check if only the streams not redirected by ``popen`` are piped."""
+    popen = Mock()
+    with_piped_output(popen)(['command'])
+    assert popen.call_args[1] == dict(stdout=PIPE, stderr=PIPE)
+
+    with_piped_output(partial(partial(popen, stderr=None), cwd='/'))(['command'])
+    assert popen.call_args[1] == dict(stdout=PIPE, stderr=None, cwd='/')
+
+    redirecting = partial(popen, stdout=1, stderr=2)
+    assert with_piped_output(redirecting) is redirecting
+
+
 def test_execute_raises_when_process_exits():
     """Check if ``SubprocessExited`` is thrown if the process exits."""
     process_mock = Mock()
@@ -132,3 +222,14 @@ def test_execute_waits_for_the_post_checks_to_turn_ok(popen_mock):
     assert (check.call_count == 4,
             'The check function should return False 3 times as a post-check and once - and the last time - True.')
     assert sleep_mock.call_count == 3, 'Sleeping should take place after each failed check.'
+
+
+def test_execute_latch(popen_mock, process_mock):
+    """Check if latched post-checks are not called again while the process exit is still checked."""
+    early = Mock(return_value=True)
+    late = MagicMock(side_effect=[False, False, True])
+
+    execute(FAKE_COMMAND, [early, late], pre_checks=[lambda: True], latch=True, sleep_fn=Mock(), popen=popen_mock)
+
+    assert early.call_count == 1
+    assert process_mock.poll.call_count == 3
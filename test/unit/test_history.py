@@ -0,0 +1,70 @@
+"""Startup history unit tests."""
+import os
+import sys
+import json
+
+from spawn_and_check.history import StartupHistory
+from spawn_and_check.schedules import Predicted
+
+
+COMMAND = [sys.executable, '-m', 'some_service']
+
+
+def test_history_schedule(tmpdir):
+    """Check if recorded startup times make a schedule probing densely before the fastest one."""
+    path = str(tmpdir.join('history.json'))
+    history = StartupHistory(path, size=3, margin=0.25)
+    assert history.schedule(COMMAND, 0.1) is None, 'Unknown commands should be polled normally.'
+
+    for startup_time in [9, 8, 10, 12]:
+        history.record(COMMAND, startup_time)
+
+    assert StartupHistory(path).startup_times(COMMAND) == [8, 10, 12], 'Only the most recent times should be kept.'
+    schedule = history.schedule(COMMAND, 0.1)
+    assert isinstance(schedule, Predicted)
+    assert schedule.dense_from == 6
+    assert schedule.interval == 0.1
+    assert history.schedule(COMMAND + ['--other-option'], 0.1) is None
+
+
+def test_history_untrusted(tmpdir):
+    """Check if stale times and times of a different build of the executable are not used."""
+    path = str(tmpdir.join('history.json'))
+    history = StartupHistory(path)
+    history.record(COMMAND, 5)
+
+    assert StartupHistory(path, max_age=-1).schedule(COMMAND, 0.1) is None
+
+    with open(path) as history_file:
+        entries = json.load(history_file)
+    entries[json.dumps(COMMAND)]['executable_mtime'] -= 1
+    with open(path, 'w') as history_file:
+        json.dump(entries, history_file)
+
+    assert history.schedule(COMMAND, 0.1) is None
+    history.record(COMMAND, 3)
+    assert history.startup_times(COMMAND) == [3], 'Times of the previous build should be dropped.'
+
+
+def test_history_corrupt(tmpdir):
+    """Check if a corrupt file is treated as empty and replaced."""
+    path = tmpdir.join('history.json')
+    path.write('{"truncated": ')
+    history = StartupHistory(str(path))
+
+    assert history.schedule(COMMAND, 0.1) is None
+    history.record(COMMAND, 1)
+    assert history.startup_times(COMMAND) == [1]
+    assert os.listdir(str(tmpdir)) == ['history.json'], 'No temporary files should be left.'
+
+
+def test_history_corrupt_entries(tmpdir):
+    """Check if entries without the expected fields are ignored and replaced."""
+    path = tmpdir.join('history.json')
+    path.write(json.dumps({json.dumps(COMMAND): {'startup_times': [1]}, 'other': 'garbage'}))
+    history = StartupHistory(str(path))
+
+    assert history.schedule(COMMAND, 0.1) is None
+    history.record(COMMAND, 2)
+    assert history.startup_times(COMMAND) == [2]
+    assert list(history.load()) == [json.dumps(COMMAND)]
@@ -0,0 +1,54 @@
+"""Instrumentation tests."""
+import json
+
+from mock import Mock, MagicMock
+
+from spawn_and_check import execute
+from spawn_and_check.instrumentation import Histogram, Instrumentation
+from spawn_and_check.polling import wait_until
+
+
+def test_histogram():
+    """Check if values are counted in the right buckets."""
+    histogram = Histogram(bounds=(0.01, 0.1, 1))
+    for value in [0.005, 0.01, 0.05, 0.5, 0.7, 20]:
+        histogram.add(value)
+
+    report = histogram.report()
+    assert report['buckets'] == [[0.01, 2], [0.1, 1], [1, 2], [None, 1]]
+    assert report['min'] == 0.005
+    assert report['max'] == 20
+
+
+def test_wait_until_stats():
+    """Check if calls, passes, rounds and sleeps are recorded."""
+    instrumentation = Instrumentation()
+    passing = MagicMock(return_value=True, __name__='passing')
+    late = MagicMock(side_effect=[False, False, True], __name__='late')
+
+    with instrumentation.phase('polling') as stats:
+        wait_until([passing, late], interval=0.01, sleep_fn=Mock(), stats=stats)
+
+    report, = instrumentation.report()
+    assert report['phase'] == 'polling'
+    assert report['rounds'] == 3
+    assert [(check['check'], check['calls'], check['passes']) for check in report['checks']] == [
+        ('passing', 3, 3), ('late', 3, 1)]
+    first_passes = [check['time_to_first_pass'] for check in report['checks']]
+    assert 0 <= first_passes[0] <= first_passes[1]
+    assert report['duration'] >= report['probing'] + report['sleeping']
+    json.dumps(report)  # Should be serializable.
+
+
+def test_execute_instrumentation(popen_mock):
+    """Check if all phases of the execution are recorded and the callback is called."""
+    events = []
+    instrumentation = Instrumentation(callback=lambda event, phase, **details: events.append((event, phase.name)))
+
+    results = iter([False, True])
+    execute('command', [lambda: next(results)], pre_checks=[lambda: True], popen=popen_mock, sleep_fn=Mock(),
+            instrumentation=instrumentation)
+
+    assert [phase['phase'] for phase in instrumentation.report()] == ['pre_checks', 'spawn', 'post_checks']
+    assert ('phase_end', 'post_checks') in events
+    assert events.count(('round', 'post_checks')) == 2
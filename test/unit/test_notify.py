@@ -0,0 +1,24 @@
+"""sd_notify socket unit tests."""
+import os
+import socket
+
+from spawn_and_check.notify import NotifySocket
+
+
+def test_notify_socket():
+    """Check if the messages are parsed, the most recent values kept and the socket removed when closed."""
+    notify_socket = NotifySocket()
+    assert notify_socket.ready is False
+
+    sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sender.sendto('STATUS=Starting\n', notify_socket.path)
+    sender.sendto('STATUS=Listening\nREADY=1\nERRNO=0\n', notify_socket.path)
+
+    assert notify_socket.ready is True
+    assert notify_socket.status == 'Listening'
+    assert notify_socket.errno == 0
+
+    notify_socket.close()
+    assert not os.path.exists(notify_socket.directory)
+    assert notify_socket.fileno() is None
+    assert notify_socket.ready is True, 'Messages received before closing should be kept.'
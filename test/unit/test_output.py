@@ -0,0 +1,172 @@
+"""Output reading helpers tests."""
+import os
+import re
+import fcntl
+import resource
+
+import pytest
+from mock import Mock
+
+from spawn_and_check.output import OutputReader, RingBuffer, PatternMatcher
+
+
+def test_ring_buffer():
+    """Check if the ring buffer keeps only the most recent bytes."""
+    buffer = RingBuffer(5)
+    buffer.write(b'abc')
+    assert buffer.getvalue() == b'abc'
+
+    buffer.write(b'defg')
+    assert buffer.getvalue() == b'cdefg'
+
+    buffer.write(b'0123456789')
+    assert buffer.getvalue() == b'56789'
+
+
+def test_pattern_matcher_across_chunks():
+    """Check if a match split between chunks is found."""
+    matcher = PatternMatcher(re.compile(b'server ready'), window=20)
+    for chunk in [b'starting...\nser', b'ver re', b'ady\n']:
+        assert matcher.matched is False
+        matcher.feed('stdout', chunk)
+
+    assert matcher.matched is True
+
+
+def test_pattern_matcher_streams_separately():
+    """Check if chunks of different streams are not glued together."""
+    matcher = PatternMatcher(re.compile(b'ready'), window=20)
+    matcher.feed('stdout', b're')
+    matcher.feed('stderr', b'ady\n')
+    assert matcher.matched is False
+
+    matcher.feed('stdout', b'ady\n')
+    assert matcher.matched is True
+
+
+def test_pattern_matcher_window():
+    """Check if only the window of the previous output is searched again."""
+    matcher = PatternMatcher(re.compile(b'a.*b'), window=3)
+    matcher.feed('stdout', b'a-----')
+    matcher.feed('stdout', b'b')
+    assert matcher.matched is False, 'The match is longer than the window.'
+
+
+@pytest.mark.parametrize('pattern, chunks', [
+    (br'ready$', [b'ready', b'-not\n']),
+    (br'\bready\b', [b'ready', b'ish\n']),
+    (br'\bready', [b'--xready---\n', b'more\n']),
+    (br'^ready', [b'not ', b'x' * 20 + b'\n', b'ready\n']),
+])
+def test_pattern_matcher_read_boundaries(pattern, chunks):
+    """Check if anchors and word boundaries don't match where a read ended or the window was cut."""
+    matcher = PatternMatcher(re.compile(pattern), window=10)
+    for chunk in chunks:
+        matcher.feed('stdout', chunk)
+    assert matcher.matched is False
+
+
+def test_pattern_matcher_line_without_newline():
+    """Check if the last line is searched once no more output is found, even without a newline."""
+    matcher = PatternMatcher(re.compile(br'running\.$'), window=40)
+    matcher.feed('stdout', b'Fake app is running.')
+    assert matcher.matched is False, 'The line may still be being written.'
+
+    matcher.feed('stdout', b'')
+    assert matcher.matched is True
+
+
+def test_output_reader_notifies_no_more_output():
+    """Check if the listeners are told when a read finds no more output and at the end of the stream."""
+    read_end, write_end = os.pipe()
+    process = Mock(stdout=os.fdopen(read_end), stderr=None)
+    reader = OutputReader(process)
+    chunks = []
+    reader.subscribe(lambda stream, data: chunks.append((stream, data)))
+
+    os.write(write_end, b'ready')
+    reader.read()
+    reader.read()
+    os.close(write_end)
+    reader.read()
+    assert chunks == [('stdout', b'ready'), ('stdout', b''), ('stdout', b'')]
+
+
+def test_pattern_matcher_long_line():
+    """Check if a line longer than the window is searched before it ends."""
+    matcher = PatternMatcher(re.compile(b'ready'), window=10)
+    matcher.feed('stdout', b'x' * 20 + b' ready')
+    assert matcher.matched is True
+
+
+def test_output_reader_drain():
+    """Check if draining reads the output in the background, so that writing more than a pipe holds never blocks."""
+    read_end, write_end = os.pipe()
+    process = Mock(stdout=os.fdopen(read_end), stderr=None)
+    reader = OutputReader(process, tail_size=10)
+    chunks = []
+    reader.subscribe(lambda stream, data: chunks.append(data))
+    reader.drain()
+
+    for _ in range(64):
+        os.write(write_end, b'x' * 4096)  # Would block without the drain, once the pipe is full.
+    os.write(write_end, b'0123456789')
+    os.close(write_end)
+    reader.drain_thread.join(5)
+
+    assert not reader.drain_thread.is_alive(), 'The thread should end once the stream is closed.'
+    assert reader.tail() == b'0123456789'
+    assert len(b''.join(chunks)) == 64 * 4096 + 10
+
+
+def test_output_reader_closes_streams():
+    """Check if the streams are closed once read to the end."""
+    read_end, write_end = os.pipe()
+    process = Mock(stdout=os.fdopen(read_end), stderr=None)
+    reader = OutputReader(process)
+
+    os.write(write_end, b'out')
+    assert reader.tail() == b'out'
+    assert not process.stdout.closed
+
+    os.close(write_end)
+    reader.read()
+    assert process.stdout.closed
+
+
+def test_output_reader_drain_survives_listener_errors():
+    """Check if the drain thread keeps reading (and closes the streams at the end) when a listener fails."""
+    read_end, write_end = os.pipe()
+    process = Mock(stdout=os.fdopen(read_end), stderr=None)
+    reader = OutputReader(process)
+    reader.subscribe(Mock(side_effect=ValueError('Broken listener.')))
+    reader.drain()
+
+    for _ in range(64):
+        os.write(write_end, b'x' * 4096)
+    os.close(write_end)
+    reader.drain_thread.join(5)
+
+    assert not reader.drain_thread.is_alive()
+    assert process.stdout.closed
+
+
+def test_output_reader_drain_high_descriptor():
+    """Check if descriptors above ``FD_SETSIZE`` (1024), which ``select`` cannot wait for, are drained."""
+    soft_limit, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft_limit < 2048:
+        pytest.skip('Needs at least 2048 descriptors.')
+
+    read_end, write_end = os.pipe()
+    high_read_end = fcntl.fcntl(read_end, fcntl.F_DUPFD, 2000)
+    os.close(read_end)
+    process = Mock(stdout=os.fdopen(high_read_end), stderr=None)
+    reader = OutputReader(process)
+    reader.drain()
+
+    os.write(write_end, b'ready')
+    os.close(write_end)
+    reader.drain_thread.join(5)
+
+    assert not reader.drain_thread.is_alive()
+    assert reader.tail_buffer.getvalue() == b'ready'
@@ -0,0 +1,227 @@
+"""Polling loop unit tests."""
+import os
+import time
+from itertools import chain, islice, repeat
+from multiprocessing.pool import ThreadPool
+
+import pytest
+from mock import Mock
+
+from spawn_and_check.clock import monotonic
+from spawn_and_check.instrumentation import Instrumentation
+from spawn_and_check.polling import TimedOut, execute_checks, polled, wait_until
+from spawn_and_check.context import CheckContext, accepts_context
+from spawn_and_check.schedules import Fixed, ExponentialBackoff, FastThenSlow, Predicted
+
+
+@pytest.fixture
+def thread_pool(request):
+    """A thread pool for running the checks concurrently."""
+    pool = ThreadPool(5)
+    request.addfinalizer(pool.terminate)
+    return pool
+
+
+def slow_check(result, duration=0.2):
+    """Create a check that takes ``duration`` seconds and returns ``result``."""
+    def check():
+        time.sleep(duration)
+        return result
+    return check
+
+
+def test_execute_checks_concurrently(thread_pool):
+    """Check if a concurrent round takes as long as the slowest check, not all of them added together."""
+    checks = [slow_check(result) for result in [True, False, True, False, True]]
+
+    start = time.time()
+    failing = execute_checks(checks, thread_pool.map)
+    assert time.time() - start < 0.5
+
+    assert failing == [checks[1], checks[3]], 'Failing checks should be reported in the order they were passed.'
+
+
+def test_wait_until_concurrently_times_out(thread_pool):
+    """Check if ``wait_until`` reports failing checks in the concurrent mode just as in the sequential one."""
+    failing_check = slow_check(False, 0.05)
+    passing_check = slow_check(True, 0.05)
+
+    with pytest.raises(TimedOut) as timed_out:
+        wait_until([passing_check, failing_check], timeout=0.2, map_fn=thread_pool.map)
+
+    assert timed_out.value.args[1] == [failing_check]
+
+
+def test_wait_until_concurrently_propagates_exceptions(thread_pool):
+    """Check if exceptions raised by checks run in a pool break the polling loop."""
+    def raising_check():
+        raise ValueError('Breaking the loop.')
+
+    with pytest.raises(ValueError):
+        wait_until([slow_check(False, 0), raising_check], map_fn=thread_pool.map)
+
+
+def test_wait_until_clamps_last_sleep():
+    """Check if the sleep is shortened so that the polling does not overshoot the timeout."""
+    sleep_mock = Mock(side_effect=time.sleep)
+
+    start = time.time()
+    with pytest.raises(TimedOut):
+        wait_until(lambda: False, interval=10, timeout=0.2, sleep_fn=sleep_mock)
+
+    assert time.time() - start < 0.5
+    assert sleep_mock.call_count == 1
+    assert sleep_mock.call_args[0][0] <= 0.2
+
+
+def test_wait_until_schedule():
+    """Check if the intervals come from the schedule."""
+    sleep_mock = Mock()
+    check = Mock(side_effect=[False, False, False, True])
+
+    wait_until(check, schedule=[0.01, 0.02, 0.04], sleep_fn=sleep_mock)
+
+    slept = [call[0][0] for call in sleep_mock.call_args_list]
+    assert len(slept) == 3
+    assert all(expected - 0.01 < duration <= expected for duration, expected in zip(slept, [0.01, 0.02, 0.04]))
+
+
+def test_wait_until_finite_schedule():
+    """Check if the last interval of a finite schedule is repeated once the schedule runs out."""
+    check = counting_check(repeat(False))
+    with pytest.raises(TimedOut):
+        wait_until(check, timeout=0.3, schedule=[0.01, 0.02])
+    assert 8 <= check.calls <= 17
+
+    with pytest.raises(TimedOut):
+        wait_until([lambda: False], interval=0.01, timeout=0.05, schedule=[])
+
+
+def test_schedules():
+    """Check the intervals yielded by the schedules."""
+    assert list(islice(Fixed(0.3), 3)) == [0.3] * 3
+    assert list(islice(ExponentialBackoff(0.1, factor=2, maximum=0.5, jitter=0), 5)) == [0.1, 0.2, 0.4, 0.5, 0.5]
+    assert list(islice(FastThenSlow(fast=0.25, slow=2, fast_for=1), 6)) == [0.25] * 4 + [2, 2]
+    assert list(islice(Predicted(8, interval=0.1, sparse_probes=3), 6)) == [2, 2, 2, 2, 0.1, 0.1]
+    assert list(islice(Predicted(0.2, interval=0.1), 3)) == [0.1] * 3, 'No point in sparse probes of quick services.'
+
+    for interval in islice(ExponentialBackoff(1, factor=1, jitter=0.1), 100):
+        assert 0.9 <= interval <= 1.1
+
+    schedule = ExponentialBackoff(0.1, jitter=0)
+    assert list(islice(schedule, 2)) == list(islice(schedule, 2)), 'Schedules should be reusable.'
+
+
+def test_monotonic():
+    """Check if the monotonic clock goes forward in seconds."""
+    before = monotonic()
+    time.sleep(0.1)
+    assert 0.09 < monotonic() - before < 0.5
+
+
+def test_wait_until_latch():
+    """Check if passed checks are not called again when latching, except those opting out."""
+    early = Mock(return_value=True)
+    late = Mock(side_effect=[False, False, True])
+    guard = Mock(return_value=True)
+
+    wait_until([early, late, polled(guard, latch=False)], latch=True, sleep_fn=Mock())
+
+    assert early.call_count == 1
+    assert late.call_count == 3
+    assert guard.call_count == 3
+
+    early.reset_mock()
+    wait_until([polled(early, latch=True), Mock(side_effect=[False, True])], sleep_fn=Mock())
+    assert early.call_count == 1, 'Checks can latch on their own.'
+
+
+def test_wait_until_latched_wakeup_fd():
+    """Check if a latched check whose descriptor stays readable does not make the loop spin."""
+    read_end, write_end = os.pipe()
+    try:
+        os.write(write_end, b'x')  # Never read - a latched check is not called again to consume it.
+        def passing():
+            return True
+
+        passing.fileno = lambda: read_end
+        instrumentation = Instrumentation()
+
+        with pytest.raises(TimedOut), instrumentation.phase('polling') as stats:
+            wait_until([passing, lambda: False], interval=0.1, timeout=0.5, latch=True, stats=stats)
+
+        report, = instrumentation.report()
+        assert report['rounds'] <= 7
+    finally:
+        os.close(read_end)
+        os.close(write_end)
+
+
+def counting_check(results):
+    """Create a check returning the results in order and counting its calls in the ``calls`` attribute."""
+    results = iter(results)
+
+    def check():
+        check.calls += 1
+        return next(results)
+
+    check.calls = 0
+    return check
+
+
+def test_wait_until_check_interval():
+    """Check if a check with its own interval is called less often and the loop sleeps until it's due."""
+    rare = counting_check(repeat(False))
+    frequent = counting_check(chain([False] * 5, repeat(True)))
+
+    with pytest.raises(TimedOut):
+        wait_until([polled(rare, interval=0.15), frequent], interval=0.02, timeout=0.25)
+
+    assert 2 <= rare.calls <= 3
+    assert frequent.calls >= 6
+
+    sleep_mock = Mock(side_effect=time.sleep)
+    with pytest.raises(TimedOut):
+        wait_until(polled(rare, interval=0.1), interval=0.01, timeout=0.25, sleep_fn=sleep_mock)
+    assert sleep_mock.call_count <= 3, 'The loop should sleep until the only check is due.'
+
+
+def test_wait_until_check_timeout():
+    """Check if a check failing past its own timeout ends the polling."""
+    impatient = polled(lambda: False, timeout=0.1)
+
+    start = time.time()
+    with pytest.raises(TimedOut) as timed_out:
+        wait_until([impatient, lambda: True], timeout=5)
+
+    assert time.time() - start < 0.5
+    assert timed_out.value.args[1] == [impatient]
+
+
+def test_wait_until_passes_context():
+    """Check if checks accepting a context get their deadline and the process, and the others - no arguments."""
+    contexts = []
+
+    @accepts_context
+    def deadline_aware(context):
+        contexts.append(context)
+        return len(contexts) > 1
+
+    process = Mock()
+    start = monotonic()
+    wait_until([deadline_aware, polled(deadline_aware, timeout=1), lambda: True], interval=0.01, timeout=5,
+               process=process)
+
+    assert len(contexts) == 4
+    assert all(isinstance(context, CheckContext) and context.process is process for context in contexts)
+    assert start + 4.9 < contexts[0].deadline <= monotonic() + 5
+    assert contexts[1].deadline < start + 1.1, 'Checks with their own timeout should get their own deadline.'
+    assert contexts[0].clamp(10) <= 5
+    assert contexts[0].clamp(0.5) == 0.5
+
+
+def test_check_context_past_deadline():
+    """Check if the time left never drops below the floor, so that the last round can still pass."""
+    context = CheckContext(monotonic() - 1)
+    assert context.remaining() > 0
+    assert context.clamp(None) == context.remaining()
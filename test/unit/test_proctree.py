@@ -0,0 +1,87 @@
+"""Process tree unit tests, on a fake ``/proc``."""
+import pytest
+
+from spawn_and_check import proctree
+from spawn_and_check.proctree import ProcessTree, read_stat
+
+
+@pytest.fixture
+def proc(tmpdir):
+    """Fake ``/proc`` with init, an unrelated process and a service with a worker in another session."""
+    proc = tmpdir.mkdir('proc')
+    add_process(proc, 1, 0)
+    add_process(proc, 50, 1)
+    add_process(proc, 100, 1, name='service (main)')
+    add_process(proc, 101, 100)
+    return proc
+
+
+def add_process(proc, pid, ppid, start_time=1000, state='S', name='sleep'):
+    """Write the stat file of a fake process."""
+    fields = [state, ppid, pid, pid] + [0] * 15 + [start_time, 0]
+    proc.mkdir(str(pid)).join('stat').write('%d (%s) %s\n' % (pid, name, ' '.join(map(str, fields))))
+
+
+def test_read_stat(proc):
+    """Check if the stat is parsed even with parentheses and spaces in the command name."""
+    assert read_stat(100, str(proc)) == (1, 1000, 'S')
+    assert read_stat(12345, str(proc)) is None
+
+
+def test_process_tree(proc, monkeypatch):
+    """Check if the tree follows parent PIDs and rescans read only the new processes."""
+    tree = ProcessTree(100, str(proc))
+    assert sorted(tree.members) == [100, 101]
+
+    read_pids = []
+
+    def counting_read_stat(pid, proc):
+        read_pids.append(pid)
+        return read_stat(pid, proc)
+
+    monkeypatch.setattr(proctree, 'read_stat', counting_read_stat)
+    add_process(proc, 102, 101)
+    add_process(proc, 103, 102)
+    add_process(proc, 104, 50)
+
+    assert sorted(tree.scan()) == [102, 103]
+    assert sorted(read_pids) == [102, 103, 104]
+    assert tree.scan() == []
+
+
+def test_process_tree_alive(proc):
+    """Check if exited, zombie and reused PIDs are not counted as members."""
+    tree = ProcessTree(100, str(proc))
+    add_process(proc, 102, 101)
+    add_process(proc, 103, 101)
+    tree.scan()
+
+    proc.join('101').remove()
+    add_process(proc, 101, 1, start_time=2000)  # PID reused.
+    proc.join('102').remove()
+    add_process(proc, 102, 101, state='Z')
+
+    assert sorted(tree.alive()) == [100, 103]
+
+
+def test_process_tree_of_missing_process(proc):
+    """Check if the tree of a process that does not exist is empty."""
+    tree = ProcessTree(12345, str(proc))
+    assert tree.members == {}
+    assert tree.alive() == []
+
+
+def test_process_tree_marker(proc):
+    """Check if new processes with the marker are members even if reparented, and known processes are skipped."""
+    marker = ('SPAWN_AND_CHECK_TREE', 'abc')
+    add_process(proc, 102, 1)  # A daemon, reparented to init.
+    proc.join('102').join('environ').write('HOME=/\0SPAWN_AND_CHECK_TREE=abc\0')
+    add_process(proc, 103, 1)
+    proc.join('103').join('environ').write('SPAWN_AND_CHECK_TREE=abcd\0')
+    add_process(proc, 104, 1)  # Environment not readable - someone else's process.
+
+    tree = ProcessTree(100, str(proc), marker, known_pids=[1, 50])
+    assert sorted(tree.members) == [100, 101, 102]
+
+    tree = ProcessTree(100, str(proc), marker, known_pids=[1, 50, 100, 101, 102])
+    assert tree.members == {}, 'Known processes are not members.'
@@ -0,0 +1,62 @@
+"""Resolver unit tests, with a fake ``getaddrinfo``."""
+import socket
+
+import pytest
+from mock import Mock
+
+from spawn_and_check.resolver import Resolver
+
+
+ADDRESS_INFOS = [
+    (socket.AF_INET6, socket.SOCK_STREAM, 6, '', ('::1', 8080, 0, 0)),
+    (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', 8080)),
+    (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', 8080)),
+]
+
+
+def test_resolver_caches():
+    """Check if addresses are resolved once per TTL, deduplicated, and shared between ports given as strings."""
+    getaddrinfo = Mock(return_value=ADDRESS_INFOS)
+    resolver = Resolver(ttl=60, getaddrinfo=getaddrinfo)
+
+    addresses = resolver.resolve('localhost', 8080)
+    assert addresses == [(socket.AF_INET6, socket.SOCK_STREAM, 6, ('::1', 8080, 0, 0)),
+                         (socket.AF_INET, socket.SOCK_STREAM, 6, ('127.0.0.1', 8080))]
+    assert resolver.resolve('localhost', '8080') == addresses
+    assert getaddrinfo.call_count == 1
+
+    resolver.ttl = 0
+    resolver.resolve('localhost', 8080)
+    assert getaddrinfo.call_count == 2, 'Expired addresses should be resolved again.'
+
+
+def test_resolver_does_not_cache_failures():
+    """Check if a name that failed to resolve is resolved again on the next call."""
+    getaddrinfo = Mock(side_effect=[socket.gaierror(socket.EAI_NONAME, 'Name not known'), ADDRESS_INFOS])
+    resolver = Resolver(getaddrinfo=getaddrinfo)
+
+    with pytest.raises(socket.error):
+        resolver.resolve('service.local', 8080)
+    assert len(resolver.resolve('service.local', 8080)) == 2
+
+
+def test_resolver_numeric_only():
+    """Check if only numeric addresses are resolved (and cached names used) when a lookup is not allowed."""
+    getaddrinfo = Mock(return_value=ADDRESS_INFOS)
+    resolver = Resolver(getaddrinfo=getaddrinfo)
+
+    resolver.resolve('127.0.0.1', 8080, numeric_only=True)
+    assert getaddrinfo.call_args[0][5] == socket.AI_NUMERICHOST
+
+    resolver.resolve('localhost', 8080)
+    assert getaddrinfo.call_args[0][5] == 0
+    resolver.resolve('localhost', 8080, numeric_only=True)
+    assert getaddrinfo.call_count == 2, 'Cached addresses should be used.'
+
+
+def test_resolver_numeric_only_hostname():
+    """Check if a hostname not cached fails without a lookup when only numeric addresses are allowed."""
+    resolver = Resolver()
+    with pytest.raises(socket.error):
+        resolver.resolve('localhost', 8080, numeric_only=True)
+    assert resolver.resolve('127.0.0.1', 8080, numeric_only=True)[0][3] == ('127.0.0.1', 8080)
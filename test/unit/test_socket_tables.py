@@ -0,0 +1,62 @@
+"""Socket tables unit tests, on a fake ``/proc``."""
+import pytest
+
+from spawn_and_check.socket_tables import SocketEntry, SocketTables, decode_inet_address
+
+
+TCP_TABLE = """\
+  sl  local_address rem_address   st tx_queue rx_queue tr tm->when retrnsmt   uid  timeout inode
+   0: 0100007F:1F90 00000000:0000 0A 00000000:00000000 00:00000000 00000000  1000        0 111 1 0 100 0 0 10 0
+   1: 0100007F:1F90 0100007F:A2DA 01 00000000:00000000 00:00000000 00000000  1000        0 112 1 0 20 4 0 18 -1
+"""
+
+UNIX_TABLE = """\
+Num       RefCount Protocol Flags    Type St Inode Path
+0000000000000000: 00000002 00000000 00010000 0001 01   211 /tmp/service.sock
+0000000000000000: 00000003 00000000 00000000 0001 03   212 /tmp/service.sock
+0000000000000000: 00000002 00000000 00000000 0002 01   213 @abstract
+0000000000000000: 00000003 00000000 00000000 0001 03   214
+"""
+
+
+@pytest.fixture
+def proc(tmpdir):
+    """Fake ``/proc`` with the TCP and unix tables."""
+    net = tmpdir.mkdir('proc').mkdir('net')
+    net.join('tcp').write(TCP_TABLE)
+    net.join('unix').write(UNIX_TABLE)
+    return tmpdir / 'proc'
+
+
+def test_decode_inet_address():
+    """Check if IPv4 and IPv6 addresses are decoded from the host byte order."""
+    assert decode_inet_address('0100007F:1F90') == ('127.0.0.1', 8080)
+    assert decode_inet_address('00000000000000000000000001000000:0050') == ('::1', 80)
+
+
+def test_socket_tables(proc):
+    """Check if the tables are parsed and missing ones are empty."""
+    tables = SocketTables(proc=str(proc))
+
+    assert tables.entries('tcp') == [
+        SocketEntry(('127.0.0.1', 8080), True, 111),
+        SocketEntry(('127.0.0.1', 8080), False, 112),
+    ]
+    assert tables.entries('unix') == [
+        SocketEntry('/tmp/service.sock', True, 211),
+        SocketEntry('/tmp/service.sock', False, 212),
+        SocketEntry('@abstract', True, 213),
+    ]
+    assert tables.entries('tcp6') == []
+
+
+def test_socket_tables_cached(proc):
+    """Check if the tables are read again only after the TTL."""
+    tables = SocketTables(ttl=60, proc=str(proc))
+    assert len(tables.entries('tcp')) == 2
+
+    proc.join('net', 'tcp').write(TCP_TABLE.splitlines(True)[0])
+    assert len(tables.entries('tcp')) == 2
+
+    tables.ttl = 0
+    assert tables.entries('tcp') == []
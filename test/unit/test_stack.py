@@ -0,0 +1,150 @@
+"""Stack executor unit tests."""
+from itertools import count
+
+import pytest
+from mock import Mock
+
+from spawn_and_check import execute_many, Service
+from spawn_and_check.context import accepts_context
+from spawn_and_check.exceptions import PreChecksFailed, PostChecksFailed, SubprocessExited
+from spawn_and_check.stack import startup_order
+
+
+@pytest.fixture
+def spawned():
+    """List of commands spawned by ``fake_popen``, in order."""
+    return []
+
+
+@pytest.fixture
+def fake_popen(spawned):
+    """Popen replacement recording the spawned commands and returning running process mocks."""
+    pids = count(1000)
+
+    def popen(command, **kwargs):
+        spawned.append(command[0])
+        process = Mock(pid=next(pids), command=command[0])
+        process.poll.return_value = None
+        return process
+
+    return popen
+
+
+def started_check(spawned, name):
+    """Create a check that passes once the ``name`` command has been spawned."""
+    return lambda: name in spawned
+
+
+def test_startup_order():
+    """Check if services come after their dependencies and the passed order is kept otherwise."""
+    services = [
+        Service('proxy', 'proxy', [], depends_on=['app']),
+        Service('app', 'app', [], depends_on=['db', 'cache']),
+        Service('cache', 'cache', [], depends_on=['db']),
+        Service('db', 'db', []),
+    ]
+    assert [service.name for service in startup_order(services)] == ['db', 'cache', 'app', 'proxy']
+
+
+@pytest.mark.parametrize('services', [
+    [Service('a', 'a', [], depends_on=['b']), Service('b', 'b', [], depends_on=['a'])],
+    [Service('a', 'a', [], depends_on=['nonexistent'])],
+    [Service('a', 'a', []), Service('a', 'a', [])],
+])
+def test_startup_order_invalid(services, fake_popen, spawned):
+    """Check if cycles, unknown dependencies and duplicate names are rejected before spawning anything."""
+    with pytest.raises(ValueError):
+        execute_many(services, popen=fake_popen)
+    assert spawned == []
+
+
+def test_execute_many(fake_popen, spawned):
+    """Check if services are spawned after their dependencies are ready and handles are returned by names."""
+    sleep_mock = Mock()
+    services = [
+        Service('db', 'db', [started_check(spawned, 'db')]),
+        Service('worker1', 'worker1', [started_check(spawned, 'worker1')], depends_on=['db']),
+        Service('worker2', 'worker2', [started_check(spawned, 'worker2')], depends_on=['db']),
+        Service('proxy', 'proxy', [started_check(spawned, 'proxy')], depends_on=['worker1', 'worker2']),
+    ]
+    processes = execute_many(services, popen=fake_popen, sleep_fn=sleep_mock)
+
+    assert spawned == ['db', 'worker1', 'worker2', 'proxy']
+    assert [(name, process.command) for name, process in processes.items()] == zip(spawned, spawned)
+    assert not sleep_mock.called, 'Dependants should be started without sleeping once their dependencies are ready.'
+
+
+def test_execute_many_tears_down_in_reverse_order(fake_popen, spawned):
+    """Check if all started services are killed in the reverse order when one fails to start."""
+    killed = []
+    services = [
+        Service('db', 'db', [started_check(spawned, 'db')]),
+        Service('cache', 'cache', [started_check(spawned, 'cache')], depends_on=['db']),
+        Service('app', 'app', [lambda: False], pre_checks=[lambda: True], depends_on=['cache']),
+        Service('proxy', 'proxy', [], depends_on=['app']),
+    ]
+    with pytest.raises(PostChecksFailed):
+        execute_many(services, popen=fake_popen, timeout=0.1, kill_fn=lambda process: killed.append(process.command))
+
+    assert spawned == ['db', 'cache', 'app']
+    assert killed == ['app', 'cache', 'db']
+
+
+def test_execute_many_pre_checks_fail(fake_popen, spawned):
+    """Check if failing pre-checks of a dependant fail the stack before anything is started."""
+    kill_fn = Mock()
+    services = [
+        Service('db', 'db', [started_check(spawned, 'db')]),
+        Service('app', 'app', [lambda: True], depends_on=['db']),  # Negated as a pre-check - will fail.
+    ]
+    with pytest.raises(PreChecksFailed):
+        execute_many(services, popen=fake_popen, timeout=0.1, kill_fn=kill_fn)
+
+    assert spawned == []
+    assert not kill_fn.called
+
+
+def test_execute_many_shared_check(fake_popen, spawned):
+    """Check if a check object shared by services is called with the context of each of them."""
+    @accepts_context
+    def is_db(context):
+        return context.process.command == 'db'
+
+    services = [
+        Service('db', 'db', [is_db], pre_checks=[]),
+        Service('app', 'app', [is_db], pre_checks=[]),
+    ]
+    with pytest.raises(PostChecksFailed) as failed:
+        execute_many(services, popen=fake_popen, timeout=0.1, kill_fn=Mock())
+
+    assert failed.value.args[0] == ['app'], 'Only the app should fail - the db passed the check with its context.'
+
+
+def test_execute_many_returns_startup_order(fake_popen, spawned):
+    """Check if the processes are returned in the startup order even if they become ready in another one."""
+    passing = {'worker2'}
+    services = [
+        Service('worker1', 'worker1', [lambda: 'worker1' in passing], pre_checks=[]),
+        Service('worker2', 'worker2', [lambda: 'worker2' in passing], pre_checks=[]),
+    ]
+    processes = execute_many(services, popen=fake_popen, sleep_fn=lambda seconds: passing.add('worker1'))
+
+    assert list(processes) == ['worker1', 'worker2']
+
+
+def test_execute_many_process_exits(fake_popen, spawned):
+    """Check if a service exiting while others start raises ``SubprocessExited``."""
+    def exiting_popen(command, **kwargs):
+        process = fake_popen(command, **kwargs)
+        if command[0] == 'db':
+            process.poll.return_value = 1
+        return process
+
+    kill_fn = Mock()
+    services = [
+        Service('db', 'db', [started_check(spawned, 'db')]),
+        Service('app', 'app', [lambda: False], pre_checks=[lambda: True], depends_on=['db']),
+    ]
+    with pytest.raises(SubprocessExited):
+        execute_many(services, popen=exiting_popen, kill_fn=kill_fn)
+    assert kill_fn.call_count == 1